@@ -0,0 +1,169 @@
+"""Compara totales y conteos por recorrido de productos contra agregaciones_servicio.
+
+Cada consulta se resuelve como hasta ahora, recorriendo los productos
+en un bucle de Python, y con servicios.agregaciones_servicio en Python
+puro y con NumPy (si está instalado). Para el servicio se muestran la
+primera consulta, que lee las columnas del inventario, y la mediana de
+las siguientes, que las reutilizan. "mejora" compara el recorrido con
+la más rápida de esas medianas.
+
+El inventario se carga como lista de diccionarios; con --columnas, como
+TablaProductos (servicios.tabla_productos), donde el servicio lee cada
+campo columna por columna.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.agregaciones
+    python -m benchmarks.agregaciones --productos 100000 --repeticiones 10
+    python -m benchmarks.agregaciones --columnas
+"""
+
+import argparse
+import math
+import os
+import statistics
+import tempfile
+import time
+
+# Los datos del benchmark nunca tocan la carpeta real del proyecto
+os.environ["INVENTARIO_DATOS"] = tempfile.mkdtemp(prefix="bench_agregaciones_")
+os.environ["INVENTARIO_BACKEND"] = "json"
+
+from benchmarks.generador import CAMPOS, generar_productos_con_id  # noqa: E402
+from servicios import agregaciones_servicio, almacenamiento  # noqa: E402
+
+
+def _es_numero(valor):
+    return type(valor) in (int, float)
+
+
+# Las consultas como se escriben hoy sobre cargar_inventario()
+def _valor_por_categoria(inventario):
+    totales = {}
+    for producto in inventario:
+        stock, precio = producto.get("stock"), producto.get("precio")
+        if _es_numero(stock) and _es_numero(precio):
+            categoria = producto.get("categoria")
+            totales[categoria] = totales.get(categoria, 0) + stock * precio
+    return totales
+
+
+def _stock_bajo(inventario):
+    cantidad = 0
+    for producto in inventario:
+        stock = producto.get("stock")
+        if _es_numero(stock) and stock < 10:
+            cantidad += 1
+    return cantidad
+
+
+def _stock_bajo_por_categoria(inventario):
+    cantidades = {}
+    for producto in inventario:
+        stock = producto.get("stock")
+        if _es_numero(stock) and stock < 10:
+            categoria = producto.get("categoria")
+            cantidades[categoria] = cantidades.get(categoria, 0) + 1
+    return cantidades
+
+
+def _precio_de_activos(inventario):
+    precios = []
+    for producto in inventario:
+        precio = producto.get("precio")
+        if producto.get("activo") is True and _es_numero(precio):
+            precios.append(precio)
+    return {
+        "cantidad": len(precios),
+        "suma": sum(precios),
+        "minimo": min(precios),
+        "maximo": max(precios),
+        "promedio": sum(precios) / len(precios),
+    }
+
+
+def _servicio_valor_por_categoria():
+    _, resultado = agregaciones_servicio.resumir(
+        ("stock", "precio"), ("suma",), agrupar_por="categoria"
+    )
+    return {categoria: resumen["suma"] for categoria, resumen in resultado.items()}
+
+
+CONSULTAS = [
+    ("valor por categoría", _valor_por_categoria, _servicio_valor_por_categoria),
+    ("stock bajo", _stock_bajo,
+     lambda: agregaciones_servicio.contar([("stock", "<", 10)])[1]),
+    ("stock bajo por categoría", _stock_bajo_por_categoria,
+     lambda: agregaciones_servicio.contar([("stock", "<", 10)], "categoria")[1]),
+    ("precio de activos", _precio_de_activos,
+     lambda: agregaciones_servicio.resumir("precio", condiciones=[("activo", "==", True)])[1]),
+]
+
+
+def _iguales(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_iguales(a[clave], b[clave]) for clave in a)
+    # El orden de las sumas cambia el redondeo
+    return math.isclose(a, b, rel_tol=1e-9)
+
+
+def _cronometrar(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def _medir_servicio(consulta, con_numpy, repeticiones):
+    """Devuelve (segundos de la primera consulta, mediana de las siguientes, resultado)."""
+
+    agregaciones_servicio.NUMPY_ACTIVO = con_numpy
+    # Sin columnas leídas: la primera consulta paga la lectura
+    agregaciones_servicio._INDICE_COLUMNAS.version = None
+
+    primera, resultado = _cronometrar(consulta)
+    tiempos = [_cronometrar(consulta)[0] for _ in range(repeticiones)]
+    return primera, statistics.median(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--columnas", action="store_true")
+    args = parser.parse_args()
+
+    almacenamiento.UMBRAL_COLUMNAS = 0 if args.columnas else None
+    almacenamiento.guardar_campos(dict(CAMPOS))
+    almacenamiento.guardar_inventario(generar_productos_con_id(args.productos))
+    inventario = almacenamiento.ver_inventario()
+
+    motores = [("python", False)]
+    if agregaciones_servicio._importar_numpy() is not None:
+        motores.append(("numpy", True))
+    else:
+        print("(NumPy no está instalado: solo Python puro)")
+
+    encabezado = f"{'consulta':<26} {'recorrido ms':>13}"
+    for nombre, _ in motores:
+        encabezado += f" {nombre + ' 1ª ms':>13} {nombre + ' ms':>10}"
+    print(f"{args.productos:,} productos ({type(inventario).__name__})")
+    print(encabezado + f" {'mejora':>8}")
+
+    for nombre, recorrido, consulta in CONSULTAS:
+        tiempos = [_cronometrar(lambda: recorrido(inventario)) for _ in range(args.repeticiones)]
+        esperado = tiempos[0][1]
+        mediana_recorrido = statistics.median(tiempo for tiempo, _ in tiempos)
+
+        linea = f"{nombre:<26} {mediana_recorrido * 1000:>13.1f}"
+        mejor = None
+        for _, con_numpy in motores:
+            primera, mediana, resultado = _medir_servicio(consulta, con_numpy, args.repeticiones)
+            if not _iguales(resultado, esperado):
+                raise SystemExit(f"{nombre}: el servicio no da lo mismo que el recorrido")
+            linea += f" {primera * 1000:>13.1f} {mediana * 1000:>10.2f}"
+            mejor = mediana if mejor is None else min(mejor, mediana)
+
+        print(linea + f" {mediana_recorrido / mejor:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
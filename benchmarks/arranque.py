@@ -0,0 +1,93 @@
+"""Tiempo de arranque de la herramienta (procesos nuevos, como desde un script).
+
+Cada caso lanza un intérprete nuevo '--repeticiones' veces y toma la
+mediana. La primera corrida de cada caso no se cuenta: deja compilado
+el bytecode, como pasa en una instalación que ya se usó una vez. La
+línea "python" es el piso: lo que tarda el intérprete solo.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.arranque
+    python -m benchmarks.arranque --productos 10000 --repeticiones 50
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Los datos del benchmark nunca tocan la carpeta real del proyecto
+os.environ["INVENTARIO_DATOS"] = tempfile.mkdtemp(prefix="bench_arranque_")
+
+from benchmarks.generador import CAMPOS, generar_productos_con_id  # noqa: E402
+
+
+# El menú es lo que ve quien lanza la herramienta: debe aparecer en menos
+OBJETIVO_MS = 50
+
+# (nombre, argumentos de python, entrada estándar)
+CASOS = [
+    ("python", ["-c", "pass"], None),
+    ("menú y salir", ["main.py"], "8\n"),
+    ("importar servicios", [
+        "-c", "import servicios.inventario_servicio, servicios.campo_servicio"
+    ], None),
+    ("listar inventario", [
+        "-c",
+        "from servicios.inventario_servicio import mostrar_inventario\n"
+        "ok, filas = mostrar_inventario(limite=20)\n"
+        "list(filas)",
+    ], None),
+]
+
+
+def _poblar(productos):
+    from servicios import almacenamiento
+
+    almacenamiento.guardar_campos(dict(CAMPOS))
+    almacenamiento.guardar_inventario(generar_productos_con_id(productos))
+
+
+def _correr(argumentos, entrada, entorno):
+    inicio = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *argumentos],
+        input=entrada, capture_output=True, text=True, check=True,
+        cwd=RAIZ, env=entorno,
+    )
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=1_000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    _poblar(args.productos)
+
+    entorno = dict(os.environ, PYTHONPATH=RAIZ)
+    # La corrida de calentamiento sí escribe el bytecode
+    calentamiento = {
+        clave: valor for clave, valor in entorno.items()
+        if clave != "PYTHONDONTWRITEBYTECODE"
+    }
+
+    print(f"{'caso':<22} {'mediana ms':>11} {'min ms':>9}")
+    for nombre, argumentos, entrada in CASOS:
+        _correr(argumentos, entrada, calentamiento)
+        tiempos = [_correr(argumentos, entrada, entorno) for _ in range(args.repeticiones)]
+
+        mediana = statistics.median(tiempos) * 1000
+        print(f"{nombre:<22} {mediana:>11.1f} {min(tiempos) * 1000:>9.1f}")
+
+        if nombre == "menú y salir" and mediana >= OBJETIVO_MS:
+            print(f"    (supera el objetivo de {OBJETIVO_MS} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compara la búsqueda parcial por recorrido lineal contra el índice de trigramas.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.busqueda_texto
+    python -m benchmarks.busqueda_texto --tamanios 10000 100000 --consultas 200
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# Los datos del benchmark nunca tocan la carpeta real del proyecto
+os.environ["INVENTARIO_DATOS"] = tempfile.mkdtemp(prefix="bench_busqueda_")
+
+from benchmarks.generador import CAMPOS, generar_inventario  # noqa: E402
+from servicios import almacenamiento, busquedas_servicio  # noqa: E402
+
+
+def _consultas(inventario, cantidad, semilla=0):
+    """Fragmentos de nombres existentes, de 3 a 8 caracteres."""
+
+    rng = random.Random(semilla)
+    consultas = []
+
+    for _ in range(cantidad):
+        nombre = rng.choice(inventario)["nombre"]
+        largo = rng.randint(3, min(8, len(nombre)))
+        inicio = rng.randint(0, len(nombre) - largo)
+        consultas.append(nombre[inicio:inicio + largo])
+
+    return consultas
+
+
+def _medir(consultas, con_indice):
+    busquedas_servicio.INDICE_TEXTO_ACTIVO = con_indice
+    resultados = []
+
+    inicio = time.perf_counter()
+    for consulta in consultas:
+        resultados.append(len(busquedas_servicio.buscar_producto(consulta, "nombre")))
+    total = time.perf_counter() - inicio
+
+    return total / len(consultas), resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--consultas", type=int, default=100)
+    args = parser.parse_args()
+
+    busquedas_servicio.UMBRAL_INDICE_TEXTO = 0
+    almacenamiento.guardar_campos(dict(CAMPOS))
+
+    print(
+        f"{'productos':>10} {'construir s':>12} {'recorrido ms':>13} "
+        f"{'índice ms':>10} {'mejora':>8}"
+    )
+
+    for cantidad in args.tamanios:
+        inventario = generar_inventario(cantidad)
+        almacenamiento.guardar_inventario(inventario)
+        consultas = _consultas(inventario, args.consultas)
+
+        inicio = time.perf_counter()
+        busquedas_servicio._INDICE_TRIGRAMAS.asegurar()
+        construccion = time.perf_counter() - inicio
+
+        recorrido, esperados = _medir(consultas, con_indice=False)
+        indice, obtenidos = _medir(consultas, con_indice=True)
+        assert obtenidos == esperados
+
+        print(
+            f"{cantidad:>10,} {construccion:>12.3f} {recorrido * 1000:>13.2f} "
+            f"{indice * 1000:>10.2f} {recorrido / indice:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Prueba de carga del servidor HTTP: latencia p50/p99 y peticiones por segundo.
+
+Arranca el servidor sobre una carpeta de datos temporal (o usa uno ya
+levantado con --url), carga un inventario inicial y lanza clientes
+concurrentes con conexiones persistentes que mezclan lecturas y altas.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.carga_servidor
+    python -m benchmarks.carga_servidor --clientes 50 --peticiones 20000 --escrituras 0.1
+    python -m benchmarks.carga_servidor --backend sqlite
+    python -m benchmarks.carga_servidor --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+
+from benchmarks.generador import CAMPOS, CAMPOS_UNICOS, generar_inventario, generar_producto
+
+
+class Cliente:
+    """Conexión HTTP/1.1 persistente mínima, suficiente para el servidor."""
+
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = None
+        self.red = None
+
+    async def pedir(self, metodo, ruta, cuerpo=None):
+        if self.red is None:
+            self.lector, self.red = await asyncio.open_connection(self.host, self.puerto)
+
+        datos = json.dumps(cuerpo).encode("utf-8") if cuerpo is not None else b""
+        self.red.write(
+            f"{metodo} {ruta} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Length: {len(datos)}\r\n\r\n".encode("latin-1") + datos
+        )
+        await self.red.drain()
+
+        cabecera = (await self.lector.readuntil(b"\r\n\r\n")).decode("latin-1")
+        estado = int(cabecera.split(" ", 2)[1])
+        largo = 0
+        for linea in cabecera.split("\r\n")[1:]:
+            nombre, _, valor = linea.partition(":")
+            if nombre.strip().lower() == "content-length":
+                largo = int(valor)
+        respuesta = json.loads(await self.lector.readexactly(largo))
+
+        if "connection: close" in cabecera.lower():
+            self.cerrar()
+        return estado, respuesta
+
+    def cerrar(self):
+        if self.red is not None:
+            self.red.close()
+            self.red = None
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+
+async def _preparar(host, puerto, productos):
+    cliente = Cliente(host, puerto)
+
+    for nombre, tipo in CAMPOS.items():
+        await cliente.pedir("POST", "/campos", {
+            "nombre": nombre, "tipo": tipo, "unico": nombre in CAMPOS_UNICOS
+        })
+
+    # En tandas para no armar un único cuerpo gigante
+    inventario = generar_inventario(productos)
+    for inicio in range(0, len(inventario), 5000):
+        await cliente.pedir("POST", "/productos/lote", {
+            "filas": inventario[inicio:inicio + 5000], "forzar": True
+        })
+
+    cliente.cerrar()
+    return inventario
+
+
+async def _cargar(host, puerto, clientes, peticiones, escrituras, inventario):
+    latencias = {"lectura": [], "escritura": []}
+    errores = []
+    restantes = [peticiones]
+    proximo_codigo = [len(inventario)]
+
+    async def trabajador(numero):
+        rng = random.Random(numero)
+        cliente = Cliente(host, puerto)
+
+        while restantes[0] > 0:
+            restantes[0] -= 1
+
+            if rng.random() < escrituras:
+                tipo = "escritura"
+                producto = generar_producto(proximo_codigo[0], rng)
+                proximo_codigo[0] += 1
+                pedido = ("POST", "/productos", {"datos": producto, "forzar": True})
+            else:
+                tipo = "lectura"
+                eleccion = rng.random()
+                if eleccion < 0.5:
+                    # Prefijo de un código: unas diez coincidencias
+                    fragmento = rng.choice(inventario)["codigo"][:7]
+                    pedido = ("GET", f"/productos/buscar?campo=codigo&valor={quote(fragmento)}", None)
+                elif eleccion < 0.8:
+                    stock = rng.randint(0, 500)
+                    pedido = ("POST", "/productos/consulta", {"condiciones": {
+                        "stock": stock, "precio": {"<": 1000}
+                    }})
+                else:
+                    desde = rng.randint(0, max(0, len(inventario) - 20))
+                    pedido = ("GET", f"/productos?desde={desde}&limite=20", None)
+
+            inicio = time.perf_counter()
+            estado, respuesta = await cliente.pedir(*pedido)
+            latencias[tipo].append(time.perf_counter() - inicio)
+
+            if estado != 200:
+                errores.append((estado, respuesta))
+
+        cliente.cerrar()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador(i) for i in range(clientes)))
+    return time.perf_counter() - inicio, latencias, errores
+
+
+def _arrancar_servidor(backend):
+    datos = tempfile.mkdtemp(prefix="bench_servidor_")
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(raiz, "servidor.py"), "--puerto", "0", "--datos", datos],
+        stdout=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "INVENTARIO_BACKEND": backend},
+    )
+
+    linea = proceso.stdout.readline()
+    if not linea.startswith("Escuchando en "):
+        proceso.kill()
+        raise SystemExit(f"El servidor no arrancó: {linea!r}")
+
+    return proceso, linea.split()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="servidor ya levantado (por defecto se arranca uno)")
+    parser.add_argument("--productos", type=int, default=20_000, help="inventario inicial")
+    parser.add_argument("--clientes", type=int, default=20)
+    parser.add_argument("--peticiones", type=int, default=5_000)
+    parser.add_argument("--escrituras", type=float, default=0.1, help="fracción de altas")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    proceso = None
+    url = args.url
+    if url is None:
+        proceso, url = _arrancar_servidor(args.backend)
+
+    partes = urlsplit(url)
+
+    try:
+        inventario = asyncio.run(_preparar(partes.hostname, partes.port, args.productos))
+        total, latencias, errores = asyncio.run(_cargar(
+            partes.hostname, partes.port, args.clientes, args.peticiones,
+            args.escrituras, inventario
+        ))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    print(
+        f"{args.peticiones:,} peticiones, {args.clientes} clientes, "
+        f"{args.productos:,} productos, {args.escrituras:.0%} escrituras"
+    )
+    print(f"{'tipo':>10} {'cantidad':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    todas = []
+    for tipo, valores in latencias.items():
+        todas.extend(valores)
+        if valores:
+            valores.sort()
+            print(
+                f"{tipo:>10} {len(valores):>9,} {_percentil(valores, 0.5) * 1000:>8.2f} "
+                f"{_percentil(valores, 0.99) * 1000:>8.2f}"
+            )
+
+    todas.sort()
+    print(
+        f"{'total':>10} {len(todas):>9,} {_percentil(todas, 0.5) * 1000:>8.2f} "
+        f"{_percentil(todas, 0.99) * 1000:>8.2f}"
+    )
+    print(f"peticiones por segundo: {len(todas) / total:,.1f}")
+
+    if errores:
+        print(f"{len(errores)} respuestas con error, por ejemplo: {errores[0]}")
+
+
+if __name__ == "__main__":
+    main()
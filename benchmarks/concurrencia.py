@@ -0,0 +1,143 @@
+"""Varios procesos escribiendo a la vez sobre la misma carpeta de datos.
+
+Cada proceso da de alta sus propios productos y además incrementa el
+stock de un producto compartido (leer y escribir, el caso que pierde
+actualizaciones sin control de concurrencia). Al final se verifica que
+no se perdió ninguna escritura confirmada.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.concurrencia
+    python -m benchmarks.concurrencia --procesos 8 --productos 100 --incrementos 50
+    python -m benchmarks.concurrencia --backend sqlite
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.generador import CAMPOS, CAMPOS_UNICOS, generar_producto
+
+
+CONTADOR = "CONTADOR"
+
+
+def _preparar(datos, backend):
+    # Los servicios leen la carpeta y el backend al importarse
+    os.environ["INVENTARIO_DATOS"] = datos
+    os.environ["INVENTARIO_BACKEND"] = backend
+
+    from servicios import almacenamiento, inventario_servicio
+    return almacenamiento, inventario_servicio
+
+
+def _trabajador(datos, backend, proceso, productos, incrementos):
+    almacenamiento, inventario_servicio = _preparar(datos, backend)
+    from servicios.busquedas_servicio import buscar_producto
+
+    @almacenamiento.reintentar_si_hay_conflicto
+    def incrementar():
+        # La lectura forma parte de la operación: si otro proceso
+        # modifica el contador antes de guardar, se repite entera
+        contador = buscar_producto(CONTADOR, "codigo")[0]
+        return inventario_servicio.modificar_producto(
+            {"codigo": CONTADOR},
+            {"stock": contador["stock"] + 1},
+            producto_elegido=contador,
+        )
+
+    rng = random.Random(proceso)
+    resultado = {"altas": 0, "incrementos": 0, "fallidas": 0}
+
+    inicio = time.perf_counter()
+
+    for i in range(productos):
+        producto = generar_producto(proceso * productos + i, rng)
+        ok, _ = inventario_servicio.agregar_producto(producto, forzar_agregar=True)
+        resultado["altas" if ok else "fallidas"] += 1
+
+    for _ in range(incrementos):
+        ok, _ = incrementar()
+        resultado["incrementos" if ok else "fallidas"] += 1
+
+    resultado["segundos"] = time.perf_counter() - inicio
+    resultado["reintentos"] = almacenamiento.reintentos_por_conflicto()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--productos", type=int, default=200, help="altas por proceso")
+    parser.add_argument("--incrementos", type=int, default=50, help="incrementos por proceso")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    # Los datos del benchmark nunca tocan la carpeta real del proyecto
+    datos = tempfile.mkdtemp(prefix="bench_concurrencia_")
+    almacenamiento, inventario_servicio = _preparar(datos, args.backend)
+
+    almacenamiento.guardar_campos(dict(CAMPOS))
+    almacenamiento.guardar_campos_unicos(list(CAMPOS_UNICOS))
+    contador = generar_producto(0, random.Random(0))
+    contador.update(codigo=CONTADOR, stock=0)
+    inventario_servicio.agregar_producto(contador, forzar_agregar=True)
+    eventos_iniciales = almacenamiento.contar_eventos()
+
+    trabajos = [
+        (datos, args.backend, proceso, args.productos, args.incrementos)
+        for proceso in range(args.procesos)
+    ]
+
+    # spawn: cada proceso arranca limpio, sin heredar cachés ni conexiones
+    contexto = multiprocessing.get_context("spawn")
+
+    inicio = time.perf_counter()
+    with contexto.Pool(args.procesos) as pool:
+        resultados = pool.starmap(_trabajador, trabajos)
+    total = time.perf_counter() - inicio
+
+    altas = sum(r["altas"] for r in resultados)
+    incrementos = sum(r["incrementos"] for r in resultados)
+    fallidas = sum(r["fallidas"] for r in resultados)
+    reintentos = sum(r["reintentos"] for r in resultados)
+
+    almacenamiento.invalidar_cache()
+    inventario = almacenamiento.ver_inventario()
+    codigos = {p["codigo"] for p in inventario}
+    stock = next(p["stock"] for p in inventario if p["codigo"] == CONTADOR)
+    eventos = almacenamiento.contar_eventos() - eventos_iniciales
+
+    print(f"backend {args.backend}, {args.procesos} procesos, carpeta {datos}")
+    print(f"{'proceso':>8} {'altas':>7} {'increm.':>8} {'fallidas':>9} {'reintentos':>11} {'s':>8}")
+    for proceso, r in enumerate(resultados):
+        print(
+            f"{proceso:>8} {r['altas']:>7} {r['incrementos']:>8} {r['fallidas']:>9} "
+            f"{r['reintentos']:>11} {r['segundos']:>8.2f}"
+        )
+
+    print(f"operaciones confirmadas por segundo: {(altas + incrementos) / total:,.1f}")
+    print(f"reintentos por conflicto: {reintentos}, operaciones sin confirmar: {fallidas}")
+
+    # Toda operación confirmada tiene que verse en los datos y en el historial
+    errores = []
+    if len(inventario) != altas + 1 or len(codigos) != len(inventario):
+        errores.append(f"productos: {len(inventario) - 1} en disco, {altas} confirmados")
+    if stock != incrementos:
+        errores.append(f"contador: {stock} en disco, {incrementos} confirmados")
+    if eventos != altas + incrementos:
+        errores.append(f"historial: {eventos} eventos, {altas + incrementos} confirmados")
+
+    if errores:
+        print("ESCRITURAS PERDIDAS:")
+        for error in errores:
+            print(f"  {error}")
+        raise SystemExit(1)
+
+    print("sin escrituras perdidas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Escrituras a disco por operación (backend JSON).
+
+Ejecuta una vez cada operación de los servicios sobre un inventario
+chico y cuenta, con las métricas de E/S, cuántas veces se escribió cada
+archivo de datos (el reemplazo atómico de un JSON o un anexado al
+historial cuentan como una escritura) y cuántos bytes.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.escrituras
+    python -m benchmarks.escrituras --productos 10000 --detalle
+"""
+
+import argparse
+import os
+import tempfile
+
+# Los datos del benchmark nunca tocan la carpeta real del proyecto
+os.environ["INVENTARIO_DATOS"] = tempfile.mkdtemp(prefix="bench_escrituras_")
+os.environ["INVENTARIO_BACKEND"] = "json"
+
+from benchmarks.generador import CAMPOS, generar_productos_con_id  # noqa: E402
+from servicios import almacenamiento, metricas  # noqa: E402
+from servicios import campo_servicio, campo_unico_servicio, inventario_servicio  # noqa: E402
+from servicios.papelera_servicio import listar_papelera  # noqa: E402
+
+
+def _operaciones():
+    """(nombre, llamada) en un orden en que cada una encuentra lo que necesita."""
+
+    def primero():
+        return almacenamiento.ver_inventario()[0]
+
+    def datos(**cambios):
+        return {
+            campo: valor for campo, valor in primero().items() if not campo.startswith("_")
+        } | cambios
+
+    def ultimo_registro():
+        return listar_papelera("producto")[-1]["id"]
+
+    return [
+        ("crear_campo", lambda: campo_servicio.crear_campo("marca", "texto")),
+        ("agregar_producto", lambda: inventario_servicio.agregar_producto(
+            datos(codigo="NUEVO", marca="x")
+        )),
+        ("agregar_productos_lote", lambda: inventario_servicio.agregar_productos_lote(
+            [datos(codigo=f"LOTE{i}", marca="x") for i in range(10)]
+        )),
+        ("modificar_producto", lambda: inventario_servicio.modificar_producto(
+            None, {"stock": "7"}, producto_elegido=primero()
+        )),
+        ("eliminar_producto", lambda: inventario_servicio.eliminar_producto(
+            None, producto_elegido=primero()
+        )),
+        ("restaurar_producto", lambda: inventario_servicio.restaurar_producto(ultimo_registro())),
+        ("desmarcar_campo_unico", lambda: campo_unico_servicio.desmarcar_campo_unico("codigo")),
+        ("modificar_campo (nombre y único)", lambda: campo_servicio.modificar_campo(
+            "codigo", "sku", unico=True
+        )),
+        ("modificar_campo (tipo)", lambda: campo_servicio.modificar_campo("stock", nuevo_tipo="texto")),
+        ("eliminar_campo (único)", lambda: campo_servicio.eliminar_campo("sku")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=1_000)
+    parser.add_argument("--detalle", action="store_true", help="escrituras por archivo")
+    args = parser.parse_args()
+
+    almacenamiento.guardar_campos(dict(CAMPOS))
+    almacenamiento.guardar_campos_unicos(["codigo"])
+    almacenamiento.guardar_inventario(generar_productos_con_id(args.productos))
+
+    # Los archivos que faltan se crean al leerlos por primera vez: no es
+    # una escritura de la operación que los lee
+    almacenamiento.ver_migraciones()
+    almacenamiento.ver_papelera()
+    almacenamiento.contar_eventos()
+
+    metricas.ACTIVAS = True
+
+    print(f"{'operación':<34} {'escrituras':>10} {'historial':>10} {'KB':>10}")
+    for nombre, llamada in _operaciones():
+        metricas.reiniciar()
+        ok, resultado = llamada()
+        if ok is not True:
+            raise SystemExit(f"{nombre}: {resultado}")
+
+        archivos = metricas.stats()["archivos"]
+        escrituras = sum(a["escrituras"] for a in archivos.values())
+        historial = archivos.get("historial.jsonl", {}).get("escrituras", 0)
+        escritos = sum(a["bytes_escritos"] for a in archivos.values())
+        print(f"{nombre:<34} {escrituras:>10} {historial:>10} {escritos / 1024:>10.1f}")
+
+        if args.detalle:
+            for archivo, datos in archivos.items():
+                if datos["escrituras"]:
+                    print(f"{'':<6}{archivo:<28} {datos['escrituras']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compara tiempo de guardado, tiempo de carga y tamaño del inventario por formato.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.formato_almacenamiento
+    python -m benchmarks.formato_almacenamiento --tamanios 10000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+# Los datos del benchmark nunca tocan la carpeta real del proyecto
+os.environ["INVENTARIO_DATOS"] = tempfile.mkdtemp(prefix="bench_formato_")
+
+from benchmarks.generador import CAMPOS, generar_productos_con_id  # noqa: E402
+from servicios import almacenamiento  # noqa: E402
+from utilidades.rutas import RUTA_INVENTARIO  # noqa: E402
+
+
+def medir(formato, inventario):
+    almacenamiento.FORMATO_ALMACENAMIENTO = formato
+    almacenamiento.guardar_campos(dict(CAMPOS))
+
+    inicio = time.perf_counter()
+    almacenamiento.guardar_inventario(inventario)
+    guardado = time.perf_counter() - inicio
+
+    tamanio = os.path.getsize(RUTA_INVENTARIO)
+
+    almacenamiento.invalidar_cache(RUTA_INVENTARIO)
+    inicio = time.perf_counter()
+    cargado = almacenamiento.ver_inventario()
+    carga = time.perf_counter() - inicio
+
+    assert cargado == inventario
+    return guardado, carga, tamanio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--tamanios", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'productos':>10} {'formato':>10} {'guardar s':>10} {'cargar s':>10} {'bytes':>14}")
+
+    for cantidad in args.tamanios:
+        inventario = generar_productos_con_id(cantidad)
+
+        for formato in almacenamiento.FORMATOS:
+            guardado, carga, tamanio = medir(formato, inventario)
+            print(
+                f"{cantidad:>10,} {formato:>10} {guardado:>10.3f} "
+                f"{carga:>10.3f} {tamanio:>14,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
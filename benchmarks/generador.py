@@ -0,0 +1,127 @@
+"""Datos sintéticos reproducibles para los benchmarks."""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+
+
+CAMPOS = {
+    "codigo": "texto",
+    "nombre": "texto",
+    "categoria": "texto",
+    "stock": "num entero",
+    "precio": "num decimal",
+    "activo": "v/f",
+    "alta": "fecha",
+}
+
+CAMPOS_UNICOS = ["codigo"]
+
+_PALABRAS = [
+    "tornillo", "tuerca", "arandela", "clavo", "bisagra", "cable", "llave",
+    "martillo", "destornillador", "pinza", "cinta", "lija", "taco", "broca",
+    "mecha", "sierra", "nivel", "metro", "pegamento", "silicona",
+]
+
+_CATEGORIAS = ["ferretería", "electricidad", "pintura", "plomería", "jardín"]
+
+
+def generar_producto(i, rng):
+    """Devuelve el producto número 'i' ya convertido a sus tipos."""
+
+    return {
+        "codigo": f"P{i:07d}",
+        "nombre": f"{rng.choice(_PALABRAS)} {rng.choice(_PALABRAS)} {i % 997}",
+        "categoria": rng.choice(_CATEGORIAS),
+        "stock": rng.randint(0, 500),
+        "precio": round(rng.uniform(1, 5000), 2),
+        "activo": rng.random() < 0.9,
+        "alta": f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(2015, 2025)}",
+    }
+
+
+def generar_inventario(cantidad, semilla=0):
+    rng = random.Random(semilla)
+    return [generar_producto(i, rng) for i in range(cantidad)]
+
+
+def _id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def generar_productos_con_id(cantidad, semilla=0):
+    """Como generar_inventario, con ids estables derivados de la semilla."""
+
+    rng = random.Random(semilla)
+    return [{"_id": _id(rng), **generar_producto(i, rng)} for i in range(cantidad)]
+
+
+def generar_historial(productos, eventos, semilla=0, inicio=datetime(2024, 1, 1)):
+    """Eventos con el formato de registrar_evento: el alta de cada producto
+    y, hasta completar 'eventos', modificaciones de stock al azar.
+
+    Los instantes avanzan un segundo por evento desde 'inicio'.
+    """
+
+    rng = random.Random(semilla)
+    actuales = [dict(producto) for producto in productos]
+
+    for numero in range(eventos):
+        if numero < len(actuales):
+            accion, antes, despues = "Alta", None, dict(actuales[numero])
+        else:
+            posicion = rng.randrange(len(actuales))
+            antes = actuales[posicion]
+            despues = dict(antes, stock=rng.randint(0, 500))
+            actuales[posicion] = despues
+            accion, antes, despues = "Modificación", dict(antes), dict(despues)
+
+        instante = inicio + timedelta(seconds=numero)
+        yield {
+            "id": f"evt_{numero + 1:06d}",
+            "timestamp": {
+                "humano": instante.strftime("%d/%m/%Y %H:%M"),
+                "iso": instante.isoformat(timespec="seconds"),
+            },
+            "accion": accion,
+            "entidad": "producto",
+            "entidad_id": (despues or antes)["_id"],
+            "antes": antes,
+            "despues": despues,
+            "meta": {},
+        }
+
+
+def generar_papelera(cantidad, campos=CAMPOS, vencidos=0.5, semilla=0, ahora=None):
+    """Registros de productos eliminados como los de enviar_a_papelera.
+
+    Una fracción 'vencidos' ya expiró respecto de 'ahora'; el resto vence
+    dentro de los próximos días. Los códigos no chocan con los de
+    generar_inventario.
+    """
+
+    rng = random.Random(semilla)
+    ahora = ahora or datetime.now()
+    registros = []
+
+    for i in range(cantidad):
+        if rng.random() < vencidos:
+            expira = ahora - timedelta(days=rng.randint(1, 30))
+        else:
+            expira = ahora + timedelta(days=rng.randint(1, 30))
+
+        producto = {"_id": _id(rng), **generar_producto(i, rng)}
+        producto["codigo"] = f"B{i:07d}"
+
+        registros.append({
+            "id": _id(rng),
+            "entidad": "producto",
+            "snapshot": producto,
+            "schema_snapshot": dict(campos),
+            "motivo": "eliminacion_producto",
+            "meta": {},
+            "fecha_eliminacion": (expira - timedelta(days=30)).isoformat(),
+            "expira_en": expira.isoformat(),
+        })
+
+    return registros
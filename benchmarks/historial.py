@@ -0,0 +1,170 @@
+"""Tamaño del historial y tiempos de escritura y reconstrucción.
+
+Registra la misma secuencia sintética de eventos de productos (altas,
+modificaciones de uno o dos campos y bajas) en dos configuraciones:
+
+    anterior     eventos con 'antes' y 'despues' completos, un único archivo
+    compactado   diferencias, rotación en segmentos, gzip de los segmentos
+                 fríos y snapshots periódicos del inventario
+
+y compara los bytes en disco, el tiempo de escritura y el de reconstruir
+el inventario final (recorriendo todo el historial, o desde el último
+snapshot). Por defecto sin fsync por evento (--fsync lo activa).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.historial
+    python -m benchmarks.historial --eventos 100000 --segmento-mb 4
+    python -m benchmarks.historial --eventos 20000 --fsync
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from benchmarks.generador import generar_producto
+
+
+def _secuencia(eventos, productos, semilla=0):
+    """Genera (accion, antes, despues, entidad_id) aplicando cada evento a 'productos'."""
+
+    rng = random.Random(semilla)
+    vivos = []
+    posiciones = {}
+
+    for i in range(eventos):
+        eleccion = rng.random()
+
+        if eleccion < 0.1 or len(vivos) < 100:
+            producto = {"_id": str(uuid.UUID(int=rng.getrandbits(128))), **generar_producto(i, rng)}
+            productos[producto["_id"]] = producto
+            posiciones[producto["_id"]] = len(vivos)
+            vivos.append(producto["_id"])
+            yield "Alta", None, dict(producto), producto["_id"]
+
+        elif eleccion < 0.92:
+            antes = productos[rng.choice(vivos)]
+            despues = dict(antes)
+            despues["stock"] = rng.randint(0, 500)
+            if rng.random() < 0.3:
+                despues["precio"] = round(rng.uniform(1, 5000), 2)
+            productos[despues["_id"]] = despues
+            yield "Modificación", dict(antes), dict(despues), despues["_id"]
+
+        else:
+            # Baja: el último de la lista ocupa el lugar del que sale
+            entidad_id = vivos[rng.randrange(len(vivos))]
+            ultimo = vivos.pop()
+            if ultimo != entidad_id:
+                vivos[posiciones[entidad_id]] = ultimo
+                posiciones[ultimo] = posiciones[entidad_id]
+            del posiciones[entidad_id]
+            yield "Eliminación", productos.pop(entidad_id), None, entidad_id
+
+
+def _bytes_en(ruta):
+    if os.path.isfile(ruta):
+        return os.path.getsize(ruta)
+    total = 0
+    for carpeta, _, archivos in os.walk(ruta):
+        total += sum(os.path.getsize(os.path.join(carpeta, a)) for a in archivos)
+    return total
+
+
+def _escenario(nombre, eventos, segmento_mb, intervalo_snapshot, fsync):
+    # Los servicios leen la carpeta de datos al importarse
+    datos = tempfile.mkdtemp(prefix=f"bench_historial_{nombre}_")
+    os.environ["INVENTARIO_DATOS"] = datos
+    os.environ["INVENTARIO_BACKEND"] = "json"
+
+    from servicios import almacenamiento, historial_servicio
+
+    compactado = nombre == "compactado"
+    almacenamiento.POLITICA_FSYNC_HISTORIAL = "siempre" if fsync else "nunca"
+    almacenamiento.TAMANIO_SEGMENTO_HISTORIAL = segmento_mb * 1024 * 1024 if compactado else None
+    almacenamiento.COMPRIMIR_SEGMENTOS = compactado
+    historial_servicio.DIFERENCIAS_HISTORIAL = compactado
+
+    # El inventario no se escribe (solo interesa el historial): los
+    # snapshots salen del estado de la secuencia, el mismo que
+    # registrar_evento tomaría del inventario
+    historial_servicio.INTERVALO_SNAPSHOT = None
+
+    productos = {}
+    inicio = time.perf_counter()
+    for numero, (accion, antes, despues, entidad_id) in enumerate(_secuencia(eventos, productos), 1):
+        historial_servicio.registrar_evento(
+            accion, "producto", antes=antes, despues=despues, entidad_id=entidad_id
+        )
+        if compactado and numero % intervalo_snapshot == 0:
+            almacenamiento.guardar_snapshot(numero, list(productos.values()))
+    escritura = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    recorridos = sum(1 for _ in almacenamiento.cargar_historial())
+    lectura = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    _, reconstruido = historial_servicio.reconstruir_estado()
+    reconstruccion = time.perf_counter() - inicio
+
+    return {
+        "escritura": escritura,
+        "lectura": lectura,
+        "reconstruccion": reconstruccion,
+        "correcto": recorridos == eventos and reconstruido == list(productos.values()),
+        "historial": _bytes_en(almacenamiento.RUTA_HISTORIAL_LOG)
+                     + _bytes_en(almacenamiento.RUTA_HISTORIAL_SEGMENTOS),
+        "snapshots": _bytes_en(almacenamiento.RUTA_HISTORIAL_SNAPSHOTS),
+        "segmentos": len(os.listdir(almacenamiento.RUTA_HISTORIAL_SEGMENTOS))
+                     if os.path.isdir(almacenamiento.RUTA_HISTORIAL_SEGMENTOS) else 0,
+        "datos": datos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eventos", type=int, default=1_000_000)
+    parser.add_argument("--segmento-mb", type=int, default=64, help="tamaño de rotación")
+    parser.add_argument("--snapshot", type=int, default=10_000, help="eventos entre snapshots")
+    parser.add_argument("--fsync", action="store_true", help="sincronizar cada evento a disco")
+    args = parser.parse_args()
+
+    # spawn: cada escenario importa los servicios con su propia carpeta
+    contexto = multiprocessing.get_context("spawn")
+    resultados = {}
+    for nombre in ("anterior", "compactado"):
+        with contexto.Pool(1) as pool:
+            resultados[nombre] = pool.apply(
+                _escenario, (nombre, args.eventos, args.segmento_mb, args.snapshot, args.fsync)
+            )
+
+    print(f"{args.eventos:,} eventos, segmentos de {args.segmento_mb} MiB, "
+          f"snapshot cada {args.snapshot:,}, fsync {'sí' if args.fsync else 'no'}")
+    print(f"{'':>12} {'historial MB':>13} {'snapshots MB':>13} {'segmentos':>10} "
+          f"{'escritura s':>12} {'lectura s':>10} {'reconstr. s':>12}")
+    for nombre, r in resultados.items():
+        print(
+            f"{nombre:>12} {r['historial'] / 1e6:>13.1f} {r['snapshots'] / 1e6:>13.1f} "
+            f"{r['segmentos']:>10} {r['escritura']:>12.1f} {r['lectura']:>10.1f} "
+            f"{r['reconstruccion']:>12.2f}"
+        )
+
+    anterior, compactado = resultados["anterior"], resultados["compactado"]
+    total_anterior = anterior["historial"] + anterior["snapshots"]
+    total_compactado = compactado["historial"] + compactado["snapshots"]
+    print(f"espacio: {1 - total_compactado / total_anterior:.0%} menos "
+          f"({total_anterior / 1e6:.1f} -> {total_compactado / 1e6:.1f} MB)")
+    print(f"escritura: {compactado['escritura'] / anterior['escritura'] - 1:+.0%} de tiempo")
+    print(f"reconstrucción: {anterior['reconstruccion'] / compactado['reconstruccion']:.0f}x más rápida")
+
+    for nombre, r in resultados.items():
+        if not r["correcto"]:
+            raise SystemExit(f"{nombre}: el historial no reconstruye el inventario final")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Memoria del inventario en memoria: lista de diccionarios contra columnas.
+
+Para cada tamaño arma el inventario sintético (benchmarks.generador)
+como lista de diccionarios y como TablaProductos (servicios.tabla_productos)
+y mide con tracemalloc lo que ocupa una vez armado ("MB") y el máximo
+mientras se arma ("pico MB"; la tabla se arma desde la lista). Los casos
+"con ocultos" agregan la migración que oculta un campo eliminado, que en
+la lista suma un diccionario anidado por producto.
+
+Los tiempos se toman en corridas aparte, sin tracemalloc: pasar la lista
+a columnas, la migración que oculta el campo y recorrer el inventario
+leyendo un campo de cada producto. Por último se mide leer el archivo
+del inventario (formato "filas") como lo hace almacenamiento, con y sin
+columnas.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.memoria
+    python -m benchmarks.memoria --tamanios 100000 1000000
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+# Los datos del benchmark nunca tocan la carpeta real del proyecto
+os.environ["INVENTARIO_DATOS"] = tempfile.mkdtemp(prefix="bench_memoria_")
+os.environ["INVENTARIO_BACKEND"] = "json"
+
+from benchmarks.generador import CAMPOS, generar_productos_con_id  # noqa: E402
+from servicios import almacenamiento  # noqa: E402
+from servicios.migraciones import aplicar_ultima_migracion  # noqa: E402
+from servicios.tabla_productos import TablaProductos  # noqa: E402
+from utilidades.rutas import RUTA_INVENTARIO  # noqa: E402
+
+
+OCULTAR = [{"accion": "ocultar", "campo": "categoria"}]
+
+
+def _armar(cantidad, columnas, ocultos):
+    """Devuelve (productos, segundos en columnas, segundos en ocultar)."""
+
+    productos = generar_productos_con_id(cantidad)
+
+    inicio = time.perf_counter()
+    if columnas:
+        productos = TablaProductos(productos, CAMPOS)
+    convertir = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    if ocultos:
+        aplicar_ultima_migracion(productos, OCULTAR)
+    ocultar = time.perf_counter() - inicio
+
+    return productos, convertir, ocultar
+
+
+def _trazar(funcion):
+    """Devuelve (resultado, MB retenidos, MB pico) de llamar a 'funcion'."""
+
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcion()
+    gc.collect()
+    actual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, actual / 2 ** 20, pico / 2 ** 20
+
+
+def _recorrer(productos):
+    inicio = time.perf_counter()
+    for producto in productos:
+        producto["stock"]
+    return time.perf_counter() - inicio
+
+
+def representaciones(cantidad):
+    print(
+        f"{'productos':>10} {'representación':<26} {'MB':>8} {'pico MB':>8} {'bytes/prod':>10} "
+        f"{'convertir s':>11} {'ocultar s':>9} {'recorrer s':>10}"
+    )
+
+    for ocultos in (False, True):
+        referencia = None
+
+        for columnas in (False, True):
+            productos, convertir, ocultar = _armar(cantidad, columnas, ocultos)
+            recorrer = _recorrer(productos)
+            if referencia is None:
+                referencia = productos
+            elif productos != referencia:
+                raise SystemExit("las columnas no dan los mismos productos que la lista")
+            del productos
+
+            _, actual, pico = _trazar(lambda: _armar(cantidad, columnas, ocultos)[0])
+
+            nombre = ("columnas" if columnas else "lista de dicts") + (" con ocultos" if ocultos else "")
+            print(
+                f"{cantidad:>10,} {nombre:<26} {actual:>8.1f} {pico:>8.1f} "
+                f"{actual * 2 ** 20 / cantidad:>10.0f} {convertir:>11.2f} {ocultar:>9.3f} {recorrer:>10.3f}"
+            )
+
+        del referencia
+
+
+def carga(cantidad):
+    almacenamiento.UMBRAL_COLUMNAS = None
+    almacenamiento.FORMATO_ALMACENAMIENTO = "filas"
+    almacenamiento.guardar_campos(dict(CAMPOS))
+    almacenamiento.guardar_inventario(generar_productos_con_id(cantidad))
+
+    print(f"{'productos':>10} {'carga del archivo':<26} {'MB':>8} {'pico MB':>8} {'s':>8}")
+
+    for umbral, nombre in ((None, "lista de dicts"), (0, "columnas")):
+        almacenamiento.UMBRAL_COLUMNAS = umbral
+
+        almacenamiento.invalidar_cache(RUTA_INVENTARIO)
+        gc.collect()
+        inicio = time.perf_counter()
+        almacenamiento.ver_inventario()
+        segundos = time.perf_counter() - inicio
+
+        almacenamiento.invalidar_cache(RUTA_INVENTARIO)
+        _, actual, pico = _trazar(almacenamiento.ver_inventario)
+        print(f"{cantidad:>10,} {nombre:<26} {actual:>8.1f} {pico:>8.1f} {segundos:>8.2f}")
+
+    almacenamiento.invalidar_cache(RUTA_INVENTARIO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for cantidad in args.tamanios:
+        representaciones(cantidad)
+        print()
+        carga(cantidad)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Suite de benchmarks de las operaciones principales del inventario.
+
+Cada caso corre en un proceso propio con una carpeta de datos nueva,
+poblada con datos sintéticos reproducibles (benchmarks.generador):
+campos, inventario, historial y papelera del tamaño indicado. Se miden
+'--repeticiones' llamadas de la operación; lo que cada repetición
+necesita preparar (p. ej. volver a llenar la papelera) no se cuenta.
+
+Los resultados se escriben en JSON (con el commit, la versión de Python
+y los parámetros) para comparar corridas entre commits con --comparar.
+
+Casos: agregar_producto, buscar_producto, buscar_similares,
+modificar_campo_nombre, modificar_campo_tipo, eliminar_producto,
+restaurar_producto, marcar_campo_unico, expiracion_papelera.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.suite
+    python -m benchmarks.suite --productos 100000 --salida base.json
+    python -m benchmarks.suite --casos buscar_producto buscar_similares
+    python -m benchmarks.suite --comparar base.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.generador import (
+    CAMPOS,
+    CAMPOS_UNICOS,
+    generar_historial,
+    generar_papelera,
+    generar_producto,
+    generar_productos_con_id,
+)
+
+
+def _poblar(parametros):
+    from servicios import almacenamiento
+
+    productos = generar_productos_con_id(parametros["productos"], parametros["semilla"])
+
+    almacenamiento.guardar_campos(dict(CAMPOS))
+    almacenamiento.guardar_campos_unicos(list(CAMPOS_UNICOS))
+    almacenamiento.guardar_historial(
+        generar_historial(productos, parametros["eventos"], parametros["semilla"])
+    )
+    almacenamiento.guardar_inventario(productos)
+    almacenamiento.guardar_papelera(
+        generar_papelera(parametros["papelera"], semilla=parametros["semilla"])
+    )
+
+
+def _fragmento(nombre, rng):
+    largo = rng.randint(3, min(8, len(nombre)))
+    inicio = rng.randint(0, len(nombre) - largo)
+    return nombre[inicio:inicio + largo]
+
+
+# Cada caso devuelve las repeticiones como pares (preparar, operación):
+# 'preparar' (o None) corre fuera de la medición
+
+def _caso_agregar_producto(rng, repeticiones):
+    from servicios.inventario_servicio import agregar_producto
+
+    def alta(i):
+        producto = generar_producto(i, rng)
+        producto["codigo"] = f"N{i:07d}"
+        return lambda: agregar_producto(producto)
+
+    return [(None, alta(i)) for i in range(repeticiones)]
+
+
+def _caso_buscar_producto(rng, repeticiones):
+    from servicios.almacenamiento import ver_inventario
+    from servicios.busquedas_servicio import buscar_producto
+
+    inventario = ver_inventario()
+
+    def busqueda():
+        fragmento = _fragmento(rng.choice(inventario)["nombre"], rng)
+        return lambda: buscar_producto(fragmento, "nombre")
+
+    return [(None, busqueda()) for _ in range(repeticiones)]
+
+
+def _caso_buscar_similares(rng, repeticiones):
+    from servicios.almacenamiento import ver_inventario
+    from servicios.busquedas_servicio import buscar_similares
+
+    inventario = ver_inventario()
+
+    def busqueda():
+        producto = rng.choice(inventario)
+        criterios = {
+            "nombre": _fragmento(producto["nombre"], rng),
+            "categoria": producto["categoria"][:4],
+        }
+        return lambda: buscar_similares(criterios)
+
+    return [(None, busqueda()) for _ in range(repeticiones)]
+
+
+def _caso_modificar_campo_nombre(rng, repeticiones):
+    from servicios.campo_servicio import modificar_campo
+
+    nombres = ("categoria", "rubro")
+    return [
+        (None, lambda i=i: modificar_campo(nombres[i % 2], nombres[(i + 1) % 2]))
+        for i in range(repeticiones)
+    ]
+
+
+def _caso_modificar_campo_tipo(rng, repeticiones):
+    from servicios.campo_servicio import modificar_campo
+
+    tipos = ("texto", "num entero")
+    return [
+        (None, lambda i=i: modificar_campo("stock", nuevo_tipo=tipos[i % 2]))
+        for i in range(repeticiones)
+    ]
+
+
+def _caso_eliminar_producto(rng, repeticiones):
+    from servicios.almacenamiento import ver_inventario
+    from servicios.inventario_servicio import eliminar_producto
+
+    # El producto se elige al preparar: la posición cambia con cada baja
+    elegido = {}
+
+    def preparar():
+        inventario = ver_inventario()
+        elegido["producto"] = inventario[rng.randrange(len(inventario))]
+
+    return [
+        (preparar, lambda: eliminar_producto(None, producto_elegido=elegido["producto"]))
+        for _ in range(repeticiones)
+    ]
+
+
+def _caso_restaurar_producto(rng, repeticiones):
+    from servicios.inventario_servicio import restaurar_producto
+    from servicios.papelera_servicio import listar_papelera
+
+    registros = listar_papelera("producto")
+    if len(registros) < repeticiones:
+        raise SystemExit("restaurar_producto: la papelera tiene menos registros vigentes que repeticiones")
+
+    return [
+        (None, lambda registro_id=registro["id"]: restaurar_producto(registro_id))
+        for registro in rng.sample(registros, repeticiones)
+    ]
+
+
+def _caso_marcar_campo_unico(rng, repeticiones):
+    from servicios.campo_unico_servicio import desmarcar_campo_unico, marcar_campo_unico
+
+    return [
+        (lambda: desmarcar_campo_unico("codigo"), lambda: marcar_campo_unico("codigo"))
+        for _ in range(repeticiones)
+    ]
+
+
+def _caso_expiracion_papelera(rng, repeticiones):
+    from servicios.almacenamiento import guardar_papelera, ver_papelera
+    from servicios.papelera_servicio import limpiar_expirados
+
+    # Cada repetición vuelve a encontrar la papelera llena, la mitad vencida
+    registros = [dict(registro) for registro in ver_papelera()]
+
+    return [
+        (lambda: guardar_papelera(list(registros)), limpiar_expirados)
+        for _ in range(repeticiones)
+    ]
+
+
+CASOS = {
+    nombre[len("_caso_"):]: funcion
+    for nombre, funcion in list(globals().items())
+    if nombre.startswith("_caso_")
+}
+
+
+def _correr_caso(nombre, parametros):
+    # Los servicios leen la carpeta de datos y el backend al importarse
+    datos = tempfile.mkdtemp(prefix=f"bench_suite_{nombre}_")
+    os.environ["INVENTARIO_DATOS"] = datos
+    os.environ["INVENTARIO_BACKEND"] = parametros["backend"]
+
+    try:
+        inicio = time.perf_counter()
+        _poblar(parametros)
+        rng = random.Random(parametros["semilla"])
+        repeticiones = CASOS[nombre](rng, parametros["repeticiones"])
+
+        # Los índices (registrados al importar los servicios del caso) se
+        # construyen antes de medir, como en el servidor
+        from servicios.indices import preparar_indices
+        preparar_indices()
+        preparacion = time.perf_counter() - inicio
+
+        tiempos = []
+        for preparar, operacion in repeticiones:
+            if preparar is not None:
+                preparar()
+
+            inicio = time.perf_counter()
+            resultado = operacion()
+            tiempos.append(time.perf_counter() - inicio)
+
+            # Una operación rechazada no mide lo que se quiere medir
+            if isinstance(resultado, tuple) and resultado[0] is False:
+                raise RuntimeError(f"{nombre}: la operación falló: {resultado[1]}")
+    finally:
+        shutil.rmtree(datos, ignore_errors=True)
+
+    return {
+        "repeticiones": len(tiempos),
+        "min_ms": round(min(tiempos) * 1000, 4),
+        "mediana_ms": round(statistics.median(tiempos) * 1000, 4),
+        "media_ms": round(statistics.fmean(tiempos) * 1000, 4),
+        "max_ms": round(max(tiempos) * 1000, 4),
+        "preparacion_s": round(preparacion, 3),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _comparar(resultados, anterior):
+    print(f"\ncomparación con {anterior.get('commit') or 'la corrida anterior'} (mediana):", file=sys.stderr)
+    print(f"{'caso':>24} {'antes ms':>10} {'ahora ms':>10} {'cambio':>8}", file=sys.stderr)
+
+    for nombre, caso in resultados["casos"].items():
+        previo = anterior.get("casos", {}).get(nombre)
+        if previo is None:
+            continue
+        cambio = caso["mediana_ms"] / previo["mediana_ms"] - 1 if previo["mediana_ms"] else 0
+        print(
+            f"{nombre:>24} {previo['mediana_ms']:>10.3f} {caso['mediana_ms']:>10.3f} {cambio:>+8.0%}",
+            file=sys.stderr,
+        )
+
+    if anterior.get("parametros") != resultados["parametros"]:
+        print("(las corridas usaron parámetros distintos)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productos", type=int, default=10_000)
+    parser.add_argument("--eventos", type=int, help="eventos del historial (por defecto, 2 por producto)")
+    parser.add_argument("--papelera", type=int, default=1_000, help="registros en la papelera")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--comparar", help="resultados JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    parametros = {
+        "productos": args.productos,
+        "eventos": args.eventos if args.eventos is not None else 2 * args.productos,
+        "papelera": args.papelera,
+        "repeticiones": args.repeticiones,
+        "semilla": args.semilla,
+        "backend": args.backend,
+    }
+
+    # spawn: cada caso importa los servicios con su propia carpeta
+    contexto = multiprocessing.get_context("spawn")
+    casos = {}
+    for nombre in args.casos:
+        print(f"{nombre}...", file=sys.stderr, flush=True)
+        with contexto.Pool(1) as pool:
+            casos[nombre] = pool.apply(_correr_caso, (nombre, parametros))
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": parametros,
+        "casos": casos,
+    }
+
+    texto = json.dumps(resultados, indent=4, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            _comparar(resultados, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
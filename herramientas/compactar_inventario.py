@@ -0,0 +1,32 @@
+"""Reescribe el inventario con las migraciones de esquema pendientes aplicadas.
+
+Uso (desde la raíz del proyecto):
+    python -m herramientas.compactar_inventario
+    python -m herramientas.compactar_inventario --datos /ruta/a/datos
+"""
+
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datos", help="carpeta de datos (por defecto, la del proyecto)")
+    args = parser.parse_args()
+
+    # La carpeta se fija antes de importar los servicios, que leen la ruta al cargarse
+    if args.datos:
+        os.environ["INVENTARIO_DATOS"] = os.path.abspath(args.datos)
+
+    from servicios import almacenamiento
+
+    migraciones = len(almacenamiento.ver_migraciones())
+
+    if almacenamiento.compactar_inventario():
+        print(f"Inventario reescrito en la versión {migraciones} del esquema.")
+    else:
+        print("El inventario ya estaba al día; no se reescribió.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Convierte una carpeta de datos a otro formato de almacenamiento.
+
+Uso (desde la raíz del proyecto):
+    python -m herramientas.convertir_formato compacto
+    python -m herramientas.convertir_formato filas --datos /ruta/a/datos
+"""
+
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("formato", choices=["indentado", "compacto", "filas"])
+    parser.add_argument("--datos", help="carpeta de datos (por defecto, la del proyecto)")
+    args = parser.parse_args()
+
+    # La carpeta se fija antes de importar los servicios, que leen la ruta al cargarse
+    if args.datos:
+        os.environ["INVENTARIO_DATOS"] = os.path.abspath(args.datos)
+
+    from servicios.almacenamiento import convertir_formato
+    from utilidades.rutas import DATA_DIR
+
+    antes = _tamanio_carpeta(DATA_DIR)
+    convertir_formato(args.formato)
+    despues = _tamanio_carpeta(DATA_DIR)
+
+    print(f"Datos en {DATA_DIR} convertidos a '{args.formato}'.")
+    print(f"Tamaño: {antes:,} -> {despues:,} bytes")
+
+
+def _tamanio_carpeta(carpeta):
+    if not os.path.isdir(carpeta):
+        return 0
+
+    return sum(
+        os.path.getsize(os.path.join(carpeta, nombre))
+        for nombre in os.listdir(carpeta)
+        if nombre.endswith(".json")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Migra una carpeta de datos del backend JSON al backend SQLite.
+
+Uso (desde la raíz del proyecto):
+    python -m herramientas.migrar_a_sqlite
+    python -m herramientas.migrar_a_sqlite --datos /ruta/a/datos --forzar
+
+Luego se usa el backend con INVENTARIO_BACKEND=sqlite (o
+almacenamiento.BACKEND = "sqlite"). Los archivos JSON no se borran.
+"""
+
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datos", help="carpeta de datos (por defecto, la del proyecto)")
+    parser.add_argument(
+        "--forzar", action="store_true",
+        help="reemplazar el contenido de una base SQLite existente"
+    )
+    args = parser.parse_args()
+
+    # La carpeta se fija antes de importar los servicios, que leen la ruta al cargarse
+    if args.datos:
+        os.environ["INVENTARIO_DATOS"] = os.path.abspath(args.datos)
+
+    from servicios import almacenamiento
+    from utilidades.rutas import RUTA_SQLITE
+
+    if os.path.exists(RUTA_SQLITE) and not args.forzar:
+        sys.exit(f"Ya existe {RUTA_SQLITE}; use --forzar para reemplazar su contenido.")
+
+    almacenamiento.BACKEND = "json"
+    campos = dict(almacenamiento.ver_campos())
+    campos_unicos = list(almacenamiento.ver_campos_unicos())
+    inventario = list(almacenamiento.ver_inventario())
+    papelera = list(almacenamiento.ver_papelera())
+    migraciones = list(almacenamiento.ver_migraciones())
+    eventos = almacenamiento.cargar_historial()  # se recorre recién al escribir
+
+    almacenamiento.BACKEND = "sqlite"
+    with almacenamiento.escritura_agrupada():
+        almacenamiento.guardar_campos(campos)
+        # Los productos ya vienen migrados: el registro conserva sus versiones
+        almacenamiento.guardar_migraciones(migraciones)
+        almacenamiento.guardar_inventario(inventario)
+        # Los índices UNIQUE se crean con los productos ya cargados
+        almacenamiento.guardar_campos_unicos(campos_unicos)
+        almacenamiento.guardar_papelera(papelera)
+        almacenamiento.guardar_historial(eventos)
+
+    print(f"Migración completa a {RUTA_SQLITE}:")
+    print(f"  campos: {len(campos)} ({len(campos_unicos)} únicos)")
+    print(f"  productos: {len(inventario)}")
+    print(f"  papelera: {len(papelera)}")
+    print(f"  eventos de historial: {almacenamiento.contar_eventos()}")
+
+
+if __name__ == "__main__":
+    main()
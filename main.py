@@ -1,19 +1,11 @@
-from servicios.campo_servicio import (
-    crear_campo,
-    modificar_campo,
-    eliminar_campo,
-    cargar_campos
-)
+from itertools import islice
 
-from servicios.inventario_servicio import (
-    agregar_producto,
-    mostrar_inventario,
-    modificar_producto,
-    eliminar_producto,
-    ordenar_inventario
-)
+# Los servicios se importan en cada opción del menú: mostrar el menú (o
+# salir) no paga la carga del almacenamiento ni de los índices
 
-from servicios.busquedas_servicio import buscar_producto
+
+# Filas que se muestran por página en el listado del inventario
+TAMANIO_PAGINA = 20
 
 
 def mostrar_menu():
@@ -25,10 +17,13 @@ def mostrar_menu():
     print("5. Mostrar inventario")
     print("6. Modificar producto")
     print("7. Eliminar producto")
-    print("8. Salir\n")
+    print("8. Salir")
+    print("9. Métricas\n")
 
 
 def pedir_datos_producto():
+    from servicios.campo_servicio import cargar_campos
+
     campos = cargar_campos()
     datos = {}
 
@@ -39,11 +34,78 @@ def pedir_datos_producto():
     return datos
 
 
+def mostrar_paginas(filas, siguientes=None):
+    """Muestra las filas de a una página, pidiendo confirmación para seguir.
+
+    'siguientes' es una función opcional que devuelve las filas restantes
+    cuando se agotan las primeras (p. ej. el resto de un orden parcial).
+    """
+
+    mostradas = 0
+
+    while True:
+        pagina = list(islice(filas, TAMANIO_PAGINA))
+
+        if len(pagina) < TAMANIO_PAGINA and siguientes is not None:
+            filas, siguientes = siguientes(), None
+            pagina += list(islice(filas, TAMANIO_PAGINA - len(pagina)))
+
+        for fila in pagina:
+            print({campo: valor for campo, valor in fila.items() if not campo.startswith("_")})
+        mostradas += len(pagina)
+
+        if len(pagina) < TAMANIO_PAGINA:
+            print(f"({mostradas} productos)")
+            return
+
+        if input("Enter para ver más, 'q' para volver: ").strip().lower() == "q":
+            return
+
+
+def mostrar_metricas():
+    """Resume las métricas y ofrece activarlas, reiniciarlas o volcarlas."""
+
+    from servicios import metricas
+
+    datos = metricas.stats()
+
+    if not datos["activas"]:
+        print("\nLas métricas están desactivadas.")
+        if input("¿Activarlas? (s/n): ").strip().lower() == "s":
+            metricas.ACTIVAS = True
+        return
+
+    print(f"\nMÉTRICAS (desde {datos['desde']}):")
+    operaciones = sorted(datos["operaciones"].items(), key=lambda o: -o[1]["total_ms"])
+    for nombre, op in operaciones:
+        print(
+            f"{nombre:<45} {op['llamadas']:>8} llamadas {op['media_ms']:>10.3f} ms prom. "
+            f"{op['max_ms']:>10.3f} ms máx. {op['errores']:>4} errores"
+        )
+
+    for nombre, archivo in datos["archivos"].items():
+        print(
+            f"{nombre:<45} {archivo['lecturas']:>6} lecturas ({archivo['bytes_leidos']} B) "
+            f"{archivo['escrituras']:>6} escrituras ({archivo['bytes_escritos']} B)"
+        )
+
+    opcion = input("\n'r' reinicia, 'v' vuelca a archivo, 'd' desactiva, Enter vuelve: ").strip().lower()
+    if opcion == "r":
+        metricas.reiniciar()
+    elif opcion == "v":
+        metricas.volcar()
+        print(f"Métricas guardadas en {metricas.RUTA_METRICAS}.")
+    elif opcion == "d":
+        metricas.ACTIVAS = False
+
+
 while True:
     mostrar_menu()
     opcion = input("Seleccione una opción: ").strip()
 
     if opcion == "1":
+        from servicios.campo_servicio import crear_campo
+
         nombre = input("Nombre del nuevo campo: ").strip()
         tipo = input('Tipo ("texto", "num entero", "num decimal", "v/f", "fecha"): ').strip()
 
@@ -51,6 +113,8 @@ while True:
         print(msg if not ok else "Campo creado correctamente.")
 
     elif opcion == "2":
+        from servicios.campo_servicio import modificar_campo
+
         nombre = input("Campo a modificar: ").strip()
         nuevo_nombre = input("Nuevo nombre (Enter para no cambiar): ").strip() or None
         nuevo_tipo = input("Nuevo tipo (Enter para no cambiar): ").strip() or None
@@ -59,11 +123,15 @@ while True:
         print(msg if not ok else "Campo modificado.")
 
     elif opcion == "3":
+        from servicios.campo_servicio import eliminar_campo
+
         nombre = input("Campo a eliminar: ").strip()
         ok, msg = eliminar_campo(nombre)
         print(msg if not ok else "Campo eliminado.")
 
     elif opcion == "4":
+        from servicios.inventario_servicio import agregar_producto
+
         datos = pedir_datos_producto()
         ok, resultado = agregar_producto(datos)
 
@@ -74,15 +142,33 @@ while True:
             print(resultado)
 
     elif opcion == "5":
-        ok, lista = mostrar_inventario()
+        from servicios.inventario_servicio import mostrar_inventario, ordenar_inventario
+
+        campo_orden = input("Ordenar por campo (Enter para no ordenar): ").strip()
+        siguientes = None
+
+        if campo_orden:
+            descendente = input("¿Descendente? (s/n): ").strip().lower() == "s"
+
+            # La primera página sale de un heap; el resto solo se ordena si se pide
+            ok, filas = ordenar_inventario(campo_orden, descendente, limite=TAMANIO_PAGINA)
+            if ok:
+                def siguientes():
+                    return ordenar_inventario(
+                        campo_orden, descendente, desde=TAMANIO_PAGINA
+                    )[1]
+        else:
+            ok, filas = mostrar_inventario()
+
         if not ok:
-            print(lista)
+            print(filas)
         else:
             print("\nINVENTARIO:")
-            for fila in lista:
-                print(fila)
+            mostrar_paginas(filas, siguientes)
 
     elif opcion == "6":
+        from servicios.inventario_servicio import modificar_producto
+
         campo = input("Campo para buscar: ").strip()
         valor = input("Valor a buscar: ").strip()
 
@@ -107,6 +193,8 @@ while True:
             print(resultado)
 
     elif opcion == "7":
+        from servicios.inventario_servicio import eliminar_producto
+
         campo = input("Campo para buscar: ").strip()
         valor = input("Valor: ").strip()
 
@@ -125,5 +213,8 @@ while True:
         print("Hasta luego.")
         break
 
+    elif opcion == "9":
+        mostrar_metricas()
+
     else:
         print("Opción inválida.")
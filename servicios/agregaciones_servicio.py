@@ -0,0 +1,452 @@
+"""Totales y conteos sobre el inventario, calculados por columna.
+
+Cada consulta lee solo los campos que usa, como una lista de valores por
+campo en el orden del inventario, y los procesa enteros: las condiciones
+dan máscaras de booleanos, agrupar da un código de grupo por producto.
+Con NumPy instalado las cuentas se hacen sobre arreglos (los números
+como float64: los enteros son exactos hasta 2**53); sin él, en Python
+puro, con los mismos resultados salvo el redondeo de las sumas.
+
+Las columnas del inventario actual quedan en un índice que se actualiza
+con cada alta, baja o modificación: las consultas repetidas no vuelven
+a recorrer los productos.
+"""
+
+from functools import lru_cache, reduce
+from itertools import compress, repeat
+from math import prod
+from operator import and_, eq, ge, gt, le, lt, mul, ne
+
+from servicios.almacenamiento import producto_publico, ver_campos, ver_inventario
+from servicios.indices import IndiceInventario
+from servicios.metricas import medir
+from servicios.validadores import CLAVES_ORDEN, CONVERSORES
+
+
+# NumPy es opcional; False fuerza el cálculo en Python puro
+NUMPY_ACTIVO = True
+
+OPERACIONES = ("cantidad", "suma", "minimo", "maximo", "promedio")
+
+OPERADORES = {"==": eq, "!=": ne, "<": lt, "<=": le, ">": gt, ">=": ge}
+
+TIPOS_NUMERICOS = ("num entero", "num decimal")
+
+# Tipos cuya clave comparable cabe en un float64: las fechas como
+# ordinales, los booleanos como 1.0 y 0.0
+_TIPOS_ARREGLO = (*TIPOS_NUMERICOS, "fecha", "v/f")
+
+
+@lru_cache(maxsize=None)
+def _importar_numpy():
+    # Al primer uso y no al importar el módulo: numpy tarda más en
+    # importarse que la herramienta en arrancar
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _numpy():
+    """El módulo numpy si está instalado y activo, o None."""
+
+    return _importar_numpy() if NUMPY_ACTIVO else None
+
+
+def _clave(tipo, valor):
+    """Valor comparable de un campo de tipo 'tipo', o None si no lo tiene."""
+
+    if tipo in TIPOS_NUMERICOS:
+        # type() y no isinstance(): un bool no es un número
+        return valor if type(valor) in (int, float) else None
+
+    if tipo == "v/f":
+        return valor if type(valor) is bool else None
+
+    if type(valor) is not str:
+        return None
+
+    clave = CLAVES_ORDEN.get(tipo)
+    if clave is None:
+        return valor
+    try:
+        return clave(valor)
+    except ValueError:
+        return None
+
+
+def _claves(tipo, valores):
+    if tipo in TIPOS_NUMERICOS:
+        return [valor if type(valor) in (int, float) else None for valor in valores]
+    return [_clave(tipo, valor) for valor in valores]
+
+
+def _agrupar(valores):
+    """Código de grupo de cada valor (en orden de aparición) y el valor de cada grupo."""
+
+    codigos = {}
+    return [codigos.setdefault(valor, len(codigos)) for valor in valores], list(codigos)
+
+
+def _leer_columna(inventario, campo):
+    # En columnas (ver servicios.tabla_productos) no pasa por cada producto
+    valores = getattr(inventario, "valores", None)
+    if valores is not None:
+        return valores(campo)
+    return [producto.get(campo) for producto in inventario]
+
+
+# COLUMNAS
+class _Columnas:
+    """Columnas de un inventario, leídas a pedido y guardadas.
+
+    'valores' tiene los valores tal cual (campo -> lista, None si el
+    producto no tiene el campo); 'derivadas' lo que se calcula a partir
+    de ellos (claves comparables, arreglos, grupos), que se descarta con
+    cualquier cambio.
+    """
+
+    def __init__(self, inventario):
+        self.inventario = inventario
+        self.valores = {}
+        self.derivadas = {}
+
+    def columna(self, campo):
+        valores = self.valores.get(campo)
+        if valores is None:
+            valores = self.valores[campo] = _leer_columna(self.inventario, campo)
+        return valores
+
+    def derivada(self, clave, calcular):
+        if clave not in self.derivadas:
+            self.derivadas[clave] = calcular()
+        return self.derivadas[clave]
+
+    def claves(self, campo, tipo):
+        return self.derivada(("claves", campo, tipo), lambda: _claves(tipo, self.columna(campo)))
+
+    def arreglo(self, numpy, campo, tipo):
+        """Las claves de un campo de _TIPOS_ARREGLO como float64 (NaN si falta)."""
+
+        return self.derivada(
+            ("arreglo", campo, tipo), lambda: numpy.array(self.claves(campo, tipo), dtype=float)
+        )
+
+    def grupos(self, campo):
+        return self.derivada(("grupos", campo), lambda: _agrupar(self.columna(campo)))
+
+
+class _IndiceColumnas(IndiceInventario):
+    """Las columnas ya leídas del inventario actual, al día con sus cambios."""
+
+    def __init__(self):
+        super().__init__()
+        self.reconstruir([])
+
+    def asegurar(self):
+        super().asegurar()
+        # Las columnas se leen a pedido: siempre del inventario vigente
+        self.columnas.inventario = ver_inventario()
+
+    def reconstruir(self, inventario):
+        self.columnas = _Columnas(inventario)
+
+    def alta(self, producto, posicion):
+        for campo, valores in self.columnas.valores.items():
+            valores.insert(posicion, producto.get(campo))
+        self.columnas.derivadas.clear()
+
+    def altas(self, productos, posicion):
+        for campo, valores in self.columnas.valores.items():
+            valores[posicion:posicion] = [producto.get(campo) for producto in productos]
+        self.columnas.derivadas.clear()
+
+    def baja(self, producto, posicion):
+        for valores in self.columnas.valores.values():
+            del valores[posicion]
+        self.columnas.derivadas.clear()
+
+    def modificacion(self, antes, despues, posicion):
+        for campo, valores in self.columnas.valores.items():
+            valores[posicion] = despues.get(campo)
+        self.columnas.derivadas.clear()
+
+
+_INDICE_COLUMNAS = _IndiceColumnas()
+
+
+def _columnas(inventario):
+    """Las columnas del inventario actual (guardadas entre consultas) o las de 'inventario'."""
+
+    if inventario is None or inventario is ver_inventario():
+        _INDICE_COLUMNAS.asegurar()
+        return _INDICE_COLUMNAS.columnas
+    return _Columnas(inventario)
+
+
+# CONDICIONES
+def _validar_condiciones(condiciones, campos):
+    """Devuelve (condiciones con el valor como clave comparable, None) o (None, mensaje)."""
+
+    validas = []
+
+    for campo, operador, valor in condiciones:
+        if campo not in campos:
+            return None, f"El campo '{campo}' no existe."
+        if operador not in OPERADORES:
+            return None, f"Operador inválido: '{operador}'."
+
+        tipo = campos[campo]
+        clave = _clave(tipo, CONVERSORES[tipo](valor))
+        if clave is None:
+            return None, f"Valor inválido para el campo '{campo}'."
+        validas.append((campo, operador, clave))
+
+    return validas, None
+
+
+def _mascara(columnas, condiciones, campos, numpy):
+    """Máscara de los productos que cumplen todas las condiciones, o None si no hay.
+
+    Un producto sin valor en el campo de una condición no la cumple,
+    tampoco con "!=".
+    """
+
+    mascara = None
+
+    for campo, operador, valor in condiciones:
+        tipo = campos[campo]
+        comparar = OPERADORES[operador]
+
+        if numpy is not None and tipo in _TIPOS_ARREGLO:
+            arreglo = columnas.arreglo(numpy, campo, tipo)
+            cumple = comparar(arreglo, valor) & ~numpy.isnan(arreglo)
+        else:
+            cumple = [clave is not None and comparar(clave, valor) for clave in columnas.claves(campo, tipo)]
+            if numpy is not None:
+                cumple = numpy.array(cumple, dtype=bool)
+
+        if mascara is None:
+            mascara = cumple
+        elif numpy is not None:
+            mascara = mascara & cumple
+        else:
+            mascara = list(map(and_, mascara, cumple))
+
+    return mascara
+
+
+# CÁLCULO
+def _valores(columnas, campos, tipos, numpy):
+    """Los números a resumir: el campo o el producto de los campos, fila a fila."""
+
+    if not campos:
+        total = len(columnas.inventario)
+        return numpy.zeros(total) if numpy is not None else repeat(0, total)
+
+    if numpy is not None:
+        return columnas.derivada(("arreglo", campos), lambda: reduce(mul, (
+            columnas.arreglo(numpy, campo, tipos[campo]) for campo in campos
+        )))
+
+    if len(campos) == 1:
+        return columnas.claves(campos[0], tipos[campos[0]])
+    return columnas.derivada(("producto", campos), lambda: [
+        None if None in fila else prod(fila)
+        for fila in zip(*(columnas.claves(campo, tipos[campo]) for campo in campos))
+    ])
+
+
+def _acumular_python(valores, mascara, codigos, grupos):
+    """(cantidad, suma, mínimo, máximo) de cada grupo, en Python puro."""
+
+    if mascara is not None:
+        valores = compress(valores, mascara)
+        if codigos is not None:
+            codigos = compress(codigos, mascara)
+
+    if codigos is None:
+        por_grupo = [[valor for valor in valores if valor is not None]]
+    else:
+        por_grupo = [[] for _ in range(grupos)]
+        anexar = [valores_grupo.append for valores_grupo in por_grupo]
+        for valor, codigo in zip(valores, codigos):
+            if valor is not None:
+                anexar[codigo](valor)
+
+    return [
+        (len(valores_grupo), sum(valores_grupo), min(valores_grupo, default=None), max(valores_grupo, default=None))
+        for valores_grupo in por_grupo
+    ]
+
+
+def _acumular_numpy(numpy, valores, mascara, codigos, grupos):
+    """Como _acumular_python, sobre arreglos."""
+
+    validos = ~numpy.isnan(valores)
+    if mascara is not None:
+        validos &= mascara
+    valores = valores[validos]
+
+    if codigos is None:
+        if not valores.size:
+            return [(0, 0.0, None, None)]
+        return [(int(valores.size), float(valores.sum()), float(valores.min()), float(valores.max()))]
+
+    codigos = codigos[validos]
+    cantidades = numpy.bincount(codigos, minlength=grupos)
+    sumas = numpy.bincount(codigos, weights=valores, minlength=grupos)
+    minimos = numpy.full(grupos, numpy.inf)
+    numpy.minimum.at(minimos, codigos, valores)
+    maximos = numpy.full(grupos, -numpy.inf)
+    numpy.maximum.at(maximos, codigos, valores)
+
+    return [
+        (cantidad, suma, minimo if cantidad else None, maximo if cantidad else None)
+        for cantidad, suma, minimo, maximo in zip(
+            cantidades.tolist(), sumas.tolist(), minimos.tolist(), maximos.tolist()
+        )
+    ]
+
+
+def _resumen(acumulado, operaciones, enteros):
+    cantidad, suma, minimo, maximo = acumulado
+
+    # NumPy cuenta en float64: los campos enteros vuelven a int
+    if enteros:
+        suma = int(suma)
+        if cantidad:
+            minimo, maximo = int(minimo), int(maximo)
+    else:
+        suma = float(suma)
+
+    calculados = {
+        "cantidad": cantidad,
+        "suma": suma,
+        "minimo": minimo,
+        "maximo": maximo,
+        "promedio": suma / cantidad if cantidad else None,
+    }
+    return {operacion: calculados[operacion] for operacion in operaciones}
+
+
+# CONSULTAS
+@medir()
+def resumir(campo=None, operaciones=OPERACIONES, condiciones=(), agrupar_por=None, inventario=None):
+    """Cantidad, suma, mínimo, máximo y promedio de un campo numérico.
+
+    'campo' es un campo numérico o una tupla de campos numéricos que se
+    multiplican producto a producto (("stock", "precio") da el valor del
+    stock); sin campo solo se cuentan productos. Solo entran los
+    productos que cumplen todas las 'condiciones', tuplas (campo,
+    operador, valor) con un operador de OPERADORES, y que tienen un
+    número en cada campo a resumir.
+
+    Devuelve (True, {operación: valor}) o, con 'agrupar_por', (True,
+    {valor del campo: {operación: valor}}) con los grupos en orden de
+    aparición, sin los que quedan vacíos; (False, mensaje) si un campo,
+    operación o condición no es válido.
+    """
+
+    campos = ver_campos()
+    a_resumir = () if campo is None else (campo,) if isinstance(campo, str) else tuple(campo)
+
+    for nombre in a_resumir:
+        if nombre not in campos:
+            return False, f"El campo '{nombre}' no existe."
+        if campos[nombre] not in TIPOS_NUMERICOS:
+            return False, f"El campo '{nombre}' no es numérico."
+
+    for operacion in operaciones:
+        if operacion not in OPERACIONES:
+            return False, f"Operación inválida: '{operacion}'."
+        if not a_resumir and operacion != "cantidad":
+            return False, f"La operación '{operacion}' necesita un campo numérico."
+
+    if agrupar_por is not None and agrupar_por not in campos:
+        return False, f"El campo '{agrupar_por}' no existe."
+
+    condiciones, error = _validar_condiciones(condiciones, campos)
+    if error:
+        return False, error
+
+    numpy = _numpy()
+    columnas = _columnas(inventario)
+    mascara = _mascara(columnas, condiciones, campos, numpy)
+    valores = _valores(columnas, a_resumir, campos, numpy)
+
+    if agrupar_por is None:
+        codigos, grupos = None, [None]
+    else:
+        codigos, grupos = columnas.grupos(agrupar_por)
+        if numpy is not None:
+            codigos = columnas.derivada(("codigos", agrupar_por), lambda: numpy.array(codigos, dtype=numpy.intp))
+
+    if numpy is not None:
+        acumulados = _acumular_numpy(numpy, valores, mascara, codigos, len(grupos))
+    else:
+        acumulados = _acumular_python(valores, mascara, codigos, len(grupos))
+
+    enteros = all(campos[nombre] == "num entero" for nombre in a_resumir)
+    if agrupar_por is None:
+        return True, _resumen(acumulados[0], operaciones, enteros)
+
+    return True, {
+        grupo: _resumen(acumulado, operaciones, enteros)
+        for grupo, acumulado in zip(grupos, acumulados)
+        if acumulado[0]
+    }
+
+
+@medir()
+def contar(condiciones=(), agrupar_por=None, inventario=None):
+    """Cantidad de productos que cumplen las condiciones (ver resumir).
+
+    Devuelve (True, cantidad) o, con 'agrupar_por', (True, {valor del
+    campo: cantidad}); (False, mensaje) si algo no es válido.
+    """
+
+    ok, resultado = resumir(
+        operaciones=("cantidad",), condiciones=condiciones, agrupar_por=agrupar_por, inventario=inventario
+    )
+    if not ok:
+        return False, resultado
+
+    if agrupar_por is None:
+        return True, resultado["cantidad"]
+    return True, {grupo: resumen["cantidad"] for grupo, resumen in resultado.items()}
+
+
+@medir()
+def mascara(condiciones, inventario=None):
+    """Un booleano por producto, en orden: True si cumple todas las condiciones.
+
+    Devuelve (True, lista de booleanos) o (False, mensaje).
+    """
+
+    campos = ver_campos()
+    condiciones, error = _validar_condiciones(condiciones, campos)
+    if error:
+        return False, error
+
+    columnas = _columnas(inventario)
+    cumple = _mascara(columnas, condiciones, campos, _numpy())
+    if cumple is None:
+        return True, [True] * len(columnas.inventario)
+    return True, list(cumple) if isinstance(cumple, list) else cumple.tolist()
+
+
+@medir()
+def filtrar(condiciones, inventario=None):
+    """Copias de los productos que cumplen todas las condiciones, en orden.
+
+    Devuelve (True, productos) o (False, mensaje).
+    """
+
+    ok, cumple = mascara(condiciones, inventario)
+    if not ok:
+        return False, cumple
+
+    productos = _columnas(inventario).inventario
+    return True, [producto_publico(producto) for producto in compress(productos, cumple)]
@@ -1,83 +1,1250 @@
+import functools
 import json
 import os
+import time
+from contextlib import contextmanager
 
+from servicios import metricas
+from servicios.bloqueo import bloqueo
+from servicios.historial_indice import IndiceHistorial
+from servicios.historial_segmentos import (
+    abrir_segmento,
+    comprimir_frios,
+    listar_segmentos,
+    rotar,
+)
+from servicios.migraciones import (
+    CAMPO_VERSION,
+    migrar_productos,
+    aplicar_ultima_migracion,
+)
+from servicios.modelo import (
+    CAMPO_ID,
+    ConflictoConcurrencia,
+    DatosCorruptos,
+    nuevo_id_producto,
+)
+from servicios.tabla_productos import CAMPO_OCULTOS, TablaProductos, a_json
 from utilidades.rutas import (
-    DATA_DIR,
     RUTA_CAMPOS,
     RUTA_CAMPOS_UNICOS,
     RUTA_INVENTARIO,
     RUTA_HISTORIAL,
-    RUTA_PAPELERA
+    RUTA_HISTORIAL_LOG,
+    RUTA_HISTORIAL_INDICE,
+    RUTA_HISTORIAL_SEGMENTOS,
+    RUTA_HISTORIAL_SNAPSHOTS,
+    RUTA_PAPELERA,
+    RUTA_MIGRACIONES,
+    RUTA_GRUPO_PENDIENTE,
+    RUTA_BLOQUEO,
+    RUTA_VERSIONES,
+    asegurar_estructura
 )
+from servicios.metricas import medir
+
+# gzip, random, shutil y tempfile se importan donde se usan: una
+# invocación que solo lee no los necesita y el arranque no los paga
+
+
+# Backend de almacenamiento: "json" (un archivo por conjunto de datos) o
+# "sqlite" (ver almacenamiento_sqlite). Debe elegirse antes del primer uso.
+BACKEND = os.environ.get("INVENTARIO_BACKEND", "json")
+
+
+# Política de fsync del historial: "siempre", "nunca" o un entero N
+# (sincroniza cada N eventos). "siempre" garantiza que un evento
+# registrado sobrevive a un corte de energía.
+POLITICA_FSYNC_HISTORIAL = "siempre"
+
+# Rotación del historial: al superar este tamaño (bytes) el registro
+# activo pasa a ser un segmento fechado (None: no rota). Los segmentos
+# salvo los SEGMENTOS_SIN_COMPRIMIR más recientes se comprimen con gzip
+# si COMPRIMIR_SEGMENTOS está activo.
+TAMANIO_SEGMENTO_HISTORIAL = 64 * 1024 * 1024
+COMPRIMIR_SEGMENTOS = True
+SEGMENTOS_SIN_COMPRIMIR = 1
+
+# Snapshots del inventario que se conservan (ver guardar_snapshot)
+SNAPSHOTS_CONSERVADOS = 2
+
+
+# Formato en disco. None conserva el formato detectado al leer cada
+# archivo (indentado si es nuevo). "indentado" y "compacto" son JSON con
+# y sin espacios; "filas" guarda el inventario como listas de valores en
+# el orden de campos.json (sin repetir los nombres) y el resto compacto.
+FORMATO_ALMACENAMIENTO = None
+FORMATOS = ("indentado", "compacto", "filas")
+
+# Formato con el que se leyó cada archivo: ruta -> formato
+_FORMATOS_DETECTADOS = {}
+
+# Desde cuántos productos el inventario en memoria se guarda en columnas
+# (ver servicios.tabla_productos) en lugar de como lista de diccionarios.
+# Ocupa menos de la mitad pero cada lectura cuesta más: por debajo de
+# este tamaño conviene la lista. None: nunca. No cambia nada en disco.
+UMBRAL_COLUMNAS = 500_000
+
+
+# Caché en memoria: ruta -> (firma del archivo, datos)
+_CACHE = {}
+
+# Contador de cambios por ruta (recargas y escrituras)
+_VERSIONES = {}
+
+# Escrituras diferidas de la escritura agrupada en curso: ruta -> datos,
+# los eventos del historial que se anexan al confirmarla (evento, numerar)
+# y las funciones que corren después de confirmarla (ver al_confirmar)
+_GRUPO = None
+_EVENTOS_GRUPO = []
+_AL_CONFIRMAR = []
+
+# Control de concurrencia entre procesos. Cada conjunto de datos tiene un
+# contador de escrituras en RUTA_VERSIONES que se avanza con el bloqueo
+# tomado. _BASES guarda el contador con el que se leyó lo que está en
+# caché, y _OPERACION (durante una operación, ver operacion()) el de cada
+# conjunto la primera vez que la operación lo leyó.
+_BASES = {}
+_OPERACION = None
+
+# Reintentos de una operación que encontró un conflicto
+REINTENTOS_CONFLICTO = 10
+_ESTADO_CONCURRENCIA = {"reintentos": 0}
+
+# "preparado": la carpeta de datos ya se preparó en este proceso (ver
+# _preparar_datos). "sin_compactar": el inventario en memoria tiene
+# migraciones que el archivo todavía no (ver compactar_inventario)
+_ESTADO = {"preparado": False, "sin_compactar": False}
+
+
+def _delegable(funcion):
+    """Deriva la llamada a la función homónima del backend SQLite si está elegido."""
+
+    nombre = funcion.__name__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if BACKEND == "sqlite":
+            from servicios import almacenamiento_sqlite
+            return getattr(almacenamiento_sqlite, nombre)(*args, **kwargs)
+        return funcion(*args, **kwargs)
+
+    return envoltura
+
+
+
+def _volcar_temporal(ruta, escribir_contenido):
+    """Escribe un temporal junto a 'ruta', lo sincroniza a disco y devuelve su ruta.
+
+    El temporal queda en la misma carpeta para que os.replace sea atómico.
+    """
+
+    import tempfile
+
+    carpeta = os.path.dirname(ruta)
+    os.makedirs(carpeta, exist_ok=True)
+
+    descriptor, temporal = tempfile.mkstemp(
+        dir=carpeta,
+        prefix="." + os.path.basename(ruta) + ".",
+        suffix=".tmp"
+    )
+
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            # mkstemp crea el archivo con permisos 0600: se conservan los del original
+            try:
+                os.chmod(temporal, os.stat(ruta).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(temporal, 0o644)
+
+            escribir_contenido(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+            if metricas.ACTIVAS:
+                metricas.contar_escritura(ruta, os.fstat(f.fileno()).st_size)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+    return temporal
+
+
+def _codificar_filas(inventario):
+    """Convierte el inventario al formato "filas".
+
+    Los productos que tienen exactamente su id y los campos definidos, en
+    la versión vigente del esquema, se guardan como lista de valores (la
+    versión se anota una sola vez para todo el archivo); los demás (con
+    campos faltantes u ocultos) se guardan tal cual como objeto.
+    """
+
+    columnas = [CAMPO_ID, *ver_campos()]
+    version = len(ver_migraciones())
+
+    # En columnas, las filas se arman columna por columna
+    if isinstance(inventario, TablaProductos):
+        return {
+            "formato": "filas", "columnas": columnas, "version": version,
+            "filas": inventario.filas(columnas, version),
+        }
+
+    cantidad = len(columnas) + (1 if version else 0)
+    filas = []
+
+    for producto in inventario:
+        if len(producto) == cantidad and producto.get(CAMPO_VERSION, 0) == version:
+            try:
+                filas.append([producto[campo] for campo in columnas])
+                continue
+            except KeyError:
+                pass
+        filas.append(producto)
+
+    return {"formato": "filas", "columnas": columnas, "version": version, "filas": filas}
+
+
+def _decodificar_filas(contenido):
+    """Convierte el formato "filas" de vuelta a productos (o a una TablaProductos)."""
+
+    columnas = contenido["columnas"]
+    version = contenido.get("version", 0)
+
+    # Un inventario grande va directo a columnas, sin un dict por producto
+    if UMBRAL_COLUMNAS is not None and len(contenido["filas"]) >= UMBRAL_COLUMNAS:
+        return TablaProductos.desde_filas(
+            columnas, contenido["filas"], ver_campos(),
+            {CAMPO_VERSION: version} if version else None,
+        )
+
+    inventario = []
+
+    for fila in contenido["filas"]:
+        if type(fila) is list:
+            fila = dict(zip(columnas, fila))
+            if version:
+                fila[CAMPO_VERSION] = version
+        inventario.append(fila)
+
+    return inventario
+
+
+@medir("almacenamiento.serializar")
+def _serializar(ruta, datos):
+    """Devuelve el texto a escribir según el formato vigente para 'ruta'."""
+
+    formato = FORMATO_ALMACENAMIENTO or _FORMATOS_DETECTADOS.get(ruta, "indentado")
+
+    if formato == "filas" and ruta == RUTA_INVENTARIO:
+        datos = _codificar_filas(datos)
+    elif isinstance(datos, TablaProductos):
+        # Por 'default' cada valor pasaría por un nivel más del codificador
+        datos = datos.diccionarios()
+
+    if formato == "indentado":
+        return json.dumps(datos, indent=4, ensure_ascii=False, default=a_json)
+
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":"), default=a_json)
+
+
+@medir("almacenamiento.deserializar")
+def _deserializar(ruta, texto):
+    """Interpreta el contenido de un archivo detectando su formato."""
+
+    datos = json.loads(texto)
+
+    if ruta == RUTA_INVENTARIO and isinstance(datos, dict):
+        _FORMATOS_DETECTADOS[ruta] = "filas"
+        return _decodificar_filas(datos)
+
+    _FORMATOS_DETECTADOS[ruta] = "indentado" if "\n" in texto[:100] else "compacto"
+    return datos
+
+
+def _volcar_json(ruta, datos):
+    """Serializa 'datos' en un temporal junto a 'ruta' y devuelve la ruta del temporal."""
+
+    texto = _serializar(ruta, datos)
+    return _volcar_temporal(ruta, lambda f: f.write(texto))
+
+
+def _recuperar_grupo_pendiente():
+    """Completa una escritura agrupada interrumpida por una caída.
+
+    El diario solo existe entre que todos los temporales quedaron en disco
+    y el último reemplazo, así que terminarlo nunca mezcla estados.
+    """
+
+    # Con el bloqueo: el diario de otro proceso que está confirmando no
+    # es el de una caída
+    with bloqueo(RUTA_BLOQUEO):
+        if not os.path.exists(RUTA_GRUPO_PENDIENTE):
+            return
+
+        with open(RUTA_GRUPO_PENDIENTE, "r", encoding="utf-8") as f:
+            reemplazos = json.load(f)
+
+        for destino, temporal in reemplazos.items():
+            if os.path.exists(temporal):
+                os.replace(temporal, destino)
+
+        os.remove(RUTA_GRUPO_PENDIENTE)
+
+
+def _preparar_datos():
+    """Crea la carpeta de datos y completa un grupo pendiente, una vez por proceso.
+
+    Se llama antes de cada lectura y confirmación; después de la primera
+    no cuesta nada.
+    """
+
+    if _ESTADO["preparado"]:
+        return
+
+    asegurar_estructura()
+    _recuperar_grupo_pendiente()
+    _ESTADO["preparado"] = True
+
+
+def _crear_archivo(ruta, valor_inicial):
+    """Crea el archivo con su valor inicial si todavía no existe."""
+
+    with bloqueo(RUTA_BLOQUEO):
+        if not os.path.exists(ruta):
+            os.replace(_volcar_json(ruta, valor_inicial), ruta)
+
+
+def _firma_archivo(ruta):
+    """Devuelve (mtime, tamaño) del archivo para detectar cambios externos."""
+
+    estado = os.stat(ruta)
+    return estado.st_mtime_ns, estado.st_size
+
+
+def _actualizar_cache(ruta, firma, datos):
+    """Guarda los datos en caché y avanza la versión de la ruta."""
+
+    _CACHE[ruta] = (firma, datos)
+    _VERSIONES[ruta] = _VERSIONES.get(ruta, 0) + 1
+
+
+def _leer(ruta, valor_inicial):
+    """Devuelve los datos de la caché, releyendo el archivo solo si cambió."""
+
+    # Dentro de una escritura agrupada lo pendiente es lo vigente
+    if _GRUPO is not None and ruta in _GRUPO:
+        return _CACHE[ruta][1]
+
+    # El inventario en caché tiene aplicadas las migraciones conocidas:
+    # si otro proceso registró una nueva, se descarta (ver más abajo). Los
+    # campos se leen antes por lo mismo, y porque el inventario en
+    # columnas los usa al leerse, ya con el bloqueo tomado
+    if ruta == RUTA_INVENTARIO:
+        ver_migraciones()
+        ver_campos()
+
+    # El stat que detecta cambios externos también detecta un archivo que falta
+    _preparar_datos()
+    try:
+        firma = _firma_archivo(ruta)
+    except FileNotFoundError:
+        _crear_archivo(ruta, valor_inicial)
+        firma = _firma_archivo(ruta)
+
+    entrada = _CACHE.get(ruta)
+    if entrada is not None and entrada[0] == firma:
+        _anotar_lectura(ruta, _BASES.get(ruta, 0))
+        return entrada[1]
+
+    # El archivo y su contador se leen juntos, sin escritores en el medio
+    with bloqueo(RUTA_BLOQUEO, exclusivo=False):
+        firma = _firma_archivo(ruta)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                datos = _deserializar(ruta, f.read())
+        except (json.JSONDecodeError, KeyError, TypeError) as error:
+            raise DatosCorruptos(
+                f"El archivo '{ruta}' está dañado y no se puede leer: {error}"
+            ) from error
+        base = _leer_contadores().get(os.path.basename(ruta), 0)
+
+    asignados = 0
+    if ruta == RUTA_INVENTARIO:
+        # Las migraciones de esquema pendientes se aplican solo en memoria
+        if migrar_productos(datos, ver_migraciones()):
+            _ESTADO["sin_compactar"] = True
+
+        asignados = asignar_ids(datos)
+        datos = representar_inventario(datos)
+
+    metricas.contar_lectura(ruta, firma[1])
+    _anotar_lectura(ruta, base)
+    _BASES[ruta] = base
+    _actualizar_cache(ruta, firma, datos)
+
+    if ruta == RUTA_MIGRACIONES and entrada is not None:
+        _CACHE.pop(RUTA_INVENTARIO, None)
+
+    # Los inventarios anteriores a los ids estables se migran al leerlos
+    if asignados:
+        _escribir(ruta, datos)
+
+    return datos
+
+
+def _escribir(ruta, datos):
+    """Escribe los datos en forma atómica y los deja en caché.
+
+    Se escribe un temporal sincronizado a disco que luego reemplaza al
+    archivo, así una caída nunca deja el archivo truncado. Dentro de una
+    escritura agrupada solo se registra la escritura y se actualiza la
+    caché; el disco se toca al confirmar el grupo.
+
+    El objeto recibido pasa a ser propiedad del almacenamiento: quien
+    necesite seguir modificándolo debe volver a cargarlo.
+    """
+
+    if ruta == RUTA_INVENTARIO:
+        _ESTADO["sin_compactar"] = False
+
+    if _GRUPO is not None:
+        _GRUPO[ruta] = datos
+        _actualizar_cache(ruta, None, datos)
+        return
+
+    _confirmar_grupo({ruta: datos})
+    _actualizar_cache(ruta, _firma_archivo(ruta), datos)
+
+
+@medir("almacenamiento.confirmar_escritura")
+def _confirmar_grupo(pendientes, eventos=()):
+    """Escribe todos los temporales y recién entonces los reemplaza juntos.
+
+    Todo ocurre con el bloqueo exclusivo tomado. Antes de escribir se
+    verifica que ningún conjunto que se va a escribir (ni, dentro de una
+    operación, ninguno de los que ella leyó) haya sido escrito por otro
+    proceso desde que se leyó; si pasó, se lanza ConflictoConcurrencia
+    sin escribir nada. Los eventos del grupo se anexan al historial en
+    el mismo bloqueo, después de los datos que describen.
+    """
+
+    _preparar_datos()
+
+    with bloqueo(RUTA_BLOQUEO):
+        if pendientes:
+            contadores = _leer_contadores()
+            _verificar_contadores(pendientes, contadores)
+            _reemplazar_archivos(pendientes, contadores)
+        if eventos:
+            _anexar_eventos(eventos)
+
+    for ruta in pendientes:
+        _BASES[ruta] = contadores[os.path.basename(ruta)]
+        if _OPERACION is not None:
+            _OPERACION[ruta] = _BASES[ruta]
+
+
+def _verificar_contadores(pendientes, contadores):
+    """Lanza ConflictoConcurrencia si otro proceso escribió algún archivo leído."""
+
+    esperados = {ruta: _BASES[ruta] for ruta in pendientes if ruta in _BASES}
+    if _OPERACION is not None:
+        esperados.update(_OPERACION)
+
+    for ruta, base in esperados.items():
+        if contadores.get(os.path.basename(ruta), 0) != base:
+            # Lo que hay en caché quedó viejo: la próxima lectura lo recarga
+            _CACHE.pop(ruta, None)
+            if ruta == RUTA_MIGRACIONES:
+                _CACHE.pop(RUTA_INVENTARIO, None)
+            raise ConflictoConcurrencia(
+                f"'{os.path.basename(ruta)}' fue modificado por otro proceso."
+            )
+
+
+def _reemplazar_archivos(pendientes, contadores):
+    """Escribe los archivos pendientes, avanza sus contadores y los reemplaza juntos."""
+
+    temporales = {}
+    try:
+        for ruta, datos in pendientes.items():
+            temporales[ruta] = _volcar_json(ruta, datos)
+    except BaseException:
+        for temporal in temporales.values():
+            os.unlink(temporal)
+        raise
+
+    # Los contadores se avanzan antes de reemplazar los archivos: si algo
+    # se corta en el medio, a lo sumo otro proceso ve un conflicto de más
+    for ruta in pendientes:
+        nombre = os.path.basename(ruta)
+        contadores[nombre] = contadores.get(nombre, 0) + 1
+    os.replace(_volcar_json(RUTA_VERSIONES, contadores), RUTA_VERSIONES)
+
+    if len(temporales) > 1:
+        diario = _volcar_json(RUTA_GRUPO_PENDIENTE, temporales)
+        os.replace(diario, RUTA_GRUPO_PENDIENTE)
+
+    for ruta, temporal in temporales.items():
+        os.replace(temporal, ruta)
+
+    if len(temporales) > 1:
+        os.remove(RUTA_GRUPO_PENDIENTE)
+
+    for ruta, datos in pendientes.items():
+        _CACHE[ruta] = (_firma_archivo(ruta), datos)
+
+
+def _leer_contadores():
+    """Lee los contadores de versión de cada archivo ({} si todavía no hay)."""
+
+    try:
+        with open(RUTA_VERSIONES, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _anotar_lectura(ruta, base):
+    """Registra la primera lectura de 'ruta' en la operación en curso.
+
+    Si la operación ya lo había leído con otro contador, los datos
+    cambiaron mientras se usaban y la operación debe repetirse.
+    """
+
+    if _OPERACION is None:
+        return
+
+    anterior = _OPERACION.setdefault(ruta, base)
+    if anterior != base:
+        raise ConflictoConcurrencia(
+            f"'{os.path.basename(ruta)}' cambió durante la operación."
+        )
+
+
+@_delegable
+@contextmanager
+def escritura_agrupada():
+    """Agrupa los guardados de una operación en una única confirmación.
+
+    Los datos guardados dentro del bloque se ven de inmediato desde la
+    caché, pero el disco recién se actualiza al salir: primero se
+    sincronizan todos los temporales y luego se reemplazan los archivos;
+    los eventos registrados en el bloque se anexan al historial con una
+    sola escritura. Si el bloque falla no se escribe nada (tampoco los
+    eventos) y la caché vuelve a leerse desde el disco. Los bloques
+    anidados se suman al grupo exterior.
+    """
+
+    global _GRUPO, _EVENTOS_GRUPO, _AL_CONFIRMAR
+
+    if _GRUPO is not None:
+        yield
+        return
+
+    _GRUPO, _EVENTOS_GRUPO, _AL_CONFIRMAR = {}, [], []
+    try:
+        yield
+    except BaseException:
+        # Las migraciones se aplican sobre el inventario en caché: si se
+        # descarta una, el inventario también debe releerse
+        if RUTA_MIGRACIONES in _GRUPO:
+            _CACHE.pop(RUTA_INVENTARIO, None)
+        for ruta in _GRUPO:
+            _CACHE.pop(ruta, None)
+        _GRUPO, _EVENTOS_GRUPO, _AL_CONFIRMAR = None, [], []
+        raise
+
+    pendientes, eventos, al_confirmar = _GRUPO, _EVENTOS_GRUPO, _AL_CONFIRMAR
+    _GRUPO, _EVENTOS_GRUPO, _AL_CONFIRMAR = None, [], []
+
+    try:
+        _confirmar_grupo(pendientes, eventos)
+    except BaseException:
+        if RUTA_MIGRACIONES in pendientes:
+            _CACHE.pop(RUTA_INVENTARIO, None)
+        for ruta in pendientes:
+            _CACHE.pop(ruta, None)
+        raise
+
+    for funcion in al_confirmar:
+        funcion()
+
+
+@_delegable
+def al_confirmar(funcion):
+    """Ejecuta 'funcion' cuando se confirme la escritura agrupada en curso.
+
+    Fuera de un grupo se ejecuta enseguida. Dentro de uno se anota una
+    sola vez aunque se pida varias, y se descarta si el grupo falla.
+    """
 
+    if _GRUPO is None:
+        funcion()
+    elif funcion not in _AL_CONFIRMAR:
+        _AL_CONFIRMAR.append(funcion)
 
 
-def _asegurar_archivo(ruta, valor_inicial):
-    """Crea la carpeta de datos y el archivo si no existen."""
+@_delegable
+@contextmanager
+def operacion():
+    """Delimita una operación de lectura-modificación-escritura.
 
-    os.makedirs(DATA_DIR, exist_ok=True)
+    Los conjuntos leídos dentro del bloque quedan asociados al contador
+    con el que se leyeron; cualquier escritura (aunque no sea de ese
+    conjunto) falla con ConflictoConcurrencia si otro proceso los
+    modificó entretanto. Las operaciones anidadas se suman a la exterior.
+    """
 
-    if not os.path.exists(ruta):
-        with open(ruta, "w", encoding="utf-8") as f:
-            json.dump(valor_inicial, f, indent=4, ensure_ascii=False)
+    global _OPERACION
+
+    if _OPERACION is not None:
+        yield
+        return
+
+    _OPERACION = {}
+    try:
+        yield
+    finally:
+        _OPERACION = None
+
+
+@contextmanager
+def transaccion():
+    """Unidad de trabajo: una operación cuyas escrituras se confirman juntas.
+
+    Todos los guardados y eventos del bloque llegan al disco en una sola
+    confirmación al salir, o ninguno si el bloque falla o encuentra un
+    conflicto.
+    """
+
+    with operacion(), escritura_agrupada():
+        yield
+
+
+def reintentar_si_hay_conflicto(funcion):
+    """Ejecuta la función como una transacción y la repite si hay conflicto.
+
+    Cada intento vuelve a leer los datos; lo escrito por un intento
+    fallido se descarta entero. Si los reintentos se agotan devuelve
+    (False, mensaje), como el resto de los servicios.
+    """
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        for intento in range(REINTENTOS_CONFLICTO):
+            try:
+                with transaccion():
+                    return funcion(*args, **kwargs)
+            except ConflictoConcurrencia:
+                # Anidada: el conflicto lo resuelve la operación exterior
+                if _operacion_exterior():
+                    raise
+                _ESTADO_CONCURRENCIA["reintentos"] += 1
+
+                import random
+                time.sleep(random.uniform(0, min(0.1, 0.005 * 2 ** intento)))
+
+        return False, "Otro proceso modificó los datos al mismo tiempo; intente nuevamente."
+
+    return envoltura
+
+
+def _operacion_exterior():
+    if BACKEND == "sqlite":
+        from servicios import almacenamiento_sqlite
+        return almacenamiento_sqlite.operacion_en_curso()
+    return _OPERACION is not None
+
+
+def reintentos_por_conflicto():
+    """Cantidad de operaciones repetidas por conflictos en este proceso."""
+
+    return _ESTADO_CONCURRENCIA["reintentos"]
+
+
+@_delegable
+@contextmanager
+def bloqueo_datos():
+    """Excluye a los demás procesos durante el bloque (p. ej. para anexar
+    eventos al historial con ids consecutivos)."""
+
+    with bloqueo(RUTA_BLOQUEO):
+        yield
+
+
+@_delegable
+def version_datos(ruta):
+    """Devuelve un contador que cambia cada vez que los datos de 'ruta' cambian."""
+
+    return _VERSIONES.get(ruta, 0)
+
+
+@_delegable
+def invalidar_cache(ruta=None):
+    """Descarta la caché de una ruta (o de todas) forzando una relectura."""
+
+    if ruta is None:
+        _CACHE.clear()
+    else:
+        _CACHE.pop(ruta, None)
 
 
 
 # CAMPOS
+@medir()
+@_delegable
+def ver_campos():
+    """Vista de solo lectura de los campos (no debe modificarse)."""
+    return _leer(RUTA_CAMPOS, {})
+
 def cargar_campos():
-    _asegurar_archivo(RUTA_CAMPOS, {})
-    with open(RUTA_CAMPOS, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return dict(ver_campos())
 
+@medir()
+@_delegable
 def guardar_campos(campos):
-    with open(RUTA_CAMPOS, "w", encoding="utf-8") as f:
-        json.dump(campos, f, indent=4, ensure_ascii=False)
+    _escribir(RUTA_CAMPOS, campos)
 
 
 
 # CAMPOS ÚNICOS
+@medir()
+@_delegable
+def ver_campos_unicos():
+    """Vista de solo lectura de los campos únicos (no debe modificarse)."""
+    return _leer(RUTA_CAMPOS_UNICOS, [])
+
 def cargar_campos_unicos():
-    _asegurar_archivo(RUTA_CAMPOS_UNICOS, [])
-    with open(RUTA_CAMPOS_UNICOS, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return list(ver_campos_unicos())
 
+@medir()
+@_delegable
 def guardar_campos_unicos(campos):
     campos_limpios = sorted(set(campos))
-    with open(RUTA_CAMPOS_UNICOS, "w", encoding="utf-8") as f:
-        json.dump(campos_limpios, f, indent=4, ensure_ascii=False)
+    _escribir(RUTA_CAMPOS_UNICOS, campos_limpios)
 
 
 
 # INVENTARIO
+def asignar_ids(inventario):
+    """Da un id a los productos que no lo tienen; devuelve cuántos asignó."""
+
+    asignados = 0
+
+    for producto in inventario:
+        if CAMPO_ID not in producto:
+            producto[CAMPO_ID] = nuevo_id_producto()
+            asignados += 1
+
+    return asignados
+
+
+def representar_inventario(inventario):
+    """Pasa a columnas un inventario de al menos UMBRAL_COLUMNAS productos.
+
+    Los más chicos (y los que ya están en columnas) se devuelven tal cual.
+    """
+
+    if (
+        type(inventario) is list
+        and UMBRAL_COLUMNAS is not None
+        and len(inventario) >= UMBRAL_COLUMNAS
+    ):
+        return TablaProductos(inventario, ver_campos())
+    return inventario
+
+
+def copiar_producto(producto):
+    """Copia un producto incluyendo el diccionario anidado de campos ocultos."""
+
+    copia = producto.copy()
+    if "_campos_ocultos" in copia:
+        copia["_campos_ocultos"] = dict(copia["_campos_ocultos"])
+    return copia
+
+# Claves que solo viven en las filas guardadas: los servicios no las devuelven
+CLAVES_INTERNAS = frozenset((CAMPO_VERSION, CAMPO_OCULTOS))
+
+def producto_publico(producto):
+    """Copia de un producto sin las claves internas, como se devuelve a quien llama."""
+
+    return {clave: valor for clave, valor in producto.items() if clave not in CLAVES_INTERNAS}
+
+@medir()
+@_delegable
+def ver_inventario():
+    """Vista de solo lectura del inventario (no debe modificarse)."""
+    return _leer(RUTA_INVENTARIO, [])
+
 def cargar_inventario():
-    _asegurar_archivo(RUTA_INVENTARIO, [])
-    with open(RUTA_INVENTARIO, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return [copiar_producto(p) for p in ver_inventario()]
 
+@medir()
+@_delegable
 def guardar_inventario(inventario):
-    with open(RUTA_INVENTARIO, "w", encoding="utf-8") as f:
-        json.dump(inventario, f, indent=4, ensure_ascii=False)
+    _escribir(RUTA_INVENTARIO, representar_inventario(inventario))
+
+def _estampar_version(producto):
+    """Marca un producto nuevo o reemplazado con la versión vigente del esquema."""
+
+    version = len(ver_migraciones())
+    if version:
+        producto[CAMPO_VERSION] = version
+
+# Operaciones por fila: el backend SQLite escribe solo la fila afectada;
+# en JSON equivalen a reescribir el archivo, sin copiar los productos.
+@medir()
+@_delegable
+def insertar_productos(productos):
+    """Agrega productos al final y devuelve la posición del primero."""
+
+    inventario = ver_inventario().copy()
+    posicion = len(inventario)
+    for producto in productos:
+        _estampar_version(producto)
+    inventario.extend(productos)
+    guardar_inventario(inventario)
+    return posicion
+
+@medir()
+@_delegable
+def reemplazar_producto(posicion, producto):
+    inventario = ver_inventario().copy()
+    _estampar_version(producto)
+    inventario[posicion] = producto
+    guardar_inventario(inventario)
+
+@medir()
+@_delegable
+def borrar_producto(posicion):
+    inventario = ver_inventario().copy()
+    del inventario[posicion]
+    guardar_inventario(inventario)
+
+
+
+# MIGRACIONES DE ESQUEMA (ver servicios.migraciones)
+@medir()
+@_delegable
+def ver_migraciones():
+    """Vista de solo lectura del registro de migraciones (no debe modificarse)."""
+    return _leer(RUTA_MIGRACIONES, [])
+
+@medir()
+@_delegable
+def guardar_migraciones(migraciones):
+    _escribir(RUTA_MIGRACIONES, migraciones)
 
+@medir()
+@_delegable
+def registrar_migracion(migracion, valores=None):
+    """Anota una migración y la aplica al inventario en memoria.
 
+    El archivo del inventario no se reescribe: al releerlo la migración
+    se vuelve a aplicar, y queda en disco con el próximo guardado o al
+    compactar. 'valores' se describe en aplicar_ultima_migracion.
+    """
+
+    inventario = ver_inventario()
+    migraciones = [*ver_migraciones(), migracion]
+    guardar_migraciones(migraciones)
+
+    aplicar_ultima_migracion(inventario, migraciones, valores)
+    _VERSIONES[RUTA_INVENTARIO] = _VERSIONES.get(RUTA_INVENTARIO, 0) + 1
+    _ESTADO["sin_compactar"] = True
+
+@medir()
+@_delegable
+def compactar_inventario():
+    """Escribe el inventario con las migraciones aplicadas, si hacía falta.
+
+    Devuelve True si lo reescribió.
+    """
+
+    inventario = ver_inventario()
+    if not _ESTADO["sin_compactar"]:
+        return False
+
+    guardar_inventario(inventario)
+    return True
+
+
+
+# HISTORIAL (registro de solo anexado, un evento JSON por línea, que rota
+# a segmentos fechados: ver servicios.historial_segmentos). "eventos" son
+# los del registro activo y "base" los que hay en los segmentos.
+_ESTADO_HISTORIAL = {"firma": None, "eventos": 0, "base": 0, "sin_sincronizar": 0, "creado": False}
+_INDICE_HISTORIAL = IndiceHistorial(
+    RUTA_HISTORIAL_LOG, RUTA_HISTORIAL_SEGMENTOS, RUTA_HISTORIAL_INDICE
+)
+
+def _migrar_historial():
+    """Convierte una única vez el historial.json (arreglo) al registro JSON Lines."""
 
-# HISTORIAL
-def cargar_historial():
-    _asegurar_archivo(RUTA_HISTORIAL, [])
     with open(RUTA_HISTORIAL, "r", encoding="utf-8") as f:
-        return json.load(f)
+        contenido = f.read().strip()
+    eventos = json.loads(contenido) if contenido else []
+
+    guardar_historial(eventos)
+    os.replace(RUTA_HISTORIAL, RUTA_HISTORIAL + ".migrado")
+
+def _asegurar_historial():
+    """Crea el registro de historial, migrando el formato anterior si existe.
+
+    Se comprueba una sola vez por proceso: una vez creado, el registro
+    activo siempre existe (la rotación lo reemplaza con el bloqueo tomado).
+    """
+
+    if _ESTADO_HISTORIAL["creado"]:
+        return
+
+    _preparar_datos()
+
+    if not os.path.exists(RUTA_HISTORIAL_LOG):
+        if os.path.exists(RUTA_HISTORIAL):
+            _migrar_historial()
+        else:
+            open(RUTA_HISTORIAL_LOG, "a", encoding="utf-8").close()
+
+    _ESTADO_HISTORIAL["creado"] = True
 
+def _firma_historial():
+    # Con el inodo: tras una rotación el registro activo es otro archivo
+    estado = os.stat(RUTA_HISTORIAL_LOG)
+    return estado.st_mtime_ns, estado.st_size, estado.st_ino
+
+def _sincronizar_estado_historial():
+    """Cuenta los eventos completos y descarta una última línea truncada.
+
+    Solo recorre el archivo si cambió desde la última vez (por ejemplo,
+    si otro proceso anexó eventos o rotó el registro).
+    """
+
+    _asegurar_historial()
+    firma = _firma_historial()
+    if _ESTADO_HISTORIAL["firma"] == firma:
+        return
+
+    eventos = 0
+    fin_valido = 0
+    with open(RUTA_HISTORIAL_LOG, "rb") as f:
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break
+            fin_valido += len(linea)
+            if linea.strip():
+                eventos += 1
+
+    # Una escritura interrumpida deja una línea sin terminar: se descarta
+    # para que el próximo evento no quede pegado a ella.
+    if fin_valido != firma[1]:
+        with open(RUTA_HISTORIAL_LOG, "r+b") as f:
+            f.truncate(fin_valido)
+        firma = _firma_historial()
+
+    segmentos = listar_segmentos(RUTA_HISTORIAL_SEGMENTOS)
+    ultimo = segmentos[-1] if segmentos else None
+
+    _ESTADO_HISTORIAL["firma"] = firma
+    _ESTADO_HISTORIAL["eventos"] = eventos
+    _ESTADO_HISTORIAL["base"] = ultimo.primero + ultimo.cantidad if ultimo else 0
+
+def _rotar_historial():
+    """Pasa el registro activo a un segmento y empieza uno vacío.
+
+    Se llama con el bloqueo tomado y el estado sincronizado.
+    """
+
+    with open(RUTA_HISTORIAL_LOG, "r", encoding="utf-8") as f:
+        primero = json.loads(f.readline())
+
+    rotar(
+        RUTA_HISTORIAL_LOG,
+        RUTA_HISTORIAL_SEGMENTOS,
+        (primero.get("timestamp") or {}).get("iso") or "",
+        _ESTADO_HISTORIAL["base"],
+        _ESTADO_HISTORIAL["eventos"],
+    )
+    open(RUTA_HISTORIAL_LOG, "a", encoding="utf-8").close()
+
+    _ESTADO_HISTORIAL["base"] += _ESTADO_HISTORIAL["eventos"]
+    _ESTADO_HISTORIAL["eventos"] = 0
+    _ESTADO_HISTORIAL["firma"] = _firma_historial()
+
+    if COMPRIMIR_SEGMENTOS:
+        comprimir_frios(RUTA_HISTORIAL_SEGMENTOS, SEGMENTOS_SIN_COMPRIMIR)
+
+def _eventos_de(f):
+    """Eventos de un archivo del historial abierto en binario."""
+
+    for linea in f:
+        if not linea.endswith(b"\n"):
+            break
+        if linea.strip():
+            yield json.loads(linea)
+
+@medir()
+@_delegable
+def contar_eventos():
+    """Devuelve la cantidad de eventos registrados (segmentos incluidos)."""
+
+    # Con el bloqueo: una línea a medio anexar por otro proceso no se trunca
+    with bloqueo(RUTA_BLOQUEO):
+        _sincronizar_estado_historial()
+    return _ESTADO_HISTORIAL["base"] + _ESTADO_HISTORIAL["eventos"]
+
+@_delegable
+def cargar_historial(desde=0):
+    """Recorre el historial evento por evento sin cargarlo entero en memoria.
+
+    'desde' es la cantidad de eventos iniciales a saltear; los segmentos
+    que quedan enteros antes no se abren.
+    """
+
+    _asegurar_historial()
+    numero = 0
+
+    for segmento in listar_segmentos(RUTA_HISTORIAL_SEGMENTOS):
+        numero = segmento.primero
+        if numero + segmento.cantidad <= desde:
+            numero += segmento.cantidad
+            continue
+
+        with abrir_segmento(segmento) as f:
+            for evento in _eventos_de(f):
+                if numero >= desde:
+                    yield evento
+                numero += 1
+            metricas.contar_lectura(segmento.ruta, f.tell())
+
+    with open(RUTA_HISTORIAL_LOG, "rb") as f:
+        for evento in _eventos_de(f):
+            if numero >= desde:
+                yield evento
+            numero += 1
+        metricas.contar_lectura(RUTA_HISTORIAL_LOG, f.tell())
+
+@medir()
+@_delegable
+def consultar_eventos(entidad=None, accion=None, desde=None, hasta=None,
+                      entidad_id=None, limite=None, recientes_primero=False):
+    """Recorre los eventos que cumplen todos los filtros.
+
+    'desde' y 'hasta' son instantes ISO ("YYYY-MM-DDTHH:MM:SS"),
+    inclusivos. 'entidad_id' también encuentra los eventos por lote que
+    lo incluyen. Solo se leen del disco los eventos que coinciden.
+    """
+
+    _asegurar_historial()
+    return _INDICE_HISTORIAL.consultar(
+        entidad, accion, desde, hasta, entidad_id, limite, recientes_primero
+    )
+
+def _anexar_eventos(eventos):
+    """Numera y anexa eventos al historial con una sola escritura.
+
+    Se llama con el bloqueo tomado. 'eventos' son pares (evento, numerar):
+    numerar(evento, numero), si no es None, completa el evento con su
+    número en el historial antes de escribirlo. Si el registro activo
+    superó TAMANIO_SEGMENTO_HISTORIAL, antes se rota.
+    """
+
+    _sincronizar_estado_historial()
+
+    limite = TAMANIO_SEGMENTO_HISTORIAL
+    tamanio = _ESTADO_HISTORIAL["firma"][1]
+    if limite is not None and _ESTADO_HISTORIAL["eventos"] and tamanio >= limite:
+        _rotar_historial()
+
+    numero = _ESTADO_HISTORIAL["base"] + _ESTADO_HISTORIAL["eventos"]
+    lineas = []
+    for evento, numerar in eventos:
+        numero += 1
+        if numerar is not None:
+            numerar(evento, numero)
+        lineas.append(json.dumps(evento, ensure_ascii=False) + "\n")
+    texto = "".join(lineas)
+
+    with open(RUTA_HISTORIAL_LOG, "a", encoding="utf-8") as f:
+        f.write(texto)
+        f.flush()
+
+        _ESTADO_HISTORIAL["sin_sincronizar"] += len(lineas)
+        politica = POLITICA_FSYNC_HISTORIAL
+        if politica == "siempre" or (
+            isinstance(politica, int)
+            and _ESTADO_HISTORIAL["sin_sincronizar"] >= politica
+        ):
+            os.fsync(f.fileno())
+            _ESTADO_HISTORIAL["sin_sincronizar"] = 0
+
+    _ESTADO_HISTORIAL["firma"] = _firma_historial()
+    _ESTADO_HISTORIAL["eventos"] += len(lineas)
+
+    if metricas.ACTIVAS:
+        metricas.contar_escritura(RUTA_HISTORIAL_LOG, len(texto.encode("utf-8")))
+
+@medir()
+@_delegable
+def agregar_evento(evento, numerar=None):
+    """Anexa un evento al final del historial sin reescribir el archivo.
+
+    Dentro de una escritura agrupada el evento se anexa al confirmarla,
+    junto con los demás del grupo; si el grupo falla no se registra.
+    'numerar' (ver _anexar_eventos) permite asignarle un id a partir de
+    su número recién al anexarlo.
+    """
+
+    if _GRUPO is not None:
+        _EVENTOS_GRUPO.append((evento, numerar))
+        return
+
+    with bloqueo(RUTA_BLOQUEO):
+        _anexar_eventos([(evento, numerar)])
+
+@medir()
+@_delegable
 def guardar_historial(historial):
-    with open(RUTA_HISTORIAL, "w", encoding="utf-8") as f:
-        json.dump(historial, f, indent=4, ensure_ascii=False)
+    """Reescribe el registro completo (migraciones y compactaciones).
+
+    Los segmentos y los snapshots se descartan: sus números de evento
+    dejan de valer.
+    """
+
+    import shutil
+
+    def escribir_eventos(f):
+        for evento in historial:
+            f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+
+    with bloqueo(RUTA_BLOQUEO):
+        temporal = _volcar_temporal(RUTA_HISTORIAL_LOG, escribir_eventos)
+        shutil.rmtree(RUTA_HISTORIAL_SEGMENTOS, ignore_errors=True)
+        shutil.rmtree(RUTA_HISTORIAL_SNAPSHOTS, ignore_errors=True)
+        os.replace(temporal, RUTA_HISTORIAL_LOG)
+    _ESTADO_HISTORIAL["firma"] = None
+
+def _numeros_snapshot():
+    try:
+        archivos = os.listdir(RUTA_HISTORIAL_SNAPSHOTS)
+    except FileNotFoundError:
+        return []
+    return sorted(int(a.split(".")[0]) for a in archivos if a.endswith(".json.gz"))
+
+def _ruta_snapshot(numero):
+    return os.path.join(RUTA_HISTORIAL_SNAPSHOTS, f"{numero:012d}.json.gz")
+
+@medir()
+@_delegable
+def guardar_snapshot(numero, productos):
+    """Guarda el inventario tal como quedó tras los primeros 'numero' eventos.
+
+    Con el último snapshot y los eventos posteriores se reconstruye el
+    estado actual sin recorrer todo el historial. Se conservan los
+    SNAPSHOTS_CONSERVADOS más recientes.
+    """
+
+    import gzip
+
+    def escribir(f):
+        with gzip.GzipFile(fileobj=f.buffer, mode="wb") as comprimido:
+            comprimido.write(
+                json.dumps(
+                    productos, ensure_ascii=False, separators=(",", ":"), default=a_json
+                ).encode("utf-8")
+            )
+
+    ruta = _ruta_snapshot(numero)
+    os.replace(_volcar_temporal(ruta, escribir), ruta)
+
+    for viejo in _numeros_snapshot()[:-SNAPSHOTS_CONSERVADOS]:
+        os.remove(_ruta_snapshot(viejo))
+
+@_delegable
+def numero_ultimo_snapshot():
+    """Cantidad de eventos que cubre el último snapshot (0 si no hay)."""
+
+    numeros = _numeros_snapshot()
+    return numeros[-1] if numeros else 0
+
+@medir()
+@_delegable
+def ultimo_snapshot():
+    """Devuelve (número, productos) del último snapshot, o (0, []) si no hay."""
+
+    import gzip
+
+    numero = numero_ultimo_snapshot()
+    if not numero:
+        return 0, []
+
+    with gzip.open(_ruta_snapshot(numero), "rb") as f:
+        contenido = f.read()
+    metricas.contar_lectura(_ruta_snapshot(numero), len(contenido))
+    return numero, json.loads(contenido)
 
 
 
 # PAPELERA
+@medir()
+@_delegable
+def ver_papelera():
+    """Vista de solo lectura de la papelera (no debe modificarse)."""
+    return _leer(RUTA_PAPELERA, [])
+
 def cargar_papelera():
-    _asegurar_archivo(RUTA_PAPELERA, [])
-    with open(RUTA_PAPELERA, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return list(ver_papelera())
 
+@medir()
+@_delegable
 def guardar_papelera(papelera):
-    with open(RUTA_PAPELERA, "w", encoding="utf-8") as f:
-        json.dump(papelera, f, indent=4, ensure_ascii=False)
+    _escribir(RUTA_PAPELERA, papelera)
+
+@medir()
+@_delegable
+def insertar_en_papelera(registro):
+    guardar_papelera(list(ver_papelera()) + [registro])
+
+@medir()
+@_delegable
+def quitar_de_papelera(registro_ids):
+    """Quita los registros indicados y los devuelve."""
+
+    ids = set(registro_ids)
+    papelera = ver_papelera()
+    quitados = [r for r in papelera if r["id"] in ids]
+
+    if quitados:
+        guardar_papelera([r for r in papelera if r["id"] not in ids])
+
+    return quitados
+
+
+
+# CONVERSIÓN DE FORMATO
+def convertir_formato(formato):
+    """Reescribe los archivos JSON de datos en el formato indicado.
+
+    El historial no se toca: ya es un registro JSON Lines.
+    """
+
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato!r}.")
+
+    if BACKEND != "json":
+        raise ValueError("El formato solo aplica al backend JSON.")
+
+    datos = {
+        RUTA_CAMPOS: ver_campos(),
+        RUTA_CAMPOS_UNICOS: ver_campos_unicos(),
+        RUTA_INVENTARIO: ver_inventario(),
+        RUTA_PAPELERA: ver_papelera(),
+        RUTA_MIGRACIONES: ver_migraciones(),
+    }
+
+    with escritura_agrupada():
+        for ruta, valor in datos.items():
+            _FORMATOS_DETECTADOS[ruta] = formato
+            _escribir(ruta, valor)
@@ -0,0 +1,683 @@
+"""Backend SQLite de almacenamiento.
+
+Expone las mismas funciones que almacenamiento para el backend JSON
+(ver_*, guardar_*, operaciones por fila, historial y transacciones) y
+se selecciona con almacenamiento.BACKEND = "sqlite". Los productos son
+filas con sus campos dinámicos en una columna JSON; los campos únicos
+son índices UNIQUE reales sobre esa columna.
+
+La concurrencia entre procesos sigue el mismo esquema que el backend
+JSON: la tabla versiones lleva un contador de escrituras por conjunto de
+datos, que se verifica y se avanza dentro de la transacción que escribe.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from servicios.migraciones import (
+    CAMPO_VERSION,
+    migrar_producto,
+    aplicar_ultima_migracion,
+)
+from servicios.modelo import CAMPO_ID, ConflictoConcurrencia, nuevo_id_producto
+from servicios.tabla_productos import a_json
+from utilidades.rutas import (
+    RUTA_SQLITE,
+    RUTA_CAMPOS,
+    RUTA_CAMPOS_UNICOS,
+    RUTA_INVENTARIO,
+    RUTA_PAPELERA,
+    RUTA_MIGRACIONES,
+    asegurar_estructura
+)
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS campos (
+    nombre TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    orden INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS campos_unicos (
+    nombre TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS historial (
+    id INTEGER PRIMARY KEY,
+    evento TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS historial_instante
+    ON historial (json_extract(evento, '$.timestamp.iso'));
+CREATE INDEX IF NOT EXISTS historial_entidad
+    ON historial (json_extract(evento, '$.entidad'), json_extract(evento, '$.timestamp.iso'));
+CREATE TABLE IF NOT EXISTS papelera (
+    id TEXT PRIMARY KEY,
+    expira_en TEXT NOT NULL,
+    registro TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papelera_expira_en ON papelera (expira_en);
+CREATE TABLE IF NOT EXISTS migraciones (
+    version INTEGER PRIMARY KEY,
+    migracion TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    numero INTEGER PRIMARY KEY,
+    productos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versiones (
+    conjunto TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+# Conexión del proceso y estado de las cachés. "escritos" son las rutas
+# escritas en la transacción abierta, "al_confirmar" lo que corre tras su
+# COMMIT y "operacion" las rutas leídas durante la operación en curso, con
+# su contador (ver almacenamiento.operacion)
+_ESTADO = {
+    "conexion": None,
+    "data_version": None,
+    "en_transaccion": False,
+    "escritos": set(),
+    "al_confirmar": [],
+    "operacion": None,
+}
+
+# Caché en memoria: ruta -> datos (el inventario guarda además los ids de fila)
+_CACHE = {}
+_IDS_PRODUCTOS = []
+_CONTEO_EVENTOS = {"eventos": None}
+
+# Contador de cambios por ruta, con el mismo significado que en el backend JSON
+_VERSIONES = {}
+
+# Contador de la tabla versiones con el que se leyó cada ruta en caché
+_BASES = {}
+
+
+def _json(valor):
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"), default=a_json)
+
+
+def _conexion():
+    """Abre (una sola vez por proceso) la base y crea el esquema."""
+
+    conexion = _ESTADO["conexion"]
+    if conexion is not None:
+        return conexion
+
+    asegurar_estructura()
+
+    # isolation_level=None: cada sentencia se confirma sola salvo dentro
+    # de transaccion(), que abre y cierra la transacción explícitamente
+    conexion = sqlite3.connect(RUTA_SQLITE, isolation_level=None, check_same_thread=False)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=FULL")
+    conexion.executescript(_ESQUEMA)
+
+    _ESTADO["conexion"] = conexion
+    return conexion
+
+
+def _avanzar_version(ruta):
+    _VERSIONES[ruta] = _VERSIONES.get(ruta, 0) + 1
+
+
+def _verificar_cambios_externos():
+    """Descarta las cachés si otra conexión confirmó cambios en la base."""
+
+    data_version = _conexion().execute("PRAGMA data_version").fetchone()[0]
+    if data_version == _ESTADO["data_version"]:
+        return
+
+    _ESTADO["data_version"] = data_version
+    invalidar_cache()
+
+
+def _conjunto(ruta):
+    return os.path.basename(ruta)
+
+
+def _contadores(conexion):
+    return dict(conexion.execute("SELECT conjunto, version FROM versiones"))
+
+
+def _leer(ruta, consultar):
+    _verificar_cambios_externos()
+
+    if ruta not in _CACHE:
+        # El contador se lee antes que los datos: si otro proceso escribe
+        # en el medio, a lo sumo se ve un conflicto de más
+        conexion = _conexion()
+        fila = conexion.execute(
+            "SELECT version FROM versiones WHERE conjunto = ?", (_conjunto(ruta),)
+        ).fetchone()
+        _BASES[ruta] = fila[0] if fila else 0
+        _CACHE[ruta] = consultar(conexion)
+        _avanzar_version(ruta)
+
+    _anotar_lectura(ruta, _BASES[ruta])
+    return _CACHE[ruta]
+
+
+def _anotar_lectura(ruta, base):
+    operacion_actual = _ESTADO["operacion"]
+    if operacion_actual is None:
+        return
+
+    if operacion_actual.setdefault(ruta, base) != base:
+        raise ConflictoConcurrencia(f"'{_conjunto(ruta)}' cambió durante la operación.")
+
+
+def _marcar_escritura(ruta):
+    _ESTADO["escritos"].add(ruta)
+
+
+def _verificar_y_avanzar(conexion):
+    """Compara los contadores esperados con los de la base y avanza los escritos."""
+
+    escritos = _ESTADO["escritos"]
+    if not escritos:
+        return
+
+    esperados = {ruta: _BASES[ruta] for ruta in escritos if ruta in _BASES}
+    if _ESTADO["operacion"] is not None:
+        esperados.update(_ESTADO["operacion"])
+
+    contadores = _contadores(conexion)
+    for ruta, base in esperados.items():
+        if contadores.get(_conjunto(ruta), 0) != base:
+            raise ConflictoConcurrencia(f"'{_conjunto(ruta)}' fue modificado por otro proceso.")
+
+    for ruta in escritos:
+        version = contadores.get(_conjunto(ruta), 0) + 1
+        conexion.execute(
+            "INSERT OR REPLACE INTO versiones (conjunto, version) VALUES (?, ?)",
+            (_conjunto(ruta), version)
+        )
+        _BASES[ruta] = version
+        if _ESTADO["operacion"] is not None:
+            _ESTADO["operacion"][ruta] = version
+
+
+def operacion_en_curso():
+    return _ESTADO["operacion"] is not None
+
+
+@contextmanager
+def operacion():
+    if _ESTADO["operacion"] is not None:
+        yield
+        return
+
+    _ESTADO["operacion"] = {}
+    try:
+        yield
+    finally:
+        _ESTADO["operacion"] = None
+
+
+def version_datos(ruta):
+    return _VERSIONES.get(ruta, 0)
+
+
+def invalidar_cache(ruta=None):
+    rutas = list(_CACHE) if ruta is None else [ruta]
+
+    for r in rutas:
+        if _CACHE.pop(r, None) is not None:
+            _avanzar_version(r)
+
+    if ruta is None:
+        _CONTEO_EVENTOS["eventos"] = None
+
+
+@contextmanager
+def escritura_agrupada():
+    """Agrupa las escrituras del bloque en una única transacción."""
+
+    if _ESTADO["en_transaccion"]:
+        yield
+        return
+
+    conexion = _conexion()
+    conexion.execute("BEGIN IMMEDIATE")
+    _ESTADO["en_transaccion"] = True
+    _ESTADO["escritos"] = set()
+    _ESTADO["al_confirmar"] = []
+
+    try:
+        # Con la transacción tomada ningún otro proceso puede escribir:
+        # lo que se vea ahora en caché sigue vigente hasta el COMMIT
+        _verificar_cambios_externos()
+        yield
+        _verificar_y_avanzar(conexion)
+    except BaseException:
+        conexion.execute("ROLLBACK")
+        _ESTADO["en_transaccion"] = False
+        _ESTADO["al_confirmar"] = []
+        invalidar_cache()
+        raise
+
+    conexion.execute("COMMIT")
+    _ESTADO["en_transaccion"] = False
+
+    pendientes, _ESTADO["al_confirmar"] = _ESTADO["al_confirmar"], []
+    for funcion in pendientes:
+        funcion()
+
+
+def al_confirmar(funcion):
+    if not _ESTADO["en_transaccion"]:
+        funcion()
+    elif funcion not in _ESTADO["al_confirmar"]:
+        _ESTADO["al_confirmar"].append(funcion)
+
+
+@contextmanager
+def bloqueo_datos():
+    with escritura_agrupada():
+        yield
+
+
+# CAMPOS
+def ver_campos():
+    return _leer(RUTA_CAMPOS, lambda c: {
+        nombre: tipo
+        for nombre, tipo in c.execute("SELECT nombre, tipo FROM campos ORDER BY orden")
+    })
+
+
+def guardar_campos(campos):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_CAMPOS)
+        conexion = _conexion()
+        conexion.execute("DELETE FROM campos")
+        conexion.executemany(
+            "INSERT INTO campos (nombre, tipo, orden) VALUES (?, ?, ?)",
+            [(nombre, tipo, orden) for orden, (nombre, tipo) in enumerate(campos.items())]
+        )
+
+    _CACHE[RUTA_CAMPOS] = campos
+    _avanzar_version(RUTA_CAMPOS)
+
+
+# CAMPOS ÚNICOS
+def _nombre_indice_unico(campo):
+    return "unico_" + hashlib.sha1(campo.encode("utf-8")).hexdigest()[:16]
+
+
+def _expresion_campo(campo):
+    """Expresión SQL que extrae el valor de un campo del JSON del producto."""
+
+    ruta_json = '$."' + campo + '"'
+    return "json_extract(datos, '" + ruta_json.replace("'", "''") + "')"
+
+
+def ver_campos_unicos():
+    return _leer(RUTA_CAMPOS_UNICOS, lambda c: [
+        nombre for (nombre,) in c.execute("SELECT nombre FROM campos_unicos ORDER BY nombre")
+    ])
+
+
+def guardar_campos_unicos(campos):
+    """Sincroniza la lista de campos únicos y sus índices UNIQUE."""
+
+    nuevos = sorted(set(campos))
+    actuales = set(ver_campos_unicos())
+
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_CAMPOS_UNICOS)
+        conexion = _conexion()
+
+        for campo in actuales - set(nuevos):
+            conexion.execute(f'DROP INDEX IF EXISTS "{_nombre_indice_unico(campo)}"')
+            conexion.execute("DELETE FROM campos_unicos WHERE nombre = ?", (campo,))
+
+        for campo in set(nuevos) - actuales:
+            conexion.execute(
+                f'CREATE UNIQUE INDEX "{_nombre_indice_unico(campo)}" '
+                f"ON productos ({_expresion_campo(campo)})"
+            )
+            conexion.execute("INSERT INTO campos_unicos (nombre) VALUES (?)", (campo,))
+
+    _CACHE[RUTA_CAMPOS_UNICOS] = nuevos
+    _avanzar_version(RUTA_CAMPOS_UNICOS)
+
+
+# INVENTARIO
+def _consultar_productos(conexion):
+    from servicios.almacenamiento import representar_inventario
+
+    migraciones = ver_migraciones()
+    _IDS_PRODUCTOS.clear()
+    productos = []
+    migrados = []
+
+    for id_fila, datos in conexion.execute("SELECT id, datos FROM productos ORDER BY id"):
+        producto = json.loads(datos)
+
+        # Filas anteriores a los ids estables o al esquema vigente
+        migrado = migrar_producto(producto, migraciones)
+        if CAMPO_ID not in producto:
+            producto[CAMPO_ID] = nuevo_id_producto()
+            migrado = True
+        if migrado:
+            migrados.append((_json(producto), id_fila))
+
+        _IDS_PRODUCTOS.append(id_fila)
+        productos.append(producto)
+
+    # Las filas migradas se corrigen en la base al leerlas
+    if migrados:
+        with escritura_agrupada():
+            _marcar_escritura(RUTA_INVENTARIO)
+            conexion.executemany("UPDATE productos SET datos = ? WHERE id = ?", migrados)
+
+    return representar_inventario(productos)
+
+
+def ver_inventario():
+    return _leer(RUTA_INVENTARIO, _consultar_productos)
+
+
+def guardar_inventario(inventario):
+    from servicios.almacenamiento import representar_inventario
+
+    inventario = representar_inventario(inventario)
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_INVENTARIO)
+        conexion = _conexion()
+        conexion.execute("DELETE FROM productos")
+        conexion.executemany(
+            "INSERT INTO productos (id, datos) VALUES (?, ?)",
+            [(i, _json(producto)) for i, producto in enumerate(inventario, start=1)]
+        )
+
+    _IDS_PRODUCTOS[:] = range(1, len(inventario) + 1)
+    _CACHE[RUTA_INVENTARIO] = inventario
+    _avanzar_version(RUTA_INVENTARIO)
+
+
+def _estampar_version(producto):
+    version = len(ver_migraciones())
+    if version:
+        producto[CAMPO_VERSION] = version
+
+
+def insertar_productos(productos):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_INVENTARIO)
+        inventario = ver_inventario()
+        posicion = len(inventario)
+        conexion = _conexion()
+        for producto in productos:
+            _estampar_version(producto)
+            cursor = conexion.execute(
+                "INSERT INTO productos (datos) VALUES (?)", (_json(producto),)
+            )
+            _IDS_PRODUCTOS.append(cursor.lastrowid)
+            inventario.append(producto)
+
+    _avanzar_version(RUTA_INVENTARIO)
+    return posicion
+
+
+def reemplazar_producto(posicion, producto):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_INVENTARIO)
+        inventario = ver_inventario()
+        _estampar_version(producto)
+
+        _conexion().execute(
+            "UPDATE productos SET datos = ? WHERE id = ?",
+            (_json(producto), _IDS_PRODUCTOS[posicion])
+        )
+
+        inventario[posicion] = producto
+
+    _avanzar_version(RUTA_INVENTARIO)
+
+
+def borrar_producto(posicion):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_INVENTARIO)
+        inventario = ver_inventario()
+
+        _conexion().execute("DELETE FROM productos WHERE id = ?", (_IDS_PRODUCTOS[posicion],))
+
+        del _IDS_PRODUCTOS[posicion]
+        del inventario[posicion]
+
+    _avanzar_version(RUTA_INVENTARIO)
+
+
+# MIGRACIONES DE ESQUEMA
+def ver_migraciones():
+    return _leer(RUTA_MIGRACIONES, lambda c: [
+        json.loads(migracion)
+        for (migracion,) in c.execute("SELECT migracion FROM migraciones ORDER BY version")
+    ])
+
+
+def guardar_migraciones(migraciones):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_MIGRACIONES)
+        conexion = _conexion()
+        conexion.execute("DELETE FROM migraciones")
+        conexion.executemany(
+            "INSERT INTO migraciones (version, migracion) VALUES (?, ?)",
+            [(version, _json(m)) for version, m in enumerate(migraciones, start=1)]
+        )
+
+    _CACHE[RUTA_MIGRACIONES] = migraciones
+    _avanzar_version(RUTA_MIGRACIONES)
+
+
+def registrar_migracion(migracion, valores=None):
+    """Anota una migración y la aplica a todas las filas en una transacción.
+
+    A diferencia del backend JSON se aplica en el momento: los índices
+    UNIQUE de los campos únicos necesitan las filas con su nombre vigente.
+    """
+
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_MIGRACIONES)
+        _marcar_escritura(RUTA_INVENTARIO)
+        inventario = ver_inventario()
+        migraciones = [*ver_migraciones(), migracion]
+        conexion = _conexion()
+        conexion.execute(
+            "INSERT INTO migraciones (version, migracion) VALUES (?, ?)",
+            (len(migraciones), _json(migracion))
+        )
+
+        aplicar_ultima_migracion(inventario, migraciones, valores)
+        conexion.executemany(
+            "UPDATE productos SET datos = ? WHERE id = ?",
+            [(_json(producto), id_fila) for producto, id_fila in zip(inventario, _IDS_PRODUCTOS)]
+        )
+
+    _CACHE[RUTA_MIGRACIONES] = migraciones
+    _avanzar_version(RUTA_MIGRACIONES)
+    _avanzar_version(RUTA_INVENTARIO)
+
+
+def compactar_inventario():
+    # Las filas se migran al registrar cada migración o al leerlas
+    return False
+
+
+# PAPELERA
+def ver_papelera():
+    return _leer(RUTA_PAPELERA, lambda c: [
+        json.loads(registro)
+        for (registro,) in c.execute("SELECT registro FROM papelera ORDER BY rowid")
+    ])
+
+
+def guardar_papelera(papelera):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_PAPELERA)
+        conexion = _conexion()
+        conexion.execute("DELETE FROM papelera")
+        conexion.executemany(
+            "INSERT INTO papelera (id, expira_en, registro) VALUES (?, ?, ?)",
+            [(r["id"], r["expira_en"], _json(r)) for r in papelera]
+        )
+
+    _CACHE[RUTA_PAPELERA] = papelera
+    _avanzar_version(RUTA_PAPELERA)
+
+
+def insertar_en_papelera(registro):
+    with escritura_agrupada():
+        _marcar_escritura(RUTA_PAPELERA)
+        papelera = ver_papelera()
+
+        _conexion().execute(
+            "INSERT INTO papelera (id, expira_en, registro) VALUES (?, ?, ?)",
+            (registro["id"], registro["expira_en"], _json(registro))
+        )
+
+        papelera.append(registro)
+
+    _avanzar_version(RUTA_PAPELERA)
+
+
+def quitar_de_papelera(registro_ids):
+    ids = set(registro_ids)
+
+    with escritura_agrupada():
+        papelera = ver_papelera()
+        quitados = [r for r in papelera if r["id"] in ids]
+
+        if not quitados:
+            return []
+
+        _marcar_escritura(RUTA_PAPELERA)
+        _conexion().executemany(
+            "DELETE FROM papelera WHERE id = ?", [(r["id"],) for r in quitados]
+        )
+
+        papelera[:] = [r for r in papelera if r["id"] not in ids]
+
+    _avanzar_version(RUTA_PAPELERA)
+    return quitados
+
+
+# HISTORIAL
+def contar_eventos():
+    _verificar_cambios_externos()
+
+    if _CONTEO_EVENTOS["eventos"] is None:
+        _CONTEO_EVENTOS["eventos"] = _conexion().execute(
+            "SELECT count(*) FROM historial"
+        ).fetchone()[0]
+
+    return _CONTEO_EVENTOS["eventos"]
+
+
+def cargar_historial(desde=0):
+    cursor = _conexion().execute(
+        "SELECT evento FROM historial ORDER BY id LIMIT -1 OFFSET ?", (desde,)
+    )
+    for (evento,) in cursor:
+        yield json.loads(evento)
+
+
+def consultar_eventos(entidad=None, accion=None, desde=None, hasta=None,
+                      entidad_id=None, limite=None, recientes_primero=False):
+    instante = "json_extract(evento, '$.timestamp.iso')"
+    condiciones = []
+    parametros = []
+
+    if entidad is not None:
+        condiciones.append("json_extract(evento, '$.entidad') = ?")
+        parametros.append(entidad)
+    if accion is not None:
+        condiciones.append("json_extract(evento, '$.accion') = ?")
+        parametros.append(accion)
+    if desde is not None:
+        condiciones.append(f"{instante} >= ?")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append(f"{instante} <= ?")
+        parametros.append(hasta)
+    if entidad_id is not None:
+        # json_each recorre la lista de un evento por lote o el id suelto
+        condiciones.append(
+            "? IN (SELECT value FROM json_each(evento, '$.entidad_id'))"
+        )
+        parametros.append(entidad_id)
+
+    consulta = "SELECT evento FROM historial"
+    if condiciones:
+        consulta += " WHERE " + " AND ".join(condiciones)
+    consulta += " ORDER BY id DESC" if recientes_primero else " ORDER BY id"
+    if limite is not None:
+        consulta += " LIMIT ?"
+        parametros.append(max(limite, 0))
+
+    for (evento,) in _conexion().execute(consulta, parametros):
+        yield json.loads(evento)
+
+
+def agregar_evento(evento, numerar=None):
+    # Dentro de la transacción el número no puede cambiar hasta el COMMIT
+    with escritura_agrupada():
+        numero = contar_eventos() + 1
+        if numerar is not None:
+            numerar(evento, numero)
+        _conexion().execute("INSERT INTO historial (evento) VALUES (?)", (_json(evento),))
+        _CONTEO_EVENTOS["eventos"] = numero
+
+
+def guardar_historial(historial):
+    with escritura_agrupada():
+        conexion = _conexion()
+        conexion.execute("DELETE FROM historial")
+        conexion.execute("DELETE FROM snapshots")
+        conexion.executemany(
+            "INSERT INTO historial (evento) VALUES (?)",
+            ((_json(evento),) for evento in historial)
+        )
+
+    _CONTEO_EVENTOS["eventos"] = None
+
+
+def guardar_snapshot(numero, productos):
+    from servicios.almacenamiento import SNAPSHOTS_CONSERVADOS
+
+    with escritura_agrupada():
+        conexion = _conexion()
+        conexion.execute(
+            "INSERT OR REPLACE INTO snapshots (numero, productos) VALUES (?, ?)",
+            (numero, _json(productos))
+        )
+        conexion.execute(
+            "DELETE FROM snapshots WHERE numero NOT IN "
+            "(SELECT numero FROM snapshots ORDER BY numero DESC LIMIT ?)",
+            (SNAPSHOTS_CONSERVADOS,)
+        )
+
+
+def numero_ultimo_snapshot():
+    return _conexion().execute(
+        "SELECT coalesce(max(numero), 0) FROM snapshots"
+    ).fetchone()[0]
+
+
+def ultimo_snapshot():
+    fila = _conexion().execute(
+        "SELECT numero, productos FROM snapshots ORDER BY numero DESC LIMIT 1"
+    ).fetchone()
+    if fila is None:
+        return 0, []
+    return fila[0], json.loads(fila[1])
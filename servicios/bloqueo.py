@@ -0,0 +1,108 @@
+"""Bloqueo entre procesos sobre la carpeta de datos.
+
+Es un bloqueo advisory sobre un archivo: solo excluye a los procesos que
+también lo piden (todos los que usan almacenamiento). Usa fcntl.flock en
+sistemas POSIX y msvcrt.locking en Windows, donde no hay bloqueo
+compartido y se toma siempre exclusivo.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Un único bloqueo por proceso; el RLock además ordena a los hilos
+_HILOS = threading.RLock()
+_ESTADO = {"archivo": None, "profundidad": 0, "exclusivo": False}
+
+# Archivos de bloqueo abiertos por ruta, con el pid que los abrió: se
+# reutilizan entre bloqueos en lugar de abrirlos cada vez (ver _abrir)
+_ABIERTOS = {}
+
+
+def _tomar(archivo, exclusivo):
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        return
+
+    archivo.seek(0)
+    while True:
+        try:
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK se rinde tras diez intentos de un segundo: se reintenta
+            continue
+
+
+def _abrir(ruta):
+    """Devuelve el archivo de bloqueo de 'ruta', abierto una sola vez.
+
+    Si el archivo fue borrado o reemplazado (por ejemplo, al recrear la
+    carpeta de datos) se vuelve a abrir: bloquear el viejo no excluiría
+    a los procesos que abren el nuevo. Un proceso hijo (fork) también
+    abre el suyo, porque flock no distingue entre copias del descriptor.
+    """
+
+    pid, archivo = _ABIERTOS.get(ruta, (None, None))
+    if archivo is not None and pid == os.getpid():
+        try:
+            estado = os.stat(ruta)
+            abierto = os.fstat(archivo.fileno())
+            if (estado.st_dev, estado.st_ino) == (abierto.st_dev, abierto.st_ino):
+                return archivo
+        except FileNotFoundError:
+            pass
+    if archivo is not None:
+        archivo.close()
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    archivo = open(ruta, "a+b")
+    _ABIERTOS[ruta] = (os.getpid(), archivo)
+    return archivo
+
+
+def _soltar(archivo):
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+        return
+
+    archivo.seek(0)
+    msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloqueo(ruta, exclusivo=True):
+    """Toma el bloqueo de 'ruta' durante el bloque.
+
+    Es reentrante: dentro de un bloqueo ya tomado no se vuelve a pedir.
+    Un bloqueo compartido no puede convertirse en exclusivo anidándolo.
+    """
+
+    with _HILOS:
+        if _ESTADO["profundidad"]:
+            if exclusivo and not _ESTADO["exclusivo"]:
+                raise RuntimeError("No se puede pedir un bloqueo exclusivo dentro de uno compartido.")
+
+            _ESTADO["profundidad"] += 1
+            try:
+                yield
+            finally:
+                _ESTADO["profundidad"] -= 1
+            return
+
+        archivo = _abrir(ruta)
+        _tomar(archivo, exclusivo)
+
+        _ESTADO.update(archivo=archivo, profundidad=1, exclusivo=exclusivo)
+        try:
+            yield
+        finally:
+            _ESTADO.update(archivo=None, profundidad=0, exclusivo=False)
+            _soltar(archivo)
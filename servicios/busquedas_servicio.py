@@ -1,31 +1,193 @@
-from servicios.almacenamiento import cargar_inventario
-from servicios.campo_servicio import cargar_campos
-from servicios.campo_unico_servicio import es_campo_unico
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
 
+from servicios.almacenamiento import CAMPO_ID, ver_campos, ver_inventario, producto_publico
+from servicios.campo_unico_servicio import es_campo_unico, posicion_por_campo_unico
+from servicios.duplicados_servicio import es_duplicado
+from servicios.indices import IndiceInventario, posiciones_por_ids
+from servicios.metricas import medir
+from servicios.validadores import CONVERSORES, fecha_a_ordinal
 
+
+# Índice de trigramas para las búsquedas parciales en campos de texto.
+# Con inventarios chicos el recorrido lineal es igual de rápido, así que
+# el índice solo se usa (y se construye) a partir de UMBRAL_INDICE_TEXTO.
+INDICE_TEXTO_ACTIVO = True
+UMBRAL_INDICE_TEXTO = 2000
+
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class _IndiceTrigramas(IndiceInventario):
+    """Trigrama -> productos que lo contienen, por cada campo de tipo texto.
+
+    Cada producto recibe un número interno creciente (en el orden del
+    inventario) que no cambia al borrar otros productos, así una baja
+    solo toca las entradas del producto borrado. El texto en minúsculas
+    se calcula una vez al indexar y se reutiliza en cada búsqueda.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.campos = ()
+        self.reconstruir([])
+
+    def asegurar(self):
+        campos_texto = tuple(
+            campo for campo, tipo in ver_campos().items() if tipo == "texto"
+        )
+        if campos_texto != self.campos:
+            self.campos = campos_texto
+            self.version = None
+
+        super().asegurar()
+
+    def reconstruir(self, inventario):
+        self.numeros = []          # posición -> número interno
+        self.productos = {}        # número -> producto
+        self.minusculas = {campo: {} for campo in self.campos}
+        self.trigramas = {campo: {} for campo in self.campos}
+        self.siguiente = 0
+
+        for producto in inventario:
+            self.alta(producto, len(self.numeros))
+
+    def _indexar(self, producto, numero):
+        self.productos[numero] = producto
+
+        for campo in self.campos:
+            valor = producto.get(campo)
+            if valor is None:
+                continue
+
+            texto = str(valor).lower()
+            self.minusculas[campo][numero] = texto
+
+            trigramas = self.trigramas[campo]
+            for trigrama in _trigramas(texto):
+                numeros = trigramas.get(trigrama)
+                if numeros is None:
+                    trigramas[trigrama] = {numero}
+                else:
+                    numeros.add(numero)
+
+    def _desindexar(self, numero):
+        del self.productos[numero]
+
+        for campo in self.campos:
+            texto = self.minusculas[campo].pop(numero, None)
+            if texto is None:
+                continue
+
+            trigramas = self.trigramas[campo]
+            for trigrama in _trigramas(texto):
+                numeros = trigramas[trigrama]
+                numeros.discard(numero)
+                if not numeros:
+                    del trigramas[trigrama]
+
+    def alta(self, producto, posicion):
+        # Las altas siempre se agregan al final del inventario
+        numero = self.siguiente
+        self.siguiente += 1
+        self.numeros.append(numero)
+        self._indexar(producto, numero)
+
+    def baja(self, producto, posicion):
+        self._desindexar(self.numeros.pop(posicion))
+
+    def modificacion(self, antes, despues, posicion):
+        numero = self.numeros[posicion]
+        self._desindexar(numero)
+        self._indexar(despues, numero)
+
+    def buscar(self, campo, texto):
+        """Productos cuyo campo contiene 'texto' (ya en minúsculas), en orden.
+
+        Devuelve None si el índice no sirve para esa consulta (campo no
+        indexado o texto de menos de tres caracteres).
+        """
+
+        if campo not in self.trigramas or len(texto) < 3:
+            return None
+
+        trigramas = self.trigramas[campo]
+        conjuntos = []
+        for trigrama in _trigramas(texto):
+            numeros = trigramas.get(trigrama)
+            if not numeros:
+                return []
+            conjuntos.append(numeros)
+
+        conjuntos.sort(key=len)
+        candidatos = conjuntos[0].intersection(*conjuntos[1:])
+
+        # Compartir trigramas no garantiza contener el texto: se verifica
+        minusculas = self.minusculas[campo]
+        return [
+            self.productos[numero]
+            for numero in sorted(candidatos)
+            if texto in minusculas[numero]
+        ]
+
+
+_INDICE_TRIGRAMAS = _IndiceTrigramas()
+
+
+def _indice_texto(inventario):
+    """Devuelve el índice de trigramas si conviene usarlo sobre 'inventario'."""
+
+    if not INDICE_TEXTO_ACTIVO:
+        return None
+
+    actual = ver_inventario()
+    if inventario is not None and inventario is not actual:
+        return None
+
+    if len(actual) < UMBRAL_INDICE_TEXTO:
+        return None
+
+    _INDICE_TRIGRAMAS.asegurar()
+    return _INDICE_TRIGRAMAS
+
+
+@medir()
 def producto_duplicado(nuevo, inventario=None):
-    """Devuelve True si existe un producto estrictamente idéntico en el inventario."""
+    """Devuelve True si existe un producto idéntico en el inventario.
+
+    Se comparan solo los campos, con los textos normalizados (sin
+    mayúsculas ni espacios de más): las claves internas ("_id", etc.) se
+    ignoran. Usa las mismas huellas que la detección de duplicados al
+    agregar productos.
+    """
 
     if not isinstance(nuevo, dict):
         return False
 
-    if inventario is None:
-        inventario = cargar_inventario()
-
-    return any(producto == nuevo for producto in inventario)
+    return es_duplicado(nuevo, inventario)
 
 
+@medir()
 def buscar_producto(valor_busqueda, campo_clave, inventario=None):
     """Busca productos cuyo valor en 'campo_clave' coincida parcial o totalmente con 'valor_busqueda'."""
 
-    campos = cargar_campos()
+    campos = ver_campos()
     if campo_clave not in campos:
         return []
 
+    valor_busqueda = str(valor_busqueda).lower().strip()
+
+    indice = _indice_texto(inventario)
+    if indice is not None:
+        encontrados = indice.buscar(campo_clave, valor_busqueda)
+        if encontrados is not None:
+            return [producto_publico(producto) for producto in encontrados]
+
     if inventario is None:
-        inventario = cargar_inventario()
+        inventario = ver_inventario()
 
-    valor_busqueda = str(valor_busqueda).lower().strip()
     resultados = []
 
     for producto in inventario:
@@ -35,42 +197,59 @@ def buscar_producto(valor_busqueda, campo_clave, inventario=None):
             continue
 
         if valor_busqueda in str(valor_producto).lower():
-            resultados.append(producto)
+            resultados.append(producto_publico(producto))
 
     return resultados
 
 
+@medir()
 def buscar_similares(criterios, inventario=None):
     """Devuelve productos que coinciden parcialmente con TODOS los criterios."""
 
     if not isinstance(criterios, dict) or not criterios:
         return []
 
-    campos = cargar_campos()
+    campos = ver_campos()
     for campo in criterios:
         if campo not in campos:
             return []
 
+    # Los criterios se normalizan una sola vez, no por cada producto
+    criterios = [
+        (campo, str(valor).lower().strip())
+        for campo, valor in criterios.items()
+    ]
+
+    # Con índice, el criterio más largo acota los candidatos a verificar
+    indice = _indice_texto(inventario)
+    if indice is not None:
+        for campo, valor in sorted(criterios, key=lambda c: -len(c[1])):
+            candidatos = indice.buscar(campo, valor)
+            if candidatos is not None:
+                inventario = candidatos
+                break
+
     if inventario is None:
-        inventario = cargar_inventario()
+        inventario = ver_inventario()
 
     resultados = []
 
     for producto in inventario:
-        for campo, valor in criterios.items():
+        for campo, valor in criterios:
             valor_producto = producto.get(campo)
 
             if valor_producto is None:
                 break
 
-            if str(valor).lower().strip() not in str(valor_producto).lower():
+            if valor not in str(valor_producto).lower():
                 break
         else:
-            resultados.append(producto)
+            resultados.append(producto_publico(producto))
 
     return resultados
 
 
+@medir()
 def buscar_por_campo_unico(campo, valor, inventario=None):
     """Busca un producto por un campo marcado como único."""
 
@@ -78,10 +257,355 @@ def buscar_por_campo_unico(campo, valor, inventario=None):
         return None
 
     if inventario is None:
-        inventario = cargar_inventario()
+        posicion = posicion_por_campo_unico(campo, valor)
+        if posicion is None:
+            return None
+        return producto_publico(ver_inventario()[posicion])
 
     for producto in inventario:
         if producto.get(campo) == valor:
-            return producto
+            return producto_publico(producto)
+
+    return None
+
+
+# Índices ordenados para consultas por rango en campos numéricos y de fecha.
+# Igual que el de texto, se usan a partir de UMBRAL_INDICE_ORDENADO.
+INDICE_ORDENADO_ACTIVO = True
+UMBRAL_INDICE_ORDENADO = 2000
+
+TIPOS_ORDENABLES = ("num entero", "num decimal", "fecha")
+
+
+def _clave_ordenable(tipo, valor):
+    """Clave comparable de un valor de un campo ordenable, o None si no la tiene."""
+
+    if tipo == "fecha":
+        try:
+            return fecha_a_ordinal(valor)
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    # type() y no isinstance(): un bool no es un número
+    if type(valor) in (int, float):
+        return valor
 
     return None
+
+
+class _IndiceOrdenado(IndiceInventario):
+    """Claves ordenadas (con el id de su producto) por cada campo ordenable.
+
+    Cada campo tiene dos listas paralelas: las claves ordenadas (números
+    o fechas como ordinales) y los ids de los productos en el mismo
+    orden. Los rangos se resuelven con bisect sobre las claves.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tipos = {}
+        self.reconstruir([])
+
+    def asegurar(self):
+        tipos = {
+            campo: tipo for campo, tipo in ver_campos().items()
+            if tipo in TIPOS_ORDENABLES
+        }
+        if tipos != self.tipos:
+            self.tipos = tipos
+            self.version = None
+
+        super().asegurar()
+
+    def reconstruir(self, inventario):
+        self.claves = {}
+        self.ids = {}
+
+        for campo, tipo in self.tipos.items():
+            entradas = []
+            for producto in inventario:
+                clave = _clave_ordenable(tipo, producto.get(campo))
+                if clave is not None:
+                    entradas.append((clave, producto[CAMPO_ID]))
+
+            entradas.sort(key=itemgetter(0))
+            self.claves[campo] = [clave for clave, _ in entradas]
+            self.ids[campo] = [producto_id for _, producto_id in entradas]
+
+    def alta(self, producto, posicion):
+        for campo, tipo in self.tipos.items():
+            clave = _clave_ordenable(tipo, producto.get(campo))
+            if clave is None:
+                continue
+
+            claves = self.claves[campo]
+            lugar = bisect_right(claves, clave)
+            claves.insert(lugar, clave)
+            self.ids[campo].insert(lugar, producto[CAMPO_ID])
+
+    def altas(self, productos, posicion):
+        # Con pocos productos conviene insertar uno a uno; con un lote
+        # grande, agregar todo y reordenar (timsort aprovecha lo ya ordenado)
+        if len(productos) <= 64:
+            super().altas(productos, posicion)
+            return
+
+        for campo, tipo in self.tipos.items():
+            entradas = list(zip(self.claves[campo], self.ids[campo]))
+            for producto in productos:
+                clave = _clave_ordenable(tipo, producto.get(campo))
+                if clave is not None:
+                    entradas.append((clave, producto[CAMPO_ID]))
+
+            entradas.sort(key=itemgetter(0))
+            self.claves[campo] = [clave for clave, _ in entradas]
+            self.ids[campo] = [producto_id for _, producto_id in entradas]
+
+    def baja(self, producto, posicion):
+        for campo, tipo in self.tipos.items():
+            clave = _clave_ordenable(tipo, producto.get(campo))
+            if clave is None:
+                continue
+
+            claves = self.claves[campo]
+            ids = self.ids[campo]
+            inicio = bisect_left(claves, clave)
+            lugar = ids.index(producto[CAMPO_ID], inicio, bisect_right(claves, clave))
+            del claves[lugar]
+            del ids[lugar]
+
+    def modificacion(self, antes, despues, posicion):
+        self.baja(antes, posicion)
+        self.alta(despues, posicion)
+
+    def rango(self, campo, minimo=None, incluir_minimo=True, maximo=None, incluir_maximo=True):
+        """Devuelve (inicio, fin) de las claves de 'campo' dentro del rango."""
+
+        claves = self.claves[campo]
+
+        if minimo is None:
+            inicio = 0
+        elif incluir_minimo:
+            inicio = bisect_left(claves, minimo)
+        else:
+            inicio = bisect_right(claves, minimo)
+
+        if maximo is None:
+            fin = len(claves)
+        elif incluir_maximo:
+            fin = bisect_right(claves, maximo)
+        else:
+            fin = bisect_left(claves, maximo)
+
+        return inicio, max(inicio, fin)
+
+
+_INDICE_ORDENADO = _IndiceOrdenado()
+
+
+# Consultas con varias condiciones
+_OPERADORES = {
+    "texto": ("==", "!=", "contiene"),
+    "v/f": ("==", "!="),
+    "num entero": ("==", "!=", "<", "<=", ">", ">=", "entre"),
+    "num decimal": ("==", "!=", "<", "<=", ">", ">=", "entre"),
+    "fecha": ("==", "!=", "<", "<=", ">", ">=", "entre"),
+}
+
+
+def _compilar_condicion(campo, tipo, condicion):
+    """Traduce la condición de un campo a cotas, exclusiones y textos.
+
+    Los operandos se convierten al tipo del campo (y las fechas a
+    ordinales) una sola vez. Devuelve (filtro, None) o (None, error).
+    """
+
+    if not isinstance(condicion, dict):
+        condicion = {"==": condicion}
+
+    filtro = {
+        "campo": campo,
+        "tipo": tipo,
+        "minimo": None, "incluir_minimo": True,
+        "maximo": None, "incluir_maximo": True,
+        "igual": [], "distinto": [], "contiene": []
+    }
+    convertir = CONVERSORES[tipo]
+    ordenable = tipo in TIPOS_ORDENABLES
+
+    def operando(valor):
+        convertido = convertir(valor)
+        if convertido is None:
+            return None
+        return _clave_ordenable(tipo, convertido) if ordenable else convertido
+
+    def acotar_minimo(valor, incluir):
+        actual = filtro["minimo"]
+        if actual is None or valor > actual or (valor == actual and not incluir):
+            filtro["minimo"], filtro["incluir_minimo"] = valor, incluir
+
+    def acotar_maximo(valor, incluir):
+        actual = filtro["maximo"]
+        if actual is None or valor < actual or (valor == actual and not incluir):
+            filtro["maximo"], filtro["incluir_maximo"] = valor, incluir
+
+    for operador, valor in condicion.items():
+        if operador not in _OPERADORES[tipo]:
+            return None, f"Operador '{operador}' no válido para el campo '{campo}'."
+
+        if operador == "contiene":
+            filtro["contiene"].append(str(valor).lower().strip())
+            continue
+
+        if operador == "entre":
+            if not isinstance(valor, (list, tuple)) or len(valor) != 2:
+                return None, f"'entre' necesita dos valores para el campo '{campo}'."
+            desde, hasta = operando(valor[0]), operando(valor[1])
+            if desde is None or hasta is None:
+                return None, f"Valor inválido para el campo '{campo}'."
+            acotar_minimo(desde, True)
+            acotar_maximo(hasta, True)
+            continue
+
+        valor = operando(valor)
+        if valor is None:
+            return None, f"Valor inválido para el campo '{campo}'."
+
+        if operador == "!=":
+            filtro["distinto"].append(valor)
+        elif operador == "==":
+            if ordenable:
+                acotar_minimo(valor, True)
+                acotar_maximo(valor, True)
+            else:
+                filtro["igual"].append(valor)
+        elif operador in ("<", "<="):
+            acotar_maximo(valor, operador == "<=")
+        else:
+            acotar_minimo(valor, operador == ">=")
+
+    return filtro, None
+
+
+def _cumple(producto, filtro):
+    valor = producto.get(filtro["campo"])
+    if valor is None:
+        return False
+
+    if filtro["tipo"] in TIPOS_ORDENABLES:
+        valor = _clave_ordenable(filtro["tipo"], valor)
+        if valor is None:
+            return False
+
+        minimo, maximo = filtro["minimo"], filtro["maximo"]
+        if minimo is not None and (valor < minimo or (valor == minimo and not filtro["incluir_minimo"])):
+            return False
+        if maximo is not None and (valor > maximo or (valor == maximo and not filtro["incluir_maximo"])):
+            return False
+
+    for igual in filtro["igual"]:
+        if valor != igual:
+            return False
+
+    for distinto in filtro["distinto"]:
+        if valor == distinto:
+            return False
+
+    if filtro["contiene"]:
+        texto = str(valor).lower()
+        for parte in filtro["contiene"]:
+            if parte not in texto:
+                return False
+
+    return True
+
+
+def _candidatos(filtros, inventario):
+    """Elige el índice más selectivo y devuelve sus productos, o None.
+
+    Prioridad: igualdad sobre un campo único (a lo sumo un producto),
+    luego el rango con menos claves y por último la búsqueda de texto.
+    """
+
+    for filtro in filtros:
+        if filtro["igual"] and es_campo_unico(filtro["campo"]):
+            posicion = posicion_por_campo_unico(filtro["campo"], filtro["igual"][0])
+            return [] if posicion is None else [inventario[posicion]]
+
+    mejor = None
+    if INDICE_ORDENADO_ACTIVO and len(inventario) >= UMBRAL_INDICE_ORDENADO:
+        _INDICE_ORDENADO.asegurar()
+
+        for filtro in filtros:
+            campo = filtro["campo"]
+            if campo not in _INDICE_ORDENADO.claves:
+                continue
+            if filtro["minimo"] is None and filtro["maximo"] is None:
+                continue
+
+            inicio, fin = _INDICE_ORDENADO.rango(
+                campo,
+                filtro["minimo"], filtro["incluir_minimo"],
+                filtro["maximo"], filtro["incluir_maximo"]
+            )
+            if mejor is None or fin - inicio < mejor[2] - mejor[1]:
+                mejor = (campo, inicio, fin)
+
+    if mejor is not None:
+        campo, inicio, fin = mejor
+        posiciones = sorted(posiciones_por_ids(_INDICE_ORDENADO.ids[campo][inicio:fin]))
+        return [inventario[posicion] for posicion in posiciones]
+
+    indice = _indice_texto(None)
+    if indice is not None:
+        for filtro in filtros:
+            for parte in filtro["contiene"]:
+                encontrados = indice.buscar(filtro["campo"], parte)
+                if encontrados is not None:
+                    return encontrados
+
+    return None
+
+
+@medir()
+def consultar_productos(condiciones, inventario=None):
+    """Devuelve los productos que cumplen TODAS las condiciones.
+
+    'condiciones' asocia cada campo a un valor (igualdad) o a un dict de
+    operadores: "==", "!=", "<", "<=", ">", ">=", "entre" (par de valores,
+    inclusivo) y "contiene" (texto parcial, sin distinguir mayúsculas).
+    Los operandos se escriben como en la carga de datos (p. ej. fechas
+    DD-MM-YYYY). Los de orden solo valen para números y fechas.
+
+    Sin 'inventario' se usan los índices para acotar los candidatos; con
+    una lista explícita se la recorre.
+    """
+
+    if not isinstance(condiciones, dict) or not condiciones:
+        return False, "No se indicaron condiciones."
+
+    campos = ver_campos()
+    filtros = []
+
+    for campo, condicion in condiciones.items():
+        if campo not in campos:
+            return False, f"El campo '{campo}' no existe."
+
+        filtro, error = _compilar_condicion(campo, campos[campo], condicion)
+        if error:
+            return False, error
+        filtros.append(filtro)
+
+    candidatos = None
+    if inventario is None:
+        inventario = ver_inventario()
+        candidatos = _candidatos(filtros, inventario)
+
+    if candidatos is None:
+        candidatos = inventario
+
+    return True, [
+        producto_publico(producto)
+        for producto in candidatos
+        if all(_cumple(producto, filtro) for filtro in filtros)
+    ]
@@ -1,47 +1,59 @@
 # Imports de infraestructura
-from almacenamiento import (
+from servicios.almacenamiento import (
     cargar_campos,
     guardar_campos,
-    cargar_inventario,
-    guardar_inventario,
+    ver_inventario,
+    ver_migraciones,
+    registrar_migracion,
+    escritura_agrupada,
+    reintentar_si_hay_conflicto,
 )
 
 # Servicios de dominio
-from campo_unico_servicio import (
+from servicios.campo_unico_servicio import (
     marcar_campo_unico,
     desmarcar_campo_unico,
     es_campo_unico,
 )
 
-from papelera_servicio import enviar_a_papelera
-from historial_servicio import registrar_evento
+from servicios.papelera_servicio import enviar_a_papelera
+from servicios.historial_servicio import registrar_evento
+from servicios.metricas import medir
 
 # Validaciones y utilidades
-from validadores import validar_dato
+from servicios.validadores import (
+    convertir_texto,
+    convertir_entero,
+    convertir_decimal,
+    convertir_booleano,
+    convertir_fecha,
+)
 from utilidades.texto import normalizar_nombre
 
 
 # Tipos de campo soportados y su lógica de validación
 TIPOS_CAMPOS = {
     "texto": {
-        "validador": lambda v: validar_dato(v, str)
+        "validador": convertir_texto
     },
     "num entero": {
-        "validador": lambda v: validar_dato(v, int)
+        "validador": convertir_entero
     },
     "num decimal": {
-        "validador": lambda v: validar_dato(v, float)
+        "validador": convertir_decimal
     },
     "v/f": {
-        "validador": lambda v: validar_dato(v, bool)
+        "validador": convertir_booleano
     },
     "fecha": {
-        "validador": lambda v: validar_dato(v, "fecha")
+        "validador": convertir_fecha
     }
 }
 
 
 # Alta de campo
+@medir()
+@reintentar_si_hay_conflicto
 def crear_campo(nombre, tipo, unico=False):
     """Crea un campo nuevo en el sistema."""
 
@@ -51,17 +63,21 @@ def crear_campo(nombre, tipo, unico=False):
     if not nombre:
         return False, "Nombre inválido."
 
+    if nombre.startswith("_"):
+        return False, "Los nombres que empiezan con '_' están reservados."
+
     if nombre in campos:
         return False, "El campo ya existe."
 
     if tipo not in TIPOS_CAMPOS:
         return False, "Tipo inválido."
 
-    campos[nombre] = tipo
-    guardar_campos(campos)
+    with escritura_agrupada():
+        campos[nombre] = tipo
+        guardar_campos(campos)
 
-    if unico:
-        marcar_campo_unico(nombre)
+        if unico:
+            marcar_campo_unico(nombre)
 
     registrar_evento(
         accion="Alta",
@@ -77,11 +93,12 @@ def crear_campo(nombre, tipo, unico=False):
 
 
 # Modificación de campo
+@medir()
+@reintentar_si_hay_conflicto
 def modificar_campo(nombre_actual, nuevo_nombre=None, nuevo_tipo=None, unico=None):
     """Modifica un campo existente."""
 
     campos = cargar_campos()
-    inventario = cargar_inventario()
 
     nombre_actual = normalizar_nombre(nombre_actual)
     if nombre_actual not in campos:
@@ -93,6 +110,9 @@ def modificar_campo(nombre_actual, nuevo_nombre=None, nuevo_tipo=None, unico=Non
         if not nuevo_nombre:
             return False, "Nombre inválido."
 
+        if nuevo_nombre.startswith("_"):
+            return False, "Los nombres que empiezan con '_' están reservados."
+
         if nuevo_nombre != nombre_actual and nuevo_nombre in campos:
             return False, "Ya existe un campo con ese nombre."
 
@@ -103,16 +123,23 @@ def modificar_campo(nombre_actual, nuevo_nombre=None, nuevo_tipo=None, unico=Non
 
         validador = TIPOS_CAMPOS[nuevo_tipo]["validador"]
 
-        for producto in inventario:
+        # Se convierte una sola vez: los valores validados son los que
+        # se aplican después (posición -> valor convertido)
+        convertidos = {}
+
+        for posicion, producto in enumerate(ver_inventario()):
             if nombre_actual not in producto:
                 continue
 
-            if validador(producto[nombre_actual]) is None:
+            valor = validador(producto[nombre_actual])
+            if valor is None:
                 return False, (
                     f"No se puede convertir el valor "
                     f"'{producto[nombre_actual]}' al tipo '{nuevo_tipo}'."
                 )
 
+            convertidos[posicion] = valor
+
     antes = {
         "nombre": nombre_actual,
         "tipo": campos[nombre_actual],
@@ -120,38 +147,44 @@ def modificar_campo(nombre_actual, nuevo_nombre=None, nuevo_tipo=None, unico=Non
     }
 
     nombre_final = nombre_actual
-
-    # Cambio de nombre
-    if nuevo_nombre and nuevo_nombre != nombre_actual:
-        campos[nuevo_nombre] = campos.pop(nombre_actual)
-        nombre_final = nuevo_nombre
-
-        for producto in inventario:
-            if nombre_actual in producto:
-                producto[nuevo_nombre] = producto.pop(nombre_actual)
-
-        if es_campo_unico(nombre_actual):
+    renombrar = bool(nuevo_nombre) and nuevo_nombre != nombre_actual
+
+    with escritura_agrupada():
+        # Los productos no se reescriben: los cambios quedan como
+        # migraciones que se aplican al leer el inventario
+        if renombrar:
+            campos[nuevo_nombre] = campos.pop(nombre_actual)
+            nombre_final = nuevo_nombre
+
+            registrar_migracion({
+                "accion": "renombrar",
+                "campo": nombre_actual,
+                "nuevo": nuevo_nombre
+            })
+
+        # Cambio de tipo
+        if nuevo_tipo is not None:
+            campos[nombre_final] = nuevo_tipo
+
+            registrar_migracion(
+                {"accion": "convertir", "campo": nombre_final, "tipo": nuevo_tipo},
+                valores=convertidos
+            )
+
+        # Se guarda antes de tocar la unicidad: marcar un campo exige que
+        # exista con su nombre final y se valida contra el inventario nuevo
+        guardar_campos(campos)
+
+        if renombrar and antes["unico"]:
             desmarcar_campo_unico(nombre_actual)
             marcar_campo_unico(nombre_final)
 
-    # Cambio de tipo
-    if nuevo_tipo is not None:
-        campos[nombre_final] = nuevo_tipo
-        validador = TIPOS_CAMPOS[nuevo_tipo]["validador"]
-
-        for producto in inventario:
-            if nombre_final in producto:
-                producto[nombre_final] = validador(producto[nombre_final])
-
-    # Cambio de unicidad
-    if unico is not None:
-        if unico:
-            marcar_campo_unico(nombre_final)
-        else:
-            desmarcar_campo_unico(nombre_final)
-
-    guardar_campos(campos)
-    guardar_inventario(inventario)
+        # Cambio de unicidad
+        if unico is not None:
+            if unico:
+                marcar_campo_unico(nombre_final)
+            else:
+                desmarcar_campo_unico(nombre_final)
 
     registrar_evento(
         accion="Modificación",
@@ -168,11 +201,17 @@ def modificar_campo(nombre_actual, nuevo_nombre=None, nuevo_tipo=None, unico=Non
 
 
 # Eliminación de campo
+@medir()
+@reintentar_si_hay_conflicto
 def eliminar_campo(nombre):
-    """Elimina un campo de forma no destructiva."""
+    """Elimina un campo de forma no destructiva.
+
+    Los valores no se copian: cada producto los conserva en
+    '_campos_ocultos', adonde los mueve la migración "ocultar" al leerlo.
+    El snapshot indica el número de esa migración.
+    """
 
     campos = cargar_campos()
-    inventario = cargar_inventario()
 
     nombre = normalizar_nombre(nombre)
     if nombre not in campos:
@@ -185,28 +224,23 @@ def eliminar_campo(nombre):
         "nombre": nombre,
         "tipo": campos[nombre],
         "unico": es_campo_unico(nombre),
-        "valores": {}
+        "migracion": len(ver_migraciones()) + 1
     }
 
-    for i, producto in enumerate(inventario):
-        if nombre in producto:
-            snapshot["valores"][i] = producto[nombre]
-            producto.setdefault("_campos_ocultos", {})[nombre] = producto[nombre]
-            del producto[nombre]
-
-    enviar_a_papelera(
-        entidad="campo",
-        snapshot=snapshot,
-        motivo="eliminacion_campo"
-    )
+    with escritura_agrupada():
+        enviar_a_papelera(
+            entidad="campo",
+            snapshot=snapshot,
+            motivo="eliminacion_campo"
+        )
 
-    if es_campo_unico(nombre):
-        desmarcar_campo_unico(nombre)
+        if es_campo_unico(nombre):
+            desmarcar_campo_unico(nombre)
 
-    del campos[nombre]
+        del campos[nombre]
 
-    guardar_campos(campos)
-    guardar_inventario(inventario)
+        guardar_campos(campos)
+        registrar_migracion({"accion": "ocultar", "campo": nombre})
 
     registrar_evento(
         accion="Eliminación",
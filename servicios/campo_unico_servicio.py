@@ -1,47 +1,128 @@
-import json
-
-# Rutas de almacenamiento (acceso directo para evitar imports circulares)
-from almacenamiento import (
-    RUTA_CAMPOS_UNICOS,
-    RUTA_CAMPOS,
+# Infraestructura
+from servicios.almacenamiento import (
+    CAMPO_ID,
+    ver_campos,
+    ver_campos_unicos,
+    ver_inventario,
+    cargar_campos_unicos,
+    guardar_campos_unicos,
+    reintentar_si_hay_conflicto,
 )
 
 # Servicios de dominio
-from inventario_servicio import cargar_inventario
-from historial_servicio import registrar_evento
+from servicios.historial_servicio import registrar_evento
+from servicios.indices import IndiceInventario, posicion_por_id
+from servicios.metricas import medir
 
 # Utilidades
 from utilidades.texto import normalizar_nombre
 
 
-# Helpers de almacenamiento (privados)
-def _cargar_campos_definidos():
-    """Carga los campos definidos sin depender de campo_servicio."""
-    
-    try:
-        with open(RUTA_CAMPOS, "r", encoding="utf-8") as archivo:
-            contenido = archivo.read().strip()
-            return json.loads(contenido) if contenido else {}
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+# Índice de campos únicos
+def _mapear_valores(nombre, inventario):
+    """Devuelve el mapa valor -> id de producto de un campo y los duplicados hallados.
 
+    Los duplicados se informan con los ids de los productos involucrados.
+    """
 
-def _cargar_campos_unicos():
-    """Carga la lista de campos marcados como únicos."""
-    
-    try:
-        with open(RUTA_CAMPOS_UNICOS, "r", encoding="utf-8") as archivo:
-            contenido = archivo.read().strip()
-            return json.loads(contenido) if contenido else []
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    vistos = {}
+    conflictos = []
+
+    for producto in inventario:
+        if nombre not in producto:
+            continue
 
+        valor = producto[nombre]
+        if valor is None:
+            continue
 
-def _guardar_campos_unicos(campos):
-    """Guarda la lista de campos únicos."""
-    
-    with open(RUTA_CAMPOS_UNICOS, "w", encoding="utf-8") as archivo:
-        json.dump(sorted(set(campos)), archivo, indent=4, ensure_ascii=False)
+        if valor in vistos:
+            conflictos.append({
+                "campo": nombre,
+                "valor": valor,
+                "productos": [vistos[valor], producto.get(CAMPO_ID)]
+            })
+        else:
+            vistos[valor] = producto.get(CAMPO_ID)
+
+    return vistos, conflictos
+
+
+class _IndiceUnicos(IndiceInventario):
+    """Mapa valor -> id del producto por cada campo único.
+
+    Guarda ids y no posiciones: una baja no corre a los productos
+    siguientes. La posición se resuelve con el índice de ids.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.mapas = {}
+
+    def asegurar(self):
+        super().asegurar()
+
+        # Los campos marcados o desmarcados desde la última consulta
+        campos_unicos = ver_campos_unicos()
+        if len(self.mapas) != len(campos_unicos) or any(
+            campo not in self.mapas for campo in campos_unicos
+        ):
+            inventario = ver_inventario()
+            self.mapas = {
+                campo: (
+                    self.mapas[campo] if campo in self.mapas
+                    else _mapear_valores(campo, inventario)[0]
+                )
+                for campo in campos_unicos
+            }
+
+    def reconstruir(self, inventario):
+        self.mapas = {
+            campo: _mapear_valores(campo, inventario)[0]
+            for campo in ver_campos_unicos()
+        }
+
+    def instalar(self, campo, mapa):
+        """Incorpora el mapa de un campo recién marcado como único."""
+
+        self.mapas[campo] = mapa
+        self.asegurar()
+
+    def buscar(self, campo, valor):
+        """Devuelve la posición del producto con ese valor, o None."""
+
+        self.asegurar()
+        mapa = self.mapas.get(campo)
+        if mapa is None or valor is None:
+            return None
+
+        producto_id = mapa.get(valor)
+        return None if producto_id is None else posicion_por_id(producto_id)
+
+    def alta(self, producto, posicion):
+        for campo, mapa in self.mapas.items():
+            valor = producto.get(campo)
+            if valor is not None:
+                mapa.setdefault(valor, producto.get(CAMPO_ID))
+
+    def baja(self, producto, posicion):
+        for campo, mapa in self.mapas.items():
+            valor = producto.get(campo)
+            if valor is not None and mapa.get(valor) == producto.get(CAMPO_ID):
+                del mapa[valor]
+
+    def modificacion(self, antes, despues, posicion):
+        for campo, mapa in self.mapas.items():
+            valor = antes.get(campo)
+            if valor is not None and mapa.get(valor) == antes.get(CAMPO_ID):
+                del mapa[valor]
+
+            valor = despues.get(campo)
+            if valor is not None:
+                mapa.setdefault(valor, despues.get(CAMPO_ID))
+
+
+_INDICE_UNICOS = _IndiceUnicos()
 
 
 # Consultas
@@ -52,7 +133,24 @@ def es_campo_unico(nombre_campo):
     if not nombre:
         return False
 
-    return nombre in _cargar_campos_unicos()
+    return nombre in ver_campos_unicos()
+
+
+def posicion_por_campo_unico(campo, valor):
+    """Devuelve la posición en el inventario del producto con ese valor único."""
+
+    return _INDICE_UNICOS.buscar(campo, valor)
+
+
+def indice_campos_unicos():
+    """Mapas valor -> id de producto de cada campo único (solo lectura).
+
+    Pensado para operaciones masivas que consultan muchos valores sin
+    volver a verificar el estado del índice en cada consulta.
+    """
+
+    _INDICE_UNICOS.asegurar()
+    return _INDICE_UNICOS.mapas
 
 
 def detectar_conflictos_unicidad(nombre_campo, inventario):
@@ -62,58 +160,55 @@ def detectar_conflictos_unicidad(nombre_campo, inventario):
     if not nombre:
         return []
 
-    vistos = {}
-    conflictos = []
-
-    for idx, producto in enumerate(inventario):
-        if nombre not in producto:
-            continue
-
-        valor = producto[nombre]
-        if valor is None:
-            continue
+    return _mapear_valores(nombre, inventario)[1]
 
-        if valor in vistos:
-            conflictos.append({
-                "campo": nombre,
-                "valor": valor,
-                "productos": [vistos[valor], idx]
-            })
-        else:
-            vistos[valor] = idx
 
-    return conflictos
-
-
-def validar_unicidad_producto(producto, inventario):
+@medir()
+def validar_unicidad_producto(producto, inventario=None, posicion_propia=None):
     """
     Valida que un producto no viole restricciones de campos únicos.
     Devuelve una lista de conflictos (vacía si no hay).
+
+    Sin 'inventario' se consulta el índice del inventario guardado; con
+    una lista explícita se la recorre. 'posicion_propia' excluye al
+    propio producto cuando se valida una modificación. Cada conflicto
+    indica el id del producto que ya tiene el valor.
     """
     
     conflictos = []
+    campos_unicos = ver_campos_unicos()
 
     for campo, valor in producto.items():
-        if not es_campo_unico(campo):
+        if campo not in campos_unicos:
             continue
 
         if valor is None:
             continue
 
-        for idx, existente in enumerate(inventario):
-            if existente.get(campo) == valor:
-                conflictos.append({
-                    "campo": campo,
-                    "valor": valor,
-                    "tipo": "unicidad",
-                    "producto": idx
-                })
-                break
+        if inventario is None:
+            idx = _INDICE_UNICOS.buscar(campo, valor)
+        else:
+            idx = next(
+                (i for i, existente in enumerate(inventario)
+                 if existente.get(campo) == valor),
+                None
+            )
+
+        if idx is not None and idx != posicion_propia:
+            existentes = ver_inventario() if inventario is None else inventario
+            conflictos.append({
+                "campo": campo,
+                "valor": valor,
+                "tipo": "unicidad",
+                "producto": existentes[idx].get(CAMPO_ID)
+            })
 
     return conflictos
 
 
 # Comandos
+@medir()
+@reintentar_si_hay_conflicto
 def marcar_campo_unico(nombre_campo):
     """Marca un campo como único."""
     
@@ -121,16 +216,14 @@ def marcar_campo_unico(nombre_campo):
     if not nombre:
         return False, "Nombre de campo inválido."
 
-    campos_definidos = _cargar_campos_definidos()
-    if nombre not in campos_definidos:
+    if nombre not in ver_campos():
         return False, f'El campo "{nombre}" no existe.'
 
-    campos_unicos = _cargar_campos_unicos()
+    campos_unicos = cargar_campos_unicos()
     if nombre in campos_unicos:
         return False, f'El campo "{nombre}" ya es único.'
 
-    inventario = cargar_inventario()
-    conflictos = detectar_conflictos_unicidad(nombre, inventario)
+    mapa, conflictos = _mapear_valores(nombre, ver_inventario())
 
     if conflictos:
         return False, {
@@ -140,7 +233,8 @@ def marcar_campo_unico(nombre_campo):
         }
 
     campos_unicos.append(nombre)
-    _guardar_campos_unicos(campos_unicos)
+    guardar_campos_unicos(campos_unicos)
+    _INDICE_UNICOS.instalar(nombre, mapa)
 
     registrar_evento(
         accion="Modificación",
@@ -152,6 +246,8 @@ def marcar_campo_unico(nombre_campo):
     return True, None
 
 
+@medir()
+@reintentar_si_hay_conflicto
 def desmarcar_campo_unico(nombre_campo):
     """Quita la marca de campo único."""
     
@@ -159,12 +255,12 @@ def desmarcar_campo_unico(nombre_campo):
     if not nombre:
         return False, "Nombre de campo inválido."
 
-    campos_unicos = _cargar_campos_unicos()
+    campos_unicos = cargar_campos_unicos()
     if nombre not in campos_unicos:
         return False, f'El campo "{nombre}" no está marcado como único.'
 
     campos_unicos.remove(nombre)
-    _guardar_campos_unicos(campos_unicos)
+    guardar_campos_unicos(campos_unicos)
 
     registrar_evento(
         accion="Modificación",
@@ -0,0 +1,193 @@
+"""Detección de productos duplicados al agregar.
+
+Cada producto tiene una huella: el hash de sus campos normalizados
+(textos en minúsculas y sin espacios de más; las claves internas no
+cuentan). El índice guarda huella -> ids de los productos, así saber si
+un producto nuevo repite a otro existente cuesta una búsqueda en un dict
+en lugar de recorrer el inventario.
+
+Para los casi duplicados se puede bloquear por algunos campos elegidos:
+los productos que coinciden (normalizados) en todos ellos son candidatos.
+Cada combinación de campos tiene su propio mapa clave -> ids, que se
+construye la primera vez que se pide y después se mantiene con el resto.
+"""
+
+from servicios.almacenamiento import CAMPO_ID, ver_inventario, producto_publico
+from servicios.indices import IndiceInventario, posiciones_por_ids
+from servicios.metricas import medir
+
+
+# Combinaciones de campos de bloqueo que se mantienen a la vez; al pedir
+# una más se descarta la más antigua
+MAXIMO_BLOQUEOS = 8
+
+
+def normalizar_valor(valor):
+    """Valor comparable: los textos sin mayúsculas ni espacios de más."""
+
+    if isinstance(valor, str):
+        return " ".join(valor.lower().split())
+    return valor
+
+
+def _fila_normalizada(producto):
+    return tuple(sorted(
+        (clave, normalizar_valor(valor))
+        for clave, valor in producto.items()
+        if not clave.startswith("_")
+    ))
+
+
+def huella_producto(producto):
+    """Hash de los campos normalizados del producto."""
+
+    return hash(_fila_normalizada(producto))
+
+
+def clave_bloqueo(producto, campos):
+    """Valores normalizados de 'campos', o None si al producto le falta alguno."""
+
+    valores = []
+    for campo in campos:
+        valor = producto.get(campo)
+        if valor is None:
+            return None
+        valores.append(normalizar_valor(valor))
+    return tuple(valores)
+
+
+def _agregar(mapa, clave, producto_id):
+    ids = mapa.get(clave)
+    if ids is None:
+        mapa[clave] = [producto_id]
+    else:
+        ids.append(producto_id)
+
+
+def _quitar(mapa, clave, producto_id):
+    ids = mapa.get(clave)
+    if ids is None:
+        return
+    if producto_id in ids:
+        ids.remove(producto_id)
+    if not ids:
+        del mapa[clave]
+
+
+class _IndiceDuplicados(IndiceInventario):
+    """Huella -> ids, y por cada combinación de campos de bloqueo, clave -> ids."""
+
+    def __init__(self):
+        super().__init__()
+        self.bloqueos = {}
+        self.reconstruir([])
+
+    def reconstruir(self, inventario):
+        self.huellas = {}
+        for producto in inventario:
+            _agregar(self.huellas, huella_producto(producto), producto.get(CAMPO_ID))
+
+        for campos in self.bloqueos:
+            self.bloqueos[campos] = self._bloques(inventario, campos)
+
+    @staticmethod
+    def _bloques(inventario, campos):
+        bloques = {}
+        for producto in inventario:
+            clave = clave_bloqueo(producto, campos)
+            if clave is not None:
+                _agregar(bloques, clave, producto.get(CAMPO_ID))
+        return bloques
+
+    def alta(self, producto, posicion):
+        producto_id = producto.get(CAMPO_ID)
+        _agregar(self.huellas, huella_producto(producto), producto_id)
+
+        for campos, bloques in self.bloqueos.items():
+            clave = clave_bloqueo(producto, campos)
+            if clave is not None:
+                _agregar(bloques, clave, producto_id)
+
+    def baja(self, producto, posicion):
+        producto_id = producto.get(CAMPO_ID)
+        _quitar(self.huellas, huella_producto(producto), producto_id)
+
+        for campos, bloques in self.bloqueos.items():
+            clave = clave_bloqueo(producto, campos)
+            if clave is not None:
+                _quitar(bloques, clave, producto_id)
+
+    def modificacion(self, antes, despues, posicion):
+        self.baja(antes, posicion)
+        self.alta(despues, posicion)
+
+    def bloques(self, campos):
+        """Mapa clave -> ids para 'campos' (el índice ya debe estar al día)."""
+
+        bloques = self.bloqueos.get(campos)
+        if bloques is None:
+            if len(self.bloqueos) >= MAXIMO_BLOQUEOS:
+                del self.bloqueos[next(iter(self.bloqueos))]
+            bloques = self.bloqueos[campos] = self._bloques(ver_inventario(), campos)
+        return bloques
+
+
+_INDICE = _IndiceDuplicados()
+
+
+def indice_bloqueo(campos):
+    """Mapa clave de bloqueo -> ids de productos para la combinación 'campos'."""
+
+    _INDICE.asegurar()
+    return _INDICE.bloques(tuple(campos))
+
+
+def _productos(ids):
+    inventario = ver_inventario()
+    posiciones = [posicion for posicion in posiciones_por_ids(ids) if posicion is not None]
+    return [inventario[posicion] for posicion in sorted(posiciones)]
+
+
+@medir()
+def buscar_duplicados(nuevo, campos_bloqueo=None):
+    """Productos que repiten a 'nuevo', en el orden del inventario.
+
+    Son los de igual huella (y filas normalizadas iguales: el hash solo
+    acota) y, si se indican 'campos_bloqueo', los que coinciden con
+    'nuevo' en todos esos campos.
+    """
+
+    _INDICE.asegurar()
+
+    fila = _fila_normalizada(nuevo)
+    ids = set(
+        producto[CAMPO_ID]
+        for producto in _productos(_INDICE.huellas.get(hash(fila), ()))
+        if _fila_normalizada(producto) == fila
+    )
+
+    if campos_bloqueo:
+        clave = clave_bloqueo(nuevo, campos_bloqueo)
+        if clave is not None:
+            ids.update(_INDICE.bloques(tuple(campos_bloqueo)).get(clave, ()))
+
+    return [producto_publico(producto) for producto in _productos(ids)]
+
+
+def es_duplicado(nuevo, inventario=None):
+    """True si algún producto tiene los mismos campos normalizados que 'nuevo'.
+
+    Sin 'inventario' se consulta el índice de huellas; con una lista
+    explícita se la recorre.
+    """
+
+    fila = _fila_normalizada(nuevo)
+
+    if inventario is None:
+        _INDICE.asegurar()
+        ids = _INDICE.huellas.get(hash(fila))
+        if not ids:
+            return False
+        inventario = _productos(ids)
+
+    return any(_fila_normalizada(producto) == fila for producto in inventario)
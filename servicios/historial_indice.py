@@ -0,0 +1,329 @@
+"""Índice de desplazamientos del historial (segmentos y registro activo).
+
+Por cada evento guarda su instante (ISO, que se ordena como texto), el
+byte donde empieza su línea, su entidad y su acción, más las listas de
+eventos por entidad, por acción y por id de entidad. Una consulta elige
+con ellas qué líneas leer y solo deserializa esas.
+
+El índice se completa leyendo lo agregado desde la última vez (y sigue
+al registro activo cuando se rota a un segmento). Se guarda en disco
+cada tanto: un proceso nuevo retoma desde ahí en lugar de recorrer el
+historial entero.
+"""
+
+import json
+import os
+import zlib
+from bisect import bisect_left, bisect_right
+
+from servicios.historial_segmentos import abrir_segmento, listar_segmentos
+
+
+# Eventos nuevos indexados a partir de los cuales el índice se vuelve a guardar
+INTERVALO_GUARDADO = 10_000
+
+# Bytes previos al fin indexado con los que se reconoce que el registro
+# no fue reescrito desde que se indexó
+_BYTES_CONTROL = 64
+
+_FORMATO = 2
+
+# Nombre con el que el índice se refiere al registro activo
+_ACTIVO = ""
+
+
+def _ids_evento(evento):
+    entidad_id = evento.get("entidad_id")
+    if entidad_id is None:
+        return ()
+    if isinstance(entidad_id, list):
+        return entidad_id
+    return (entidad_id,)
+
+
+class IndiceHistorial:
+    """Índice del registro 'ruta_log' y sus segmentos, guardado en 'ruta_indice'."""
+
+    def __init__(self, ruta_log, carpeta_segmentos, ruta_indice):
+        self.ruta_log = ruta_log
+        self.carpeta_segmentos = carpeta_segmentos
+        self.ruta_indice = ruta_indice
+        self.cargado = False
+        self.sin_guardar = 0
+        self.segmentos = {}
+        self._vaciar()
+
+    def _vaciar(self):
+        # Archivos indexados en orden, con el número de su primer evento;
+        # el último es siempre el registro activo
+        self.archivos = [_ACTIVO]
+        self.primeros = [0]
+        self.fin = 0
+        self.control = 0
+        self.ordenado = True
+        self.tiempos = []
+        self.offsets = []
+        self.entidad_de = []
+        self.accion_de = []
+        self.por_entidad = {}
+        self.por_accion = {}
+        self.por_id = {}
+
+    @staticmethod
+    def _control(f, fin):
+        inicio = max(0, fin - _BYTES_CONTROL)
+        f.seek(inicio)
+        return zlib.crc32(f.read(fin - inicio))
+
+    def _indexar(self, evento, posicion):
+        numero = len(self.offsets)
+        instante = (evento.get("timestamp") or {}).get("iso") or ""
+        entidad = evento.get("entidad")
+        accion = evento.get("accion")
+
+        # Con el reloj atrasado los instantes dejan de estar ordenados y
+        # los rangos se filtran evento por evento
+        if self.tiempos and instante < self.tiempos[-1]:
+            self.ordenado = False
+
+        self.tiempos.append(instante)
+        self.offsets.append(posicion)
+        self.entidad_de.append(entidad)
+        self.accion_de.append(accion)
+
+        self.por_entidad.setdefault(entidad, []).append(numero)
+        self.por_accion.setdefault(accion, []).append(numero)
+        for entidad_id in _ids_evento(evento):
+            self.por_id.setdefault(entidad_id, []).append(numero)
+
+    def _indexar_desde(self, f, posicion):
+        """Indexa las líneas completas desde 'posicion'; devuelve dónde terminó."""
+
+        f.seek(posicion)
+        for linea in f:
+            # Una línea sin terminar todavía se está escribiendo
+            if not linea.endswith(b"\n"):
+                break
+            if linea.strip():
+                self._indexar(json.loads(linea), posicion)
+            posicion += len(linea)
+        return posicion
+
+    def _continua(self, segmentos):
+        """True si lo indexado sigue siendo el comienzo del historial en disco."""
+
+        conocidos = self.archivos[:-1]
+        if [s.nombre for s in segmentos[:len(conocidos)]] != conocidos:
+            return False
+
+        if len(segmentos) > len(conocidos):
+            # El registro que se venía indexando como activo fue rotado:
+            # tiene que ser el primero de los segmentos nuevos
+            rotado = segmentos[len(conocidos)]
+            if rotado.primero != self.primeros[-1]:
+                return False
+            archivo = abrir_segmento(rotado)
+        else:
+            if os.path.getsize(self.ruta_log) < self.fin:
+                return False
+            archivo = open(self.ruta_log, "rb")
+
+        with archivo as f:
+            return self._control(f, self.fin) == self.control
+
+    def actualizar(self):
+        """Indexa lo agregado al historial desde la última vez."""
+
+        if not self.cargado:
+            self._cargar()
+            self.cargado = True
+
+        eventos = len(self.offsets)
+        segmentos = listar_segmentos(self.carpeta_segmentos)
+        self.segmentos = {s.nombre: s for s in segmentos}
+
+        # Historial reescrito (migración, guardar_historial): se reindexa
+        if not self._continua(segmentos):
+            self._vaciar()
+            eventos = 0
+
+        for segmento in segmentos[len(self.archivos) - 1:]:
+            with abrir_segmento(segmento) as f:
+                self._indexar_desde(f, self.fin)
+            self.archivos[-1] = segmento.nombre
+            self.archivos.append(_ACTIVO)
+            self.primeros.append(len(self.offsets))
+            self.fin = 0
+            self.control = 0
+
+        with open(self.ruta_log, "rb") as f:
+            self.fin = self._indexar_desde(f, self.fin)
+            self.control = self._control(f, self.fin)
+
+        self.sin_guardar += len(self.offsets) - eventos
+        if self.sin_guardar >= INTERVALO_GUARDADO:
+            self.guardar()
+
+    def consultar(self, entidad=None, accion=None, desde=None, hasta=None,
+                  entidad_id=None, limite=None, recientes_primero=False):
+        """Devuelve los eventos que cumplen todos los filtros, en orden.
+
+        'desde' y 'hasta' son instantes ISO, inclusivos.
+        """
+
+        self.actualizar()
+
+        inicio, fin = 0, len(self.offsets)
+        if self.ordenado:
+            if desde is not None:
+                inicio = bisect_left(self.tiempos, desde)
+            if hasta is not None:
+                fin = bisect_right(self.tiempos, hasta)
+
+        # La lista más corta entre los filtros dados acota los candidatos;
+        # los demás se verifican evento por evento
+        listas = []
+        if entidad_id is not None:
+            listas.append(self.por_id.get(entidad_id, []))
+        if entidad is not None:
+            listas.append(self.por_entidad.get(entidad, []))
+        if accion is not None:
+            listas.append(self.por_accion.get(accion, []))
+
+        if listas:
+            base = min(listas, key=len)
+            candidatos = base[bisect_left(base, inicio):bisect_left(base, fin)]
+        else:
+            candidatos = range(inicio, fin)
+
+        def cumple(numero):
+            if entidad is not None and self.entidad_de[numero] != entidad:
+                return False
+            if accion is not None and self.accion_de[numero] != accion:
+                return False
+            if not self.ordenado:
+                instante = self.tiempos[numero]
+                if (desde is not None and instante < desde) or (hasta is not None and instante > hasta):
+                    return False
+            return True
+
+        return self._leer(
+            [n for n in candidatos if cumple(n)] if (listas or not self.ordenado) else candidatos,
+            entidad_id,
+            limite,
+            recientes_primero,
+        )
+
+    def _leer(self, candidatos, entidad_id, limite, recientes_primero):
+        if limite is not None and limite <= 0:
+            return
+
+        devueltos = 0
+
+        # Los candidatos se leen archivo por archivo
+        tramos = []
+        for indice, archivo in enumerate(self.archivos):
+            primero = self.primeros[indice]
+            siguiente = self.primeros[indice + 1] if indice + 1 < len(self.primeros) else len(self.offsets)
+            tramo = candidatos[bisect_left(candidatos, primero):bisect_left(candidatos, siguiente)]
+            if len(tramo):
+                tramos.append((archivo, tramo))
+
+        if recientes_primero:
+            tramos.reverse()
+
+        for archivo, tramo in tramos:
+            for evento in self._leer_tramo(archivo, tramo, recientes_primero):
+                # Las listas de ids de los lotes no tienen arreglo propio
+                if entidad_id is not None and entidad_id not in _ids_evento(evento):
+                    continue
+
+                yield evento
+                devueltos += 1
+                if devueltos == limite:
+                    return
+
+    def _leer_tramo(self, archivo, numeros, recientes_primero):
+        if archivo == _ACTIVO:
+            f = open(self.ruta_log, "rb")
+            comprimido = False
+        else:
+            segmento = self.segmentos[archivo]
+            try:
+                f = abrir_segmento(segmento)
+            except FileNotFoundError:
+                # Otro proceso lo comprimió después de listarlo
+                segmento = {s.nombre: s for s in listar_segmentos(self.carpeta_segmentos)}[archivo]
+                f = abrir_segmento(segmento)
+            comprimido = segmento.comprimido
+
+        with f:
+            # En un gzip retroceder obliga a descomprimir desde el principio:
+            # se lee hacia adelante y se invierte lo leído
+            if recientes_primero and comprimido:
+                eventos = []
+                for numero in numeros:
+                    f.seek(self.offsets[numero])
+                    eventos.append(json.loads(f.readline()))
+                yield from reversed(eventos)
+                return
+
+            for numero in (reversed(numeros) if recientes_primero else numeros):
+                f.seek(self.offsets[numero])
+                yield json.loads(f.readline())
+
+    def _cargar(self):
+        try:
+            with open(self.ruta_indice, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if datos.get("formato") != _FORMATO:
+            return
+
+        self.archivos = datos["archivos"]
+        self.primeros = datos["primeros"]
+        self.fin = datos["fin"]
+        self.control = datos["control"]
+        self.ordenado = datos["ordenado"]
+        self.tiempos = datos["tiempos"]
+        self.offsets = datos["offsets"]
+        self.entidad_de = datos["entidades"]
+        self.accion_de = datos["acciones"]
+        self.por_id = datos["ids"]
+
+        for numero, (entidad, accion) in enumerate(zip(self.entidad_de, self.accion_de)):
+            self.por_entidad.setdefault(entidad, []).append(numero)
+            self.por_accion.setdefault(accion, []).append(numero)
+
+    def guardar(self):
+        """Guarda el índice para que otro proceso lo retome (es solo una caché)."""
+
+        import tempfile
+
+        datos = {
+            "formato": _FORMATO,
+            "archivos": self.archivos,
+            "primeros": self.primeros,
+            "fin": self.fin,
+            "control": self.control,
+            "ordenado": self.ordenado,
+            "tiempos": self.tiempos,
+            "offsets": self.offsets,
+            "entidades": self.entidad_de,
+            "acciones": self.accion_de,
+            "ids": self.por_id,
+        }
+
+        carpeta = os.path.dirname(self.ruta_indice)
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temporal, self.ruta_indice)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+
+        self.sin_guardar = 0
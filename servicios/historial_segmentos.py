@@ -0,0 +1,110 @@
+"""Segmentos rotados del historial.
+
+Cuando el registro activo (historial.jsonl) crece demasiado se mueve a
+la carpeta de segmentos con un nombre fechado que además dice qué
+eventos contiene:
+
+    <instante del primer evento>_<número del primero>_<cantidad>.jsonl
+
+Los segmentos fríos pueden comprimirse con gzip (.jsonl.gz); se leen
+igual, de forma transparente. Los números de evento cuentan desde cero
+a lo largo de todos los segmentos y del registro activo.
+"""
+
+import os
+from collections import namedtuple
+
+
+Segmento = namedtuple("Segmento", "nombre ruta primero cantidad comprimido")
+
+# Nivel de gzip: el 9 por defecto tarda unas cuatro veces más que el 6 y
+# en JSON ahorra apenas un poco más
+NIVEL_COMPRESION = 6
+
+_EXTENSION = ".jsonl"
+_EXTENSION_GZ = ".jsonl.gz"
+
+
+def nombre_segmento(instante, primero, cantidad):
+    """Nombre de un segmento; el instante ISO pierde los separadores."""
+
+    compacto = instante.replace("-", "").replace(":", "") or "00000000T000000"
+    return f"{compacto}_{primero:09d}_{cantidad:09d}"
+
+
+def listar_segmentos(carpeta):
+    """Segmentos de la carpeta ordenados por su primer evento."""
+
+    try:
+        archivos = os.listdir(carpeta)
+    except FileNotFoundError:
+        return []
+
+    segmentos = {}
+    for archivo in archivos:
+        if archivo.endswith(_EXTENSION_GZ):
+            nombre, comprimido = archivo[:-len(_EXTENSION_GZ)], True
+        elif archivo.endswith(_EXTENSION):
+            nombre, comprimido = archivo[:-len(_EXTENSION)], False
+        else:
+            continue
+
+        # Si una compresión se cortó después de escribir el .gz quedan
+        # los dos: el comprimido ya está completo
+        if nombre in segmentos and not comprimido:
+            continue
+
+        _, primero, cantidad = nombre.split("_")
+        segmentos[nombre] = Segmento(
+            nombre, os.path.join(carpeta, archivo), int(primero), int(cantidad), comprimido
+        )
+
+    return sorted(segmentos.values(), key=lambda s: s.primero)
+
+
+def abrir_segmento(segmento):
+    """Abre un segmento en modo binario, comprimido o no."""
+
+    if segmento.comprimido:
+        import gzip
+        return gzip.open(segmento.ruta, "rb")
+    return open(segmento.ruta, "rb")
+
+
+def rotar(ruta_log, carpeta, instante, primero, cantidad):
+    """Mueve el registro activo a la carpeta de segmentos."""
+
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, nombre_segmento(instante, primero, cantidad) + _EXTENSION)
+    os.replace(ruta_log, destino)
+
+
+def comprimir_frios(carpeta, sin_comprimir):
+    """Comprime todos los segmentos salvo los 'sin_comprimir' más recientes.
+
+    Devuelve la cantidad de segmentos comprimidos.
+    """
+
+    import gzip
+    import shutil
+
+    segmentos = listar_segmentos(carpeta)
+    frios = segmentos[:max(0, len(segmentos) - sin_comprimir)]
+    comprimidos = 0
+
+    for segmento in frios:
+        sin_gz = os.path.join(carpeta, segmento.nombre + _EXTENSION)
+
+        if not segmento.comprimido:
+            destino = os.path.join(carpeta, segmento.nombre + _EXTENSION_GZ)
+            temporal = destino + ".tmp"
+            with open(sin_gz, "rb") as origen, gzip.open(temporal, "wb", compresslevel=NIVEL_COMPRESION) as f:
+                shutil.copyfileobj(origen, f)
+            os.replace(temporal, destino)
+            comprimidos += 1
+
+        # También limpia el original de una compresión interrumpida
+        if os.path.exists(sin_gz):
+            os.remove(sin_gz)
+
+    return comprimidos
@@ -1,37 +1,251 @@
-from datetime import datetime
+from datetime import date, datetime
 
 from servicios.almacenamiento import (
+    CAMPO_ID,
+    agregar_evento,
+    al_confirmar,
+    contar_eventos,
+    consultar_eventos,
     cargar_historial,
-    guardar_historial
+    bloqueo_datos,
+    guardar_snapshot,
+    numero_ultimo_snapshot,
+    producto_publico,
+    ultimo_snapshot,
+    ver_inventario,
+    ver_migraciones
 )
+from servicios.metricas import medir
+from servicios.migraciones import CAMPO_VERSION, migrar_producto, migrar_productos
 
 
-def _generar_id_evento(historial):
+# Las modificaciones de una entidad con id guardan en 'antes' y 'despues'
+# solo las claves que cambiaron (una clave que falta en 'despues' se
+# quitó), más la versión de esquema del producto en 'despues'. Esos
+# eventos llevan "diferencia": True.
+DIFERENCIAS_HISTORIAL = True
+
+# Cada cuántos eventos se guarda un snapshot del inventario (None: nunca)
+INTERVALO_SNAPSHOT = 10_000
+
+_FALTA = object()
+
+
+def _generar_id_evento(numero):
     """Genera un ID incremental y estable para el evento."""
 
-    return f"evt_{len(historial) + 1:06d}"
+    return f"evt_{numero:06d}"
 
 
-def registrar_evento(accion, entidad, antes=None, despues=None, meta=None):
-    """Registra un evento en el historial."""
+def _diferencia(antes, despues):
+    """Reduce 'antes' y 'despues' a las claves que cambiaron."""
+
+    reducido = {
+        clave: valor for clave, valor in antes.items()
+        if despues.get(clave, _FALTA) != valor
+    }
+    diferencia = {
+        clave: valor for clave, valor in despues.items()
+        if antes.get(clave, _FALTA) != valor
+    }
 
-    historial = cargar_historial()
+    # Con la versión, la reconstrucción sabe con qué esquema se aplica
+    if CAMPO_VERSION in despues:
+        diferencia[CAMPO_VERSION] = despues[CAMPO_VERSION]
+
+    return reducido, diferencia
+
+
+def _numerar(evento, numero):
+    # El id sale del número con que el evento entra al historial, y el
+    # instante se toma en ese momento para que el registro quede ordenado
+    # por tiempo
     ahora = datetime.now()
+    evento["id"] = _generar_id_evento(numero)
+    evento["timestamp"] = {
+        "humano": ahora.strftime("%d/%m/%Y %H:%M"),
+        "iso": ahora.isoformat(timespec="seconds")
+    }
+
+
+def _snapshot_si_corresponde():
+    with bloqueo_datos():
+        numero = contar_eventos()
+        if numero - numero_ultimo_snapshot() >= INTERVALO_SNAPSHOT:
+            guardar_snapshot(numero, ver_inventario())
+
+
+@medir()
+def registrar_evento(accion, entidad, antes=None, despues=None, meta=None, entidad_id=None):
+    """Registra un evento en el historial.
+
+    'entidad_id' identifica a la entidad afectada (el id estable de un
+    producto, o la lista de ids en las operaciones por lote). Dentro de
+    una transacción el evento se escribe al confirmarla; recién entonces
+    recibe su id y su instante.
+    """
+
+    diferencia = (
+        DIFERENCIAS_HISTORIAL
+        and isinstance(entidad_id, str)
+        and isinstance(antes, dict)
+        and isinstance(despues, dict)
+    )
+    if diferencia:
+        antes, despues = _diferencia(antes, despues)
 
     evento = {
-        "id": _generar_id_evento(historial),
-        "timestamp": {
-            "humano": ahora.strftime("%d/%m/%Y %H:%M"),
-            "iso": ahora.isoformat(timespec="seconds")
-        },
+        "id": None,
+        "timestamp": None,
         "accion": accion,
         "entidad": entidad,
+        "entidad_id": entidad_id,
         "antes": antes,
         "despues": despues,
         "meta": meta or {}
     }
+    if diferencia:
+        evento["diferencia"] = True
 
-    historial.append(evento)
-    guardar_historial(historial)
+    agregar_evento(evento, _numerar)
+
+    # El snapshot se toma con el inventario ya confirmado
+    if INTERVALO_SNAPSHOT is not None:
+        al_confirmar(_snapshot_si_corresponde)
 
     return evento
+
+
+def _instante(valor, fin_del_dia):
+    """Convierte un límite de consulta en instante ISO, o None si no es válido.
+
+    Acepta datetime, date o texto ISO ("YYYY-MM-DD[THH:MM[:SS]]") o
+    DD-MM-YYYY. Una fecha sin hora abarca el día completo.
+    """
+
+    if isinstance(valor, datetime):
+        return valor.isoformat(timespec="seconds")
+
+    if isinstance(valor, str):
+        texto = valor.strip()
+        try:
+            valor = datetime.fromisoformat(texto)
+            if len(texto) > 10:
+                return valor.isoformat(timespec="seconds")
+            valor = valor.date()
+        except ValueError:
+            try:
+                valor = datetime.strptime(texto, "%d-%m-%Y").date()
+            except ValueError:
+                return None
+
+    if isinstance(valor, date):
+        return valor.isoformat() + ("T23:59:59" if fin_del_dia else "T00:00:00")
+
+    return None
+
+
+def _evento_publico(evento):
+    """Copia de un evento con 'antes' y 'despues' sin las claves internas."""
+
+    publico = dict(evento)
+    for clave in ("antes", "despues"):
+        valor = evento[clave]
+        if isinstance(valor, list):
+            publico[clave] = [producto_publico(producto) for producto in valor]
+        elif isinstance(valor, dict):
+            publico[clave] = producto_publico(valor)
+    return publico
+
+
+@medir()
+def consultar_historial(entidad=None, accion=None, desde=None, hasta=None,
+                        entidad_id=None, limite=None, recientes_primero=False):
+    """Devuelve los eventos que cumplen todos los filtros indicados.
+
+    'desde' y 'hasta' son inclusivos (ver _instante). Por ejemplo, lo
+    ocurrido a un producto la última semana:
+
+        consultar_historial(entidad_id=producto["_id"], desde=date.today() - timedelta(days=7))
+    """
+
+    limites = {}
+    for nombre, valor, fin_del_dia in (("desde", desde, False), ("hasta", hasta, True)):
+        if valor is None:
+            continue
+        limites[nombre] = _instante(valor, fin_del_dia)
+        if limites[nombre] is None:
+            return False, f"Fecha inválida en '{nombre}': {valor!r}."
+
+    if limite is not None and (type(limite) is not int or limite < 0):
+        return False, "El límite debe ser un entero no negativo."
+
+    eventos = consultar_eventos(
+        entidad=entidad,
+        accion=accion,
+        entidad_id=entidad_id,
+        limite=limite,
+        recientes_primero=recientes_primero,
+        **limites
+    )
+
+    return True, [_evento_publico(evento) for evento in eventos]
+
+
+def _aplicar_evento(productos, evento, migraciones):
+    """Aplica un evento de producto al estado (id -> producto).
+
+    Es idempotente: aplicarlo sobre un estado que ya lo incluye no cambia
+    nada, así un snapshot puede solaparse con los eventos que siguen.
+    """
+
+    accion = evento["accion"]
+    antes, despues = evento["antes"], evento["despues"]
+
+    if accion in ("Alta", "Restauración"):
+        for producto in despues if isinstance(despues, list) else [despues]:
+            productos[producto[CAMPO_ID]] = dict(producto)
+
+    elif accion == "Modificación":
+        if not evento.get("diferencia"):
+            productos[despues[CAMPO_ID]] = dict(despues)
+            return
+
+        producto = productos.get(evento["entidad_id"])
+        if producto is None:
+            return
+
+        # La diferencia se calculó sobre el producto con las migraciones
+        # de entonces ya aplicadas
+        migrar_producto(producto, migraciones[:despues.get(CAMPO_VERSION, 0)])
+        for clave in antes:
+            if clave not in despues:
+                producto.pop(clave, None)
+        producto.update(despues)
+
+    elif accion == "Eliminación":
+        productos.pop(antes[CAMPO_ID], None)
+
+
+@medir()
+def reconstruir_estado():
+    """Reconstruye el inventario desde el último snapshot y los eventos posteriores.
+
+    Los cambios de esquema (renombrar, convertir u ocultar campos) no se
+    reproducen evento por evento: se aplican al final con el registro de
+    migraciones, igual que al leer el inventario. Devuelve (True, productos)
+    en el orden del inventario.
+    """
+
+    migraciones = ver_migraciones()
+    numero, inventario = ultimo_snapshot()
+    productos = {producto[CAMPO_ID]: producto for producto in inventario}
+
+    for evento in cargar_historial(desde=numero):
+        if evento.get("entidad") == "producto":
+            _aplicar_evento(productos, evento, migraciones)
+
+    productos = list(productos.values())
+    migrar_productos(productos, migraciones)
+
+    return True, productos
@@ -0,0 +1,54 @@
+import csv
+import json
+import os
+
+from servicios.inventario_servicio import agregar_productos_lote
+from servicios.metricas import medir
+
+
+def leer_filas_csv(ruta, delimitador=","):
+    """Recorre un CSV con encabezado devolviendo cada fila como diccionario."""
+
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as archivo:
+        for fila in csv.DictReader(archivo, delimiter=delimitador):
+            yield fila
+
+
+def leer_filas_jsonl(ruta):
+    """Recorre un archivo JSON Lines devolviendo un objeto por línea.
+
+    Las líneas vacías se ignoran; las que no son JSON válido se devuelven
+    como None para que la carga las reporte como error en su número de fila.
+    """
+
+    with open(ruta, "r", encoding="utf-8") as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError:
+                yield None
+
+
+@medir()
+def importar_productos(ruta, campos_duplicado=None, forzar_agregar=False):
+    """Importa productos desde un archivo .csv o .jsonl en una única carga."""
+
+    if not os.path.exists(ruta):
+        return False, "El archivo no existe."
+
+    extension = os.path.splitext(ruta)[1].lower()
+
+    if extension == ".csv":
+        filas = leer_filas_csv(ruta)
+    elif extension in (".jsonl", ".ndjson"):
+        filas = leer_filas_jsonl(ruta)
+    else:
+        return False, "Formato no soportado (use .csv o .jsonl)."
+
+    return agregar_productos_lote(
+        filas,
+        campos_duplicado=campos_duplicado,
+        forzar_agregar=forzar_agregar
+    )
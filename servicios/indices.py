@@ -0,0 +1,183 @@
+from bisect import bisect_left, insort
+
+from servicios.almacenamiento import CAMPO_ID, ver_inventario, version_datos
+from servicios.metricas import tramo
+from utilidades.rutas import RUTA_INVENTARIO
+
+
+# Índices registrados que deben enterarse de los cambios del inventario
+_INDICES = []
+
+# Bajas que acumula el índice de ids antes de renumerar (ver _IndiceIds)
+BAJAS_ANTES_DE_COMPACTAR = 4096
+
+
+class IndiceInventario:
+    """Base de los índices en memoria derivados del inventario.
+
+    Cada índice recuerda la versión del inventario con la que fue
+    construido. Si el inventario cambió por una vía que no lo notificó
+    (otro proceso, un renombre de campo, etc.) se reconstruye completo
+    la próxima vez que se use; si no, se actualiza en forma incremental.
+    """
+
+    def __init__(self):
+        self.version = None
+        _INDICES.append(self)
+
+    def asegurar(self):
+        """Reconstruye el índice si quedó desactualizado."""
+
+        inventario = ver_inventario()
+        version = version_datos(RUTA_INVENTARIO)
+
+        if self.version != version:
+            with tramo(f"indices.{type(self).__name__.lstrip('_')}.reconstruir"):
+                self.reconstruir(inventario)
+            self.version = version
+
+    def reconstruir(self, inventario):
+        raise NotImplementedError
+
+    def alta(self, producto, posicion):
+        pass
+
+    def altas(self, productos, posicion):
+        for desplazamiento, producto in enumerate(productos):
+            self.alta(producto, posicion + desplazamiento)
+
+    def baja(self, producto, posicion):
+        pass
+
+    def modificacion(self, antes, despues, posicion):
+        pass
+
+
+def _notificar(metodo, *args):
+    """Aplica un cambio recién guardado a los índices que estaban al día.
+
+    Cada guardado avanza la versión en uno: solo los índices que estaban
+    en la versión anterior pueden actualizarse sin reconstruirse.
+    """
+
+    version = version_datos(RUTA_INVENTARIO)
+
+    for indice in _INDICES:
+        if indice.version == version - 1:
+            getattr(indice, metodo)(*args)
+            indice.version = version
+
+
+def preparar_indices():
+    """Construye de antemano los índices registrados que estén desactualizados.
+
+    Sirve a los procesos de larga vida (el servidor HTTP) para no pagar
+    la construcción en la primera consulta.
+    """
+
+    for indice in _INDICES:
+        indice.asegurar()
+
+
+def notificar_alta(producto, posicion):
+    _notificar("alta", producto, posicion)
+
+
+def notificar_altas(productos, posicion):
+    """Notifica varios productos agregados con un único guardado."""
+
+    _notificar("altas", productos, posicion)
+
+
+def notificar_baja(producto, posicion):
+    _notificar("baja", producto, posicion)
+
+
+def notificar_modificacion(antes, despues, posicion):
+    _notificar("modificacion", antes, despues, posicion)
+
+
+class _IndiceIds(IndiceInventario):
+    """Id estable de producto -> posición en el inventario.
+
+    Cada producto guarda un número interno que no cambia al borrar otros
+    (las altas siempre van al final, con el número siguiente). Su
+    posición es ese número menos los números borrados antes que él, que
+    se llevan ordenados: una baja es una búsqueda binaria y una inserción
+    en esa lista, sin reescribir la posición de los productos siguientes.
+    Al acumular BAJAS_ANTES_DE_COMPACTAR se renumera todo, un recorrido
+    repartido entre esas bajas.
+    """
+
+    def reconstruir(self, inventario):
+        self.numeros = {
+            producto.get(CAMPO_ID): posicion
+            for posicion, producto in enumerate(inventario)
+        }
+        self.siguiente = len(inventario)
+        self.borrados = []
+
+    def posicion(self, producto_id):
+        numero = self.numeros.get(producto_id)
+        if numero is None:
+            return None
+        return numero - bisect_left(self.borrados, numero)
+
+    def _numero(self, posicion):
+        """Número interno del producto en 'posicion'."""
+
+        # Antes de la posición quedan los borrados b[i] con b[i] - i <= posicion
+        borrados = self.borrados
+        bajo, alto = 0, len(borrados)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if borrados[medio] - medio <= posicion:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return posicion + bajo
+
+    def alta(self, producto, posicion):
+        self.numeros[producto[CAMPO_ID]] = self.siguiente
+        self.siguiente += 1
+
+    def baja(self, producto, posicion):
+        self.numeros.pop(producto.get(CAMPO_ID), None)
+        insort(self.borrados, self._numero(posicion))
+
+        if len(self.borrados) >= BAJAS_ANTES_DE_COMPACTAR:
+            self._compactar()
+
+    def _compactar(self):
+        """Renumera los productos por su posición y olvida los borrados."""
+
+        borrados = self.borrados
+        self.numeros = {
+            producto_id: numero - bisect_left(borrados, numero)
+            for producto_id, numero in self.numeros.items()
+        }
+        self.siguiente -= len(borrados)
+        self.borrados = []
+
+    def modificacion(self, antes, despues, posicion):
+        if antes.get(CAMPO_ID) != despues.get(CAMPO_ID):
+            self.numeros.pop(antes.get(CAMPO_ID), None)
+            self.numeros[despues[CAMPO_ID]] = self._numero(posicion)
+
+
+_INDICE_IDS = _IndiceIds()
+
+
+def posicion_por_id(producto_id):
+    """Devuelve la posición del producto con ese id, o None si no existe."""
+
+    _INDICE_IDS.asegurar()
+    return _INDICE_IDS.posicion(producto_id)
+
+
+def posiciones_por_ids(producto_ids):
+    """Como posicion_por_id para muchos ids, verificando el índice una sola vez."""
+
+    _INDICE_IDS.asegurar()
+    posicion = _INDICE_IDS.posicion
+    return [posicion(producto_id) for producto_id in producto_ids]
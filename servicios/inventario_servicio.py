@@ -1,150 +1,410 @@
-import json
-
-from almacenamiento import RUTA_INVENTARIO
+import heapq
+from itertools import chain, islice
+from operator import itemgetter
+
+# Infraestructura
+from servicios.almacenamiento import (
+    CAMPO_ID,
+    nuevo_id_producto,
+    ver_campos,
+    ver_campos_unicos,
+    ver_inventario,
+    ver_migraciones,
+    copiar_producto,
+    producto_publico,
+    cargar_campos,
+    insertar_productos,
+    reemplazar_producto,
+    borrar_producto,
+    escritura_agrupada,
+    reintentar_si_hay_conflicto,
+)
 
 # Servicios de dominio
-from campo_servicio import cargar_campos
-from campo_unico_servicio import validar_unicidad_producto
-from busquedas_servicio import buscar_similares
-from historial_servicio import registrar_evento
-from papelera_servicio import enviar_a_papelera, restaurar_registro
+from servicios.campo_unico_servicio import (
+    validar_unicidad_producto,
+    indice_campos_unicos,
+)
+from servicios.busquedas_servicio import buscar_similares
+from servicios.duplicados_servicio import buscar_duplicados, clave_bloqueo, indice_bloqueo
+from servicios.historial_servicio import registrar_evento
+from servicios.papelera_servicio import (
+    enviar_a_papelera,
+    obtener_registro,
+    registro_expirado,
+    restaurar_registro,
+    restaurar_registros,
+    advertencias_restauracion,
+)
+from servicios.metricas import medir, tramo
+from servicios.migraciones import migrar_producto
+from servicios.indices import (
+    posicion_por_id,
+    notificar_alta,
+    notificar_altas,
+    notificar_baja,
+    notificar_modificacion,
+)
 
 # Validaciones
-from validadores import validar_dato
-
-
-def cargar_inventario():
-    """Carga el archivo inventario.json y devuelve la lista de productos."""
-
-    try:
-        with open(RUTA_INVENTARIO, "r", encoding="utf-8") as archivo:
-            contenido = archivo.read().strip()
-            return json.loads(contenido) if contenido else []
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+from servicios.validadores import CONVERSORES, CLAVES_ORDEN, compilar_esquema
 
 
-def guardar_inventario(inventario):
-    """Guarda la lista de productos en inventario.json."""
+def _validar_campos_duplicado(campos_duplicado, campos):
+    # Un campo inexistente no coincide nunca: desactivaría la detección sin avisar
+    for campo in campos_duplicado or ():
+        if campo not in campos:
+            return f"El campo '{campo}' no existe."
+    return None
 
-    with open(RUTA_INVENTARIO, "w", encoding="utf-8") as archivo:
-        json.dump(inventario, archivo, indent=4, ensure_ascii=False)
 
+@medir()
+@reintentar_si_hay_conflicto
+def agregar_producto(datos, criterios=None, forzar_agregar=False, campos_duplicado=None):
+    """Agrega un producto validando tipos, duplicados y unicidad.
 
-def agregar_producto(datos, criterios=None, forzar_agregar=False):
-    """Agrega un producto validando tipos, duplicados y unicidad."""
+    Sin 'criterios' son duplicados los productos con los mismos campos
+    (normalizados) y, si se indican 'campos_duplicado', los que coinciden
+    en todos esos campos; ambos se resuelven con el índice de huellas.
+    Con 'criterios' se buscan los productos que los contienen parcialmente.
+    """
 
     if not isinstance(datos, dict):
         return False, "Los datos deben ser un diccionario."
 
-    campos = cargar_campos()
-    inventario = cargar_inventario()
+    campos = ver_campos()
 
-    tipo_map = {
-        "texto": str,
-        "num entero": int,
-        "num decimal": float,
-        "v/f": bool,
-        "fecha": "fecha"
-    }
+    error = _validar_campos_duplicado(campos_duplicado, campos)
+    if error:
+        return False, error
 
     nuevo = {}
 
-    for campo, tipo_logico in campos.items():
-        if campo not in datos:
-            return False, f"Falta el campo obligatorio '{campo}'."
+    with tramo("inventario_servicio.validar_tipos"):
+        for campo, conversor in compilar_esquema(campos):
+            if campo not in datos:
+                return False, f"Falta el campo obligatorio '{campo}'."
 
-        valor = validar_dato(datos[campo], tipo_map[tipo_logico])
-        if valor is None:
-            return False, f"Valor inválido para el campo '{campo}'."
+            valor = conversor(datos[campo])
+            if valor is None:
+                return False, f"Valor inválido para el campo '{campo}'."
 
-        nuevo[campo] = valor
+            nuevo[campo] = valor
 
-    conflictos = validar_unicidad_producto(nuevo, inventario)
+    conflictos = validar_unicidad_producto(nuevo)
     if conflictos:
         return False, {
             "motivo": "conflicto_unicidad",
             "conflictos": conflictos
         }
 
-    if criterios is None:
-        criterios = nuevo.copy()
+    if not forzar_agregar:
+        if criterios is None:
+            duplicados = buscar_duplicados(nuevo, campos_duplicado)
+        else:
+            duplicados = buscar_similares(criterios)
 
-    duplicados = buscar_similares(criterios)
-    if duplicados and not forzar_agregar:
-        return False, {
-            "motivo": "posible_duplicado",
-            "coincidencias": duplicados
-        }
+        if duplicados:
+            return False, {
+                "motivo": "posible_duplicado",
+                "coincidencias": duplicados
+            }
+
+    # El id se agrega recién ahora: no es un campo a validar ni a comparar
+    nuevo = {CAMPO_ID: nuevo_id_producto(), **nuevo}
 
-    inventario.append(nuevo)
-    guardar_inventario(inventario)
+    posicion = insertar_productos([nuevo])
+    notificar_alta(nuevo, posicion)
 
     registrar_evento(
         accion="Alta",
         entidad="producto",
         antes=None,
-        despues=nuevo.copy()
+        despues=nuevo.copy(),
+        entidad_id=nuevo[CAMPO_ID]
     )
 
-    return True, nuevo.copy()
+    return True, producto_publico(nuevo)
+
+
+@medir()
+def agregar_productos_lote(filas, campos_duplicado=None, forzar_agregar=False):
+    """Agrega muchos productos con una sola lectura, validación y escritura.
+
+    Cada fila se valida contra los campos, la unicidad (contra el
+    inventario y contra las filas anteriores del mismo lote) y los
+    duplicados. Las duplicadas se detectan por igualdad normalizada de
+    'campos_duplicado' (todos los campos si no se indica), con el índice
+    de bloqueo de esa combinación de campos.
+
+    Devuelve un resumen con la cantidad agregada y los errores por fila
+    (numeradas desde 1). Las filas con errores no se agregan; el resto sí.
+    """
+
+    # 'filas' puede ser un generador (la importación lee el archivo de a
+    # una fila): si hay conflicto, el reintento necesita volver a recorrerlas
+    return _agregar_productos_lote(list(filas), campos_duplicado, forzar_agregar)
+
+
+@reintentar_si_hay_conflicto
+def _agregar_productos_lote(filas, campos_duplicado, forzar_agregar):
+    campos = ver_campos()
+
+    error = _validar_campos_duplicado(campos_duplicado, campos)
+    if error:
+        return False, error
+
+    campos_unicos = [c for c in ver_campos_unicos() if c in campos]
+    indice_unicos = indice_campos_unicos()
+    esquema = compilar_esquema(campos)
+
+    campos_clave = tuple(campos_duplicado or campos)
+    claves_existentes = {} if forzar_agregar else indice_bloqueo(campos_clave)
+    claves_lote = set()
+
+    valores_lote = {campo: {} for campo in campos_unicos}
+    nuevos = []
+    errores = []
+    total = 0
+
+    for numero, datos in enumerate(filas, start=1):
+        total = numero
+
+        if not isinstance(datos, dict):
+            errores.append({"fila": numero, "error": "Los datos deben ser un diccionario."})
+            continue
+
+        nuevo = {}
+        error = None
+
+        for campo, conversor in esquema:
+            if campo not in datos:
+                error = f"Falta el campo obligatorio '{campo}'."
+                break
+
+            valor = conversor(datos[campo])
+            if valor is None:
+                error = f"Valor inválido para el campo '{campo}'."
+                break
+
+            nuevo[campo] = valor
+
+        if error:
+            errores.append({"fila": numero, "error": error})
+            continue
+
+        conflictos = []
+        for campo in campos_unicos:
+            producto_id = indice_unicos[campo].get(nuevo[campo])
+            if producto_id is not None:
+                conflictos.append({
+                    "campo": campo,
+                    "valor": nuevo[campo],
+                    "tipo": "unicidad",
+                    "producto": producto_id
+                })
+                continue
+
+            fila_previa = valores_lote[campo].get(nuevo[campo])
+            if fila_previa is not None:
+                conflictos.append({
+                    "campo": campo,
+                    "valor": nuevo[campo],
+                    "tipo": "unicidad",
+                    "fila": fila_previa
+                })
+
+        if conflictos:
+            errores.append({
+                "fila": numero,
+                "error": {
+                    "motivo": "conflicto_unicidad",
+                    "conflictos": conflictos
+                }
+            })
+            continue
+
+        if not forzar_agregar:
+            clave = clave_bloqueo(nuevo, campos_clave)
+            if clave is not None and (clave in claves_existentes or clave in claves_lote):
+                errores.append({
+                    "fila": numero,
+                    "error": {"motivo": "posible_duplicado"}
+                })
+                continue
+            if clave is not None:
+                claves_lote.add(clave)
+
+        for campo in campos_unicos:
+            valores_lote[campo][nuevo[campo]] = numero
+
+        nuevos.append({CAMPO_ID: nuevo_id_producto(), **nuevo})
+
+    if nuevos:
+        posicion = insertar_productos(nuevos)
+        notificar_altas(nuevos, posicion)
+
+        registrar_evento(
+            accion="Alta",
+            entidad="producto",
+            antes=None,
+            despues=[nuevo.copy() for nuevo in nuevos],
+            entidad_id=[nuevo[CAMPO_ID] for nuevo in nuevos],
+            meta={
+                "lote": True,
+                "filas": total,
+                "agregados": len(nuevos),
+                "rechazados": len(errores)
+            }
+        )
 
+    return True, {
+        "filas": total,
+        "agregados": len(nuevos),
+        "errores": errores
+    }
 
-def eliminar_producto(criterios, producto_elegido=None):
-    """Envía un producto a la papelera y lo elimina del inventario."""
 
-    inventario = cargar_inventario()
-    coincidencias = buscar_similares(criterios)
+@medir()
+@reintentar_si_hay_conflicto
+def modificar_producto(criterios, nuevos_valores, producto_elegido=None):
+    """Modifica los valores de un producto validando tipos y unicidad."""
+
+    if not isinstance(nuevos_valores, dict) or not nuevos_valores:
+        return False, "No se indicaron valores a modificar."
 
-    if not coincidencias:
-        return False, "No se encontraron productos."
+    campos = ver_campos()
+    inventario = ver_inventario()
 
+    # Con el producto ya elegido (p. ej. por su id) no hace falta buscarlo
     if producto_elegido is None:
+        coincidencias = buscar_similares(criterios, inventario)
+
+        if not coincidencias:
+            return False, "No se encontraron productos."
         if len(coincidencias) > 1:
             return None, coincidencias.copy()
         producto = coincidencias[0]
     else:
         producto = producto_elegido
 
-    snapshot = producto.copy()
-    schema_snapshot = cargar_campos()
+    cambios = {}
 
-    enviar_a_papelera(
+    for campo, dato in nuevos_valores.items():
+        if campo not in campos:
+            return False, f"El campo '{campo}' no existe."
+
+        valor = CONVERSORES[campos[campo]](dato)
+        if valor is None:
+            return False, f"Valor inválido para el campo '{campo}'."
+
+        cambios[campo] = valor
+
+    posicion = posicion_por_id(producto.get(CAMPO_ID))
+    if posicion is None:
+        return False, "El producto ya no existe en el inventario."
+
+    antes = inventario[posicion]
+    despues = {**antes, **cambios}
+
+    conflictos = validar_unicidad_producto(cambios, posicion_propia=posicion)
+    if conflictos:
+        return False, {
+            "motivo": "conflicto_unicidad",
+            "conflictos": conflictos
+        }
+
+    reemplazar_producto(posicion, despues)
+    notificar_modificacion(antes, despues, posicion)
+
+    registrar_evento(
+        accion="Modificación",
         entidad="producto",
-        snapshot=snapshot,
-        schema_snapshot=schema_snapshot,
-        motivo="eliminacion_producto"
+        antes=antes.copy(),
+        despues=despues.copy(),
+        entidad_id=despues[CAMPO_ID]
     )
 
-    inventario.remove(producto)
-    guardar_inventario(inventario)
+    return True, producto_publico(despues)
+
+
+@medir()
+@reintentar_si_hay_conflicto
+def eliminar_producto(criterios, producto_elegido=None):
+    """Envía un producto a la papelera y lo elimina del inventario."""
+
+    inventario = ver_inventario()
+
+    if producto_elegido is None:
+        coincidencias = buscar_similares(criterios, inventario)
+
+        if not coincidencias:
+            return False, "No se encontraron productos."
+        if len(coincidencias) > 1:
+            return None, coincidencias.copy()
+        producto = coincidencias[0]
+    else:
+        producto = producto_elegido
+
+    posicion = posicion_por_id(producto.get(CAMPO_ID))
+    if posicion is None:
+        return False, "El producto ya no existe en el inventario."
+
+    snapshot = inventario[posicion].copy()
+    schema_snapshot = cargar_campos()
+
+    with escritura_agrupada():
+        enviar_a_papelera(
+            entidad="producto",
+            snapshot=snapshot,
+            schema_snapshot=schema_snapshot,
+            motivo="eliminacion_producto"
+        )
+
+        borrar_producto(posicion)
+        notificar_baja(snapshot, posicion)
 
     registrar_evento(
         accion="Eliminación",
         entidad="producto",
         antes=snapshot,
-        despues=None
+        despues=None,
+        entidad_id=snapshot[CAMPO_ID]
     )
 
-    return True, snapshot
+    return True, producto_publico(snapshot)
 
 
-def restaurar_producto(registro_id):
-    """Restaura un producto desde la papelera."""
+def _preparar_restauracion(registro, campos_actuales, migraciones):
+    """Valida un registro de producto de la papelera sin quitarlo de ella.
 
-    inventario = cargar_inventario()
-    campos_actuales = cargar_campos()
+    Devuelve (True, (producto, advertencias)) o (False, error).
+    """
 
-    ok, resultado = restaurar_registro(registro_id)
-    if not ok:
-        return False, resultado
+    if registro is None:
+        return False, "Registro no encontrado en la papelera."
+    if registro["entidad"] != "producto":
+        return False, "Solo se pueden restaurar productos."
+    if registro_expirado(registro):
+        return False, "El registro ha expirado y no puede restaurarse."
 
-    producto = resultado["snapshot"]
-    advertencias = resultado.get("advertencias", [])
+    # Copia: el registro sigue en la papelera hasta confirmar la restauración
+    producto = copiar_producto(registro["snapshot"])
+    advertencias = advertencias_restauracion(registro)
+
+    # El producto vuelve con los cambios de esquema posteriores a su baja
+    no_convertidos = []
+    migrar_producto(producto, migraciones, no_convertidos)
+
+    if no_convertidos:
+        advertencias.append({
+            "tipo": "valores_no_convertidos",
+            "campos": no_convertidos
+        })
 
     campos_inexistentes = [
         campo for campo in producto
-        if campo not in campos_actuales
+        if not campo.startswith("_") and campo not in campos_actuales
     ]
 
     if campos_inexistentes:
@@ -153,26 +413,242 @@ def restaurar_producto(registro_id):
             "campos": campos_inexistentes
         })
 
-    conflictos = validar_unicidad_producto(producto, inventario)
+    conflictos = validar_unicidad_producto(producto)
     if conflictos:
         return False, {
             "motivo": "conflicto_restauracion",
             "conflictos": conflictos,
-            "snapshot": producto,
+            "snapshot": producto_publico(producto),
             "advertencias": advertencias
         }
 
-    inventario.append(producto)
-    guardar_inventario(inventario)
+    # Registros anteriores a los ids estables, o id ya ocupado
+    if CAMPO_ID not in producto or posicion_por_id(producto[CAMPO_ID]) is not None:
+        producto[CAMPO_ID] = nuevo_id_producto()
+
+    return True, (producto, advertencias)
+
+
+@medir()
+@reintentar_si_hay_conflicto
+def restaurar_producto(registro_id):
+    """Restaura un producto desde la papelera.
+
+    Si no puede restaurarse (conflicto de unicidad, registro vencido) el
+    registro queda en la papelera.
+    """
+
+    ok, resultado = _preparar_restauracion(
+        obtener_registro(registro_id), ver_campos(), ver_migraciones()
+    )
+    if not ok:
+        return False, resultado
+
+    producto, advertencias = resultado
+
+    with escritura_agrupada():
+        restaurar_registro(registro_id)
+
+        posicion = insertar_productos([producto])
+        notificar_alta(producto, posicion)
 
     registrar_evento(
         accion="Restauración",
         entidad="producto",
         antes=None,
-        despues=producto.copy()
+        despues=producto.copy(),
+        entidad_id=producto[CAMPO_ID]
     )
 
     return True, {
-        "producto": producto.copy(),
+        "producto": producto_publico(producto),
         "advertencias": advertencias
     }
+
+
+@medir()
+@reintentar_si_hay_conflicto
+def restaurar_productos(registro_ids):
+    """Restaura varios productos de la papelera con una sola escritura.
+
+    Cada registro se valida como en restaurar_producto y además contra
+    los anteriores del mismo pedido (campos únicos). Los que fallan
+    quedan en la papelera y se informan en "errores"; el resto se
+    restaura y se registra como un único evento.
+    """
+
+    campos_actuales = ver_campos()
+    migraciones = ver_migraciones()
+    campos_unicos = ver_campos_unicos()
+
+    productos = []
+    advertencias = {}
+    valores_lote = {campo: {} for campo in campos_unicos}
+    ids_lote = set()
+    errores = []
+
+    for registro_id in dict.fromkeys(registro_ids):
+        ok, resultado = _preparar_restauracion(
+            obtener_registro(registro_id), campos_actuales, migraciones
+        )
+        if not ok:
+            errores.append({"id": registro_id, "error": resultado})
+            continue
+
+        producto, advertencias[registro_id] = resultado
+
+        conflictos = [
+            {
+                "campo": campo,
+                "valor": producto[campo],
+                "tipo": "unicidad",
+                "registro": valores_lote[campo][producto[campo]]
+            }
+            for campo in campos_unicos
+            if producto.get(campo) is not None and producto[campo] in valores_lote[campo]
+        ]
+        if conflictos:
+            errores.append({
+                "id": registro_id,
+                "error": {"motivo": "conflicto_restauracion", "conflictos": conflictos}
+            })
+            continue
+
+        for campo in campos_unicos:
+            if producto.get(campo) is not None:
+                valores_lote[campo][producto[campo]] = registro_id
+
+        # Dos bajas del mismo producto no pueden volver con el mismo id
+        if producto[CAMPO_ID] in ids_lote:
+            producto[CAMPO_ID] = nuevo_id_producto()
+        ids_lote.add(producto[CAMPO_ID])
+
+        productos.append((registro_id, producto))
+
+    if productos:
+        nuevos = [producto for _, producto in productos]
+
+        with escritura_agrupada():
+            restaurar_registros([registro_id for registro_id, _ in productos])
+
+            posicion = insertar_productos(nuevos)
+            notificar_altas(nuevos, posicion)
+
+        registrar_evento(
+            accion="Restauración",
+            entidad="producto",
+            antes=None,
+            despues=[nuevo.copy() for nuevo in nuevos],
+            entidad_id=[nuevo[CAMPO_ID] for nuevo in nuevos],
+            meta={
+                "lote": True,
+                "registros": len(productos) + len(errores),
+                "restaurados": len(productos),
+                "rechazados": len(errores)
+            }
+        )
+
+    return True, {
+        "restaurados": [
+            {"id": registro_id, "producto": producto_publico(producto), "advertencias": advertencias[registro_id]}
+            for registro_id, producto in productos
+        ],
+        "errores": errores
+    }
+
+
+# Listados
+def _proyectar(productos, campos):
+    """Genera cada producto reducido a su id y a los campos pedidos."""
+
+    for producto in productos:
+        fila = {CAMPO_ID: producto.get(CAMPO_ID)}
+        for campo in campos:
+            fila[campo] = producto.get(campo)
+        yield fila
+
+
+def _validar_proyeccion(campos):
+    existentes = ver_campos()
+
+    if campos is None:
+        return list(existentes), None
+
+    for campo in campos:
+        if campo not in existentes:
+            return None, f"El campo '{campo}' no existe."
+
+    return list(campos), None
+
+
+@medir()
+def mostrar_inventario(campos=None, desde=0, limite=None, despues_de=None):
+    """Lista el inventario en forma perezosa, por páginas.
+
+    Devuelve un generador de filas con el id y los 'campos' pedidos
+    (todos si no se indican), sin materializar la lista completa. La
+    página empieza en la posición 'desde' o, si se indica el cursor
+    'despues_de' (el id de la última fila recibida), a continuación de
+    ese producto; 'limite' acota la cantidad de filas.
+    """
+
+    inventario = ver_inventario()
+    if not inventario:
+        return False, "El inventario está vacío."
+
+    campos, error = _validar_proyeccion(campos)
+    if error:
+        return False, error
+
+    if despues_de is not None:
+        posicion = posicion_por_id(despues_de)
+        if posicion is None:
+            return False, "El producto del cursor ya no existe."
+        desde = posicion + 1
+
+    fin = None if limite is None else desde + limite
+    return True, _proyectar(islice(inventario, desde, fin), campos)
+
+
+@medir()
+def ordenar_inventario(campo, descendente=False, campos=None, desde=0, limite=None):
+    """Lista el inventario ordenado por 'campo', en forma perezosa.
+
+    Con 'limite' solo se seleccionan las primeras desde + limite filas
+    con un heap (O(n log k)) en lugar de ordenar todo el inventario. Los
+    productos sin valor en el campo van al final. Las fechas se comparan
+    cronológicamente y los textos sin distinguir mayúsculas.
+    """
+
+    inventario = ver_inventario()
+    if not inventario:
+        return False, "El inventario está vacío."
+
+    tipos = ver_campos()
+    if campo not in tipos:
+        return False, f"El campo '{campo}' no existe."
+
+    campos, error = _validar_proyeccion(campos)
+    if error:
+        return False, error
+
+    clave_valor = CLAVES_ORDEN.get(tipos[campo])
+    if clave_valor is None:
+        clave = itemgetter(campo)
+    else:
+        def clave(producto):
+            return clave_valor(producto[campo])
+
+    presentes = (p for p in inventario if p.get(campo) is not None)
+    ausentes = (p for p in inventario if p.get(campo) is None)
+
+    if limite is None:
+        ordenados = sorted(presentes, key=clave, reverse=descendente)
+        fin = None
+    else:
+        fin = desde + limite
+        seleccionar = heapq.nlargest if descendente else heapq.nsmallest
+        ordenados = seleccionar(fin, presentes, key=clave)
+
+    filas = islice(chain(ordenados, ausentes), desde, fin)
+    return True, _proyectar(filas, campos)
@@ -0,0 +1,248 @@
+"""Métricas de tiempos y de E/S de los servicios y el almacenamiento.
+
+Desactivadas por defecto (INVENTARIO_METRICAS=1 las activa al iniciar, o
+asignar ACTIVAS = True en cualquier momento). Registran, por operación,
+la cantidad de llamadas, las que terminaron con una excepción y un
+histograma de latencias; y por archivo de datos, las lecturas y
+escrituras con sus bytes.
+
+Las operaciones se miden con el decorador medir() o, para un tramo de
+código, con el contexto tramo(). Desactivadas, el decorador solo agrega
+una llamada y una comparación, y tramo() devuelve un contexto vacío.
+
+stats() devuelve todo como un dict; volcar() lo escribe en un archivo
+JSON y volcar_periodicamente() lo hace cada tantos segundos desde un
+hilo aparte.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from datetime import datetime
+
+from utilidades.rutas import RUTA_METRICAS
+
+
+ACTIVAS = os.environ.get("INVENTARIO_METRICAS") == "1"
+
+# Límites superiores (ms) de las cubetas del histograma; la última
+# cubeta junta todo lo que supera al mayor
+LIMITES_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_NULO = nullcontext()
+
+# El volcado periódico lee desde su propio hilo mientras los servicios
+# siguen registrando
+_CERROJO = threading.Lock()
+
+# nombre -> [llamadas, errores, total en s, máximo en s, cubetas]
+_OPERACIONES = {}
+
+# nombre del archivo -> [lecturas, bytes leídos, escrituras, bytes escritos]
+_ARCHIVOS = {}
+
+_ESTADO = {"desde": datetime.now().isoformat(timespec="seconds")}
+
+
+def _registrar(nombre, segundos, error):
+    cubeta = bisect_left(LIMITES_MS, segundos * 1000)
+
+    with _CERROJO:
+        datos = _OPERACIONES.get(nombre)
+        if datos is None:
+            datos = _OPERACIONES[nombre] = [0, 0, 0.0, 0.0, [0] * (len(LIMITES_MS) + 1)]
+
+        datos[0] += 1
+        datos[1] += error
+        datos[2] += segundos
+        if segundos > datos[3]:
+            datos[3] = segundos
+        datos[4][cubeta] += 1
+
+
+def medir(nombre=None):
+    """Decorador que mide cada llamada como la operación 'nombre'.
+
+    Sin nombre se usa "<módulo>.<función>".
+    """
+
+    def decorador(funcion):
+        etiqueta = nombre or f"{funcion.__module__.rsplit('.', 1)[-1]}.{funcion.__name__}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not ACTIVAS:
+                return funcion(*args, **kwargs)
+
+            inicio = time.perf_counter()
+            error = True
+            try:
+                resultado = funcion(*args, **kwargs)
+                error = False
+                return resultado
+            finally:
+                _registrar(etiqueta, time.perf_counter() - inicio, error)
+
+        return envoltura
+
+    return decorador
+
+
+class _Tramo:
+    __slots__ = ("nombre", "inicio")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        _registrar(self.nombre, time.perf_counter() - self.inicio, tipo is not None)
+
+
+def tramo(nombre):
+    """Contexto que mide el bloque como la operación 'nombre'."""
+
+    if not ACTIVAS:
+        return _NULO
+    return _Tramo(nombre)
+
+
+def _contar(ruta, indice, cantidad_bytes):
+    nombre = os.path.basename(ruta)
+
+    with _CERROJO:
+        datos = _ARCHIVOS.get(nombre)
+        if datos is None:
+            datos = _ARCHIVOS[nombre] = [0, 0, 0, 0]
+
+        datos[indice] += 1
+        datos[indice + 1] += cantidad_bytes
+
+
+def contar_lectura(ruta, cantidad_bytes):
+    """Anota una lectura de 'cantidad_bytes' del archivo 'ruta'."""
+
+    if ACTIVAS:
+        _contar(ruta, 0, cantidad_bytes)
+
+
+def contar_escritura(ruta, cantidad_bytes):
+    """Anota una escritura de 'cantidad_bytes' en el archivo 'ruta'."""
+
+    if ACTIVAS:
+        _contar(ruta, 2, cantidad_bytes)
+
+
+def _percentil(cubetas, llamadas, fraccion):
+    """Límite superior de la cubeta donde cae el percentil (None si es la última)."""
+
+    objetivo = llamadas * fraccion
+    acumuladas = 0
+    for indice, cantidad in enumerate(cubetas):
+        acumuladas += cantidad
+        if acumuladas >= objetivo:
+            return LIMITES_MS[indice] if indice < len(LIMITES_MS) else None
+    return None
+
+
+def stats():
+    """Devuelve las métricas acumuladas desde el inicio o el último reinicio."""
+
+    etiquetas = [f"<={limite}ms" for limite in LIMITES_MS] + [f">{LIMITES_MS[-1]}ms"]
+
+    with _CERROJO:
+        operaciones = {}
+        for nombre, (llamadas, errores, total, maximo, cubetas) in sorted(_OPERACIONES.items()):
+            operaciones[nombre] = {
+                "llamadas": llamadas,
+                "errores": errores,
+                "total_ms": round(total * 1000, 3),
+                "media_ms": round(total * 1000 / llamadas, 3),
+                "max_ms": round(maximo * 1000, 3),
+                "p50_ms": _percentil(cubetas, llamadas, 0.5),
+                "p95_ms": _percentil(cubetas, llamadas, 0.95),
+                "histograma": {
+                    etiqueta: cantidad
+                    for etiqueta, cantidad in zip(etiquetas, cubetas)
+                    if cantidad
+                },
+            }
+
+        archivos = {
+            nombre: {
+                "lecturas": lecturas,
+                "bytes_leidos": leidos,
+                "escrituras": escrituras,
+                "bytes_escritos": escritos,
+            }
+            for nombre, (lecturas, leidos, escrituras, escritos) in sorted(_ARCHIVOS.items())
+        }
+
+    return {
+        "activas": ACTIVAS,
+        "desde": _ESTADO["desde"],
+        "operaciones": operaciones,
+        "archivos": archivos,
+        "bytes_leidos": sum(a["bytes_leidos"] for a in archivos.values()),
+        "bytes_escritos": sum(a["bytes_escritos"] for a in archivos.values()),
+    }
+
+
+def reiniciar():
+    """Descarta lo acumulado."""
+
+    with _CERROJO:
+        _OPERACIONES.clear()
+        _ARCHIVOS.clear()
+        _ESTADO["desde"] = datetime.now().isoformat(timespec="seconds")
+
+
+def volcar(ruta=RUTA_METRICAS):
+    """Escribe stats() en 'ruta' (JSON), reemplazando lo anterior."""
+
+    import tempfile
+
+    carpeta = os.path.dirname(ruta)
+    os.makedirs(carpeta, exist_ok=True)
+
+    datos = stats()
+    datos["volcado"] = datetime.now().isoformat(timespec="seconds")
+
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=4, ensure_ascii=False)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def volcar_periodicamente(intervalo, ruta=RUTA_METRICAS):
+    """Vuelca las métricas cada 'intervalo' segundos desde un hilo demonio.
+
+    Devuelve una función que detiene el volcado (y hace uno último).
+    """
+
+    detener = threading.Event()
+
+    def ciclo():
+        while not detener.wait(intervalo):
+            volcar(ruta)
+
+    hilo = threading.Thread(target=ciclo, name="volcado-metricas", daemon=True)
+    hilo.start()
+
+    def parar():
+        detener.set()
+        hilo.join()
+        volcar(ruta)
+
+    return parar
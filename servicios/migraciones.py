@@ -0,0 +1,117 @@
+"""Migraciones de esquema del inventario.
+
+Renombrar, convertir o eliminar un campo no reescribe el inventario: el
+cambio se anota en un registro de migraciones y cada producto guarda en
+"_v" cuántas tiene aplicadas. Las pendientes se aplican al leer el
+inventario y quedan en disco con el próximo guardado o al compactarlo
+(almacenamiento.compactar_inventario).
+"""
+
+from servicios.validadores import CONVERSORES
+
+
+# Cantidad de migraciones aplicadas a un producto (sin la clave: ninguna)
+CAMPO_VERSION = "_v"
+
+
+def _renombrar(producto, migracion):
+    campo = migracion["campo"]
+    if campo in producto:
+        producto[migracion["nuevo"]] = producto.pop(campo)
+
+
+def _convertir(producto, migracion):
+    """Convierte el valor al nuevo tipo; devuelve el campo si no se pudo."""
+
+    campo = migracion["campo"]
+    if campo not in producto:
+        return None
+
+    valor = CONVERSORES[migracion["tipo"]](producto[campo])
+    if valor is None and producto[campo] is not None:
+        # Solo pasa con productos que no estaban en el inventario al
+        # convertir (p. ej. en la papelera): el valor se oculta, no se pierde
+        _ocultar(producto, migracion)
+        return campo
+
+    producto[campo] = valor
+    return None
+
+
+def _ocultar(producto, migracion):
+    campo = migracion["campo"]
+    if campo in producto:
+        # Se reasigna entero: en una tabla en columnas es una copia
+        ocultos = dict(producto.get("_campos_ocultos", {}))
+        ocultos[campo] = producto.pop(campo)
+        producto["_campos_ocultos"] = ocultos
+
+
+_ACCIONES = {
+    "renombrar": _renombrar,
+    "convertir": _convertir,
+    "ocultar": _ocultar,
+}
+
+
+def migrar_producto(producto, migraciones, no_convertidos=None):
+    """Aplica al producto (en el lugar) las migraciones que le faltan.
+
+    Devuelve True si tenía alguna pendiente. Un valor que no puede
+    convertirse al nuevo tipo de su campo pasa a '_campos_ocultos';
+    si se indica la lista 'no_convertidos', se le agregan esos campos.
+    """
+
+    version = producto.get(CAMPO_VERSION, 0)
+    if version >= len(migraciones):
+        return False
+
+    for migracion in migraciones[version:]:
+        campo = _ACCIONES[migracion["accion"]](producto, migracion)
+        if campo is not None and no_convertidos is not None:
+            no_convertidos.append(campo)
+
+    producto[CAMPO_VERSION] = len(migraciones)
+    return True
+
+
+def migrar_productos(productos, migraciones):
+    """Migra una lista de productos; devuelve cuántos tenían pendientes."""
+
+    if not migraciones:
+        return 0
+
+    # Una tabla en columnas (servicios.tabla_productos) sabe sin
+    # recorrerla si está al día
+    al_dia = getattr(productos, "al_dia", None)
+    if al_dia is not None and al_dia(len(migraciones)):
+        return 0
+
+    return sum(migrar_producto(producto, migraciones) for producto in productos)
+
+
+def aplicar_ultima_migracion(productos, migraciones, valores=None):
+    """Aplica la migración recién agregada a productos que estaban al día.
+
+    'valores' (posición -> valor) trae los valores ya convertidos de una
+    migración "convertir", validados al registrarla, para no volver a
+    convertirlos.
+    """
+
+    version = len(migraciones)
+    migracion = migraciones[-1]
+    aplicar = _ACCIONES[migracion["accion"]]
+
+    # Una tabla en columnas (servicios.tabla_productos) la aplica a la
+    # columna entera cuando puede
+    aplicar_columnas = getattr(productos, "aplicar_migracion", None)
+    if aplicar_columnas is not None and aplicar_columnas(migracion, version, valores):
+        return
+
+    for posicion, producto in enumerate(productos):
+        if valores is not None and posicion in valores:
+            producto[migracion["campo"]] = valores[posicion]
+        else:
+            aplicar(producto, migracion)
+
+        producto[CAMPO_VERSION] = version
@@ -0,0 +1,23 @@
+"""Definiciones comunes a los dos backends de almacenamiento.
+
+No importa ningún otro módulo del proyecto: almacenamiento y
+almacenamiento_sqlite dependen de él y no uno del otro al cargarse.
+"""
+
+
+# Clave del id estable de cada producto. Las claves que empiezan con "_"
+# son internas: no son campos del esquema ni se muestran como tales.
+CAMPO_ID = "_id"
+
+
+class DatosCorruptos(Exception):
+    """Un archivo de datos existe pero su contenido no es JSON válido."""
+
+
+class ConflictoConcurrencia(Exception):
+    """Otro proceso modificó datos que la operación en curso ya había leído."""
+
+
+def nuevo_id_producto():
+    import uuid
+    return str(uuid.uuid4())
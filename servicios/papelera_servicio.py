@@ -1,38 +1,140 @@
-import uuid
+import heapq
 from datetime import datetime, timedelta
 
 from servicios.almacenamiento import (
-    cargar_papelera,
-    guardar_papelera
+    producto_publico,
+    ver_papelera,
+    version_datos,
+    insertar_en_papelera,
+    quitar_de_papelera
 )
+from servicios.metricas import medir
+from utilidades.rutas import RUTA_PAPELERA
 
 
 TTL_DIAS = 30
 
 
+class IndicePapelera:
+    """Registros de la papelera por id y un heap ordenado por vencimiento.
+
+    Como los índices del inventario, recuerda la versión de la papelera
+    con la que se construyó: si cambió por otra vía (otro proceso) se
+    reconstruye al usarse; los cambios hechos desde este módulo se
+    aplican en forma incremental. Los vencimientos se comparan como
+    texto ISO, sin convertir cada registro a datetime.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.por_id = {}
+        self.vencimientos = []
+
+    def asegurar(self):
+        papelera = ver_papelera()
+        version = version_datos(RUTA_PAPELERA)
+
+        if self.version != version:
+            self.por_id = {r["id"]: r for r in papelera}
+            self.vencimientos = [(r["expira_en"], r["id"]) for r in papelera]
+            heapq.heapify(self.vencimientos)
+            self.version = version
+
+    def _seguir(self):
+        # Cada guardado avanza la versión en uno: solo un índice que estaba
+        # en la anterior puede aplicar el cambio sin reconstruirse
+        version = version_datos(RUTA_PAPELERA)
+        al_dia = self.version == version - 1
+        self.version = version if al_dia else None
+        return al_dia
+
+    def agregado(self, registro):
+        if self._seguir():
+            self.por_id[registro["id"]] = registro
+            heapq.heappush(self.vencimientos, (registro["expira_en"], registro["id"]))
+
+    def quitados(self, registros):
+        # Las entradas del heap de los quitados se descartan al llegar a la cima
+        if self._seguir():
+            for registro in registros:
+                self.por_id.pop(registro["id"], None)
+
+    def vencidos(self, ahora):
+        """Ids de los registros vencidos a 'ahora' (ISO), del más antiguo al más nuevo."""
+
+        self.asegurar()
+
+        ids = []
+        while self.vencimientos and self.vencimientos[0][0] <= ahora:
+            _, registro_id = heapq.heappop(self.vencimientos)
+            if registro_id in self.por_id:
+                ids.append(registro_id)
+        return ids
+
+    def hay_vencidos(self, ahora):
+        self.asegurar()
+
+        # La cima puede ser de un registro ya quitado: se descarta
+        while self.vencimientos and self.vencimientos[0][1] not in self.por_id:
+            heapq.heappop(self.vencimientos)
+        return bool(self.vencimientos) and self.vencimientos[0][0] <= ahora
+
+
+_INDICE = IndicePapelera()
+
+
 def _ahora():
     """Devuelve la fecha y hora actual."""
     return datetime.now()
 
 
+def _expirado(registro, ahora):
+    return registro["expira_en"] <= ahora
+
+
+def _quitar(registro_ids):
+    """Quita registros de la papelera manteniendo el índice."""
+
+    try:
+        quitados = quitar_de_papelera(registro_ids)
+    except BaseException:
+        # vencidos() ya sacó sus entradas del heap
+        _INDICE.version = None
+        raise
+
+    _INDICE.quitados(quitados)
+    return quitados
+
+
+@medir()
 def limpiar_expirados():
-    """Elimina definitivamente los registros de papelera expirados."""
+    """Elimina definitivamente los registros de papelera expirados.
 
-    papelera = cargar_papelera()
-    ahora = _ahora()
+    Solo recorre los vencidos (O(log n) cada uno); si no hay ninguno no
+    escribe nada.
+    """
 
-    papelera_vigente = [
-        r for r in papelera
-        if datetime.fromisoformat(r["expira_en"]) > ahora
-    ]
+    expirados = _INDICE.vencidos(_ahora().isoformat())
 
-    guardar_papelera(papelera_vigente)
+    if expirados:
+        _quitar(expirados)
     return True
 
 
+def _limpiar_si_hay_expirados():
+    # Se aprovecha cada escritura de la papelera para purgarla: mirar la
+    # cima del heap cuesta O(1)
+    if _INDICE.hay_vencidos(_ahora().isoformat()):
+        limpiar_expirados()
+
+
+@medir()
 def enviar_a_papelera(entidad, snapshot, schema_snapshot=None, motivo=None, meta=None):
     """Envía una entidad a la papelera con su estado completo."""
 
+    import uuid
+
+    _limpiar_si_hay_expirados()
     ahora = _ahora()
 
     registro = {
@@ -46,30 +148,29 @@ def enviar_a_papelera(entidad, snapshot, schema_snapshot=None, motivo=None, meta
         "expira_en": (ahora + timedelta(days=TTL_DIAS)).isoformat()
     }
 
-    papelera = cargar_papelera()
-    papelera.append(registro)
-    guardar_papelera(papelera)
+    insertar_en_papelera(registro)
+    _INDICE.agregado(registro)
 
     return registro
 
 
+@medir()
 def listar_papelera(entidad=None, incluir_expirados=False):
     """Lista los registros de la papelera."""
 
-    papelera = cargar_papelera()
-    ahora = _ahora()
+    _INDICE.asegurar()
+    ahora = _ahora().isoformat()
 
     resultados = []
 
-    for r in papelera:
-        if not incluir_expirados:
-            if datetime.fromisoformat(r["expira_en"]) <= ahora:
-                continue
+    for r in _INDICE.por_id.values():
+        if not incluir_expirados and _expirado(r, ahora):
+            continue
 
         if entidad and r["entidad"] != entidad:
             continue
 
-        resultados.append(r.copy())
+        resultados.append({**r, "snapshot": producto_publico(r["snapshot"])})
 
     return resultados
 
@@ -77,47 +178,99 @@ def listar_papelera(entidad=None, incluir_expirados=False):
 def obtener_registro(registro_id):
     """Obtiene un registro específico por ID."""
 
-    papelera = cargar_papelera()
+    _INDICE.asegurar()
+    registro = _INDICE.por_id.get(registro_id)
+    return registro.copy() if registro is not None else None
+
+
+def registro_expirado(registro):
+    """True si el registro ya venció y no puede restaurarse."""
+
+    return _expirado(registro, _ahora().isoformat())
+
+
+def advertencias_restauracion(registro):
+    """Advertencias que acompañan a la restauración de un registro."""
+
+    advertencias = []
+
+    if registro.get("schema_snapshot"):
+        advertencias.append(
+            "El registro fue restaurado con su esquema original. "
+            "Algunos campos pueden no existir actualmente."
+        )
+
+    return advertencias
 
-    for r in papelera:
-        if r["id"] == registro_id:
-            return r.copy()
 
-    return None
+def _resultado_restauracion(registro):
+    return {
+        "entidad": registro["entidad"],
+        "snapshot": producto_publico(registro["snapshot"]),
+        "schema_snapshot": registro.get("schema_snapshot"),
+        "advertencias": advertencias_restauracion(registro)
+    }
 
 
 def restaurar_registro(registro_id):
     """Restaura un registro de la papelera."""
 
-    papelera = cargar_papelera()
-    ahora = _ahora()
+    _, resultado = restaurar_registros([registro_id])
+    if resultado["errores"]:
+        return False, resultado["errores"][0]["error"]
 
-    for i, r in enumerate(papelera):
-        if r["id"] != registro_id:
-            continue
+    return True, resultado["restaurados"][0]
+
+
+@medir()
+def restaurar_registros(registro_ids):
+    """Restaura varios registros de la papelera con una sola escritura.
+
+    Devuelve (True, {"restaurados": [...], "errores": [{"id", "error"}]}):
+    los registros inexistentes o vencidos se informan y el resto se
+    restaura.
+    """
+
+    _INDICE.asegurar()
+    ahora = _ahora().isoformat()
+
+    validos = []
+    errores = []
+
+    for registro_id in dict.fromkeys(registro_ids):
+        registro = _INDICE.por_id.get(registro_id)
+
+        if registro is None:
+            errores.append({"id": registro_id, "error": "Registro no encontrado en la papelera."})
+        elif _expirado(registro, ahora):
+            errores.append({
+                "id": registro_id,
+                "error": "El registro ha expirado y no puede restaurarse."
+            })
+        else:
+            validos.append(registro_id)
+
+    restaurados = []
+    if validos:
+        restaurados = [_resultado_restauracion(r) for r in _quitar(validos)]
+        _limpiar_si_hay_expirados()
 
-        if datetime.fromisoformat(r["expira_en"]) <= ahora:
-            return False, "El registro ha expirado y no puede restaurarse."
+    return True, {"restaurados": restaurados, "errores": errores}
 
-        registro = papelera.pop(i)
-        guardar_papelera(papelera)
 
-        advertencias = []
+@medir()
+def purgar_registros(registro_ids):
+    """Elimina definitivamente los registros indicados, vencidos o no.
 
-        if registro.get("schema_snapshot"):
-            advertencias.append(
-                "El registro fue restaurado con su esquema original. "
-                "Algunos campos pueden no existir actualmente."
-            )
+    Devuelve (True, cantidad de registros eliminados).
+    """
 
-        return True, {
-            "entidad": registro["entidad"],
-            "snapshot": registro["snapshot"],
-            "schema_snapshot": registro.get("schema_snapshot"),
-            "advertencias": advertencias
-        }
+    _INDICE.asegurar()
+    existentes = [i for i in dict.fromkeys(registro_ids) if i in _INDICE.por_id]
 
-    return False, "Registro no encontrado en la papelera."
+    if existentes:
+        _quitar(existentes)
+    return True, len(existentes)
 
 
 def detectar_conflictos_restauracion(registro, inventario_actual, campos_actuales, campos_unicos):
@@ -146,9 +299,9 @@ def detectar_conflictos_restauracion(registro, inventario_actual, campos_actuale
                 })
                 break
 
-    # Campos que ya no existen
+    # Campos que ya no existen (las claves internas "_..." no son campos)
     for campo in snapshot:
-        if campo not in campos_actuales:
+        if not campo.startswith("_") and campo not in campos_actuales:
             conflictos.append({
                 "tipo": "campo_inexistente",
                 "campo": campo,
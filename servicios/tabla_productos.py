@@ -0,0 +1,904 @@
+"""Inventario en columnas, para inventarios grandes.
+
+Un producto como diccionario repite todas sus claves y cada valor es un
+objeto de Python aparte: con un millón de productos son gigabytes.
+TablaProductos guarda lo mismo por columna (un array por campo numérico,
+booleano o de fecha, textos internados, ids como bytes) y cada fila
+solo anota su "forma": el índice de una tupla de claves compartida por
+todas las filas que tienen las mismas claves en el mismo orden.
+
+La tabla se comporta como la lista de productos que reemplaza y cada
+producto se lee como una VistaProducto, un mapeo mutable sobre su fila,
+así que los servicios no distinguen una representación de la otra. Un
+valor que no encaja en el tipo de su columna (un texto en un campo
+numérico, un None) se guarda aparte, tal cual.
+
+Las filas no se mueven: reemplazar o agregar un producto usa una ranura
+nueva, así que las vistas ya entregadas siguen viendo el producto que
+leyeron, como con una lista de diccionarios. Copiar la tabla solo copia
+el orden de las ranuras; las columnas se comparten.
+"""
+
+import sys
+from array import array
+from collections.abc import MutableMapping, MutableSequence
+from datetime import date
+from functools import lru_cache
+from itertools import repeat
+from operator import eq, itemgetter
+
+from servicios.migraciones import CAMPO_VERSION
+from servicios.modelo import CAMPO_ID
+from servicios.validadores import CONVERSORES, fecha_a_ordinal
+
+
+# Clave de los campos eliminados que se conservan (ver migraciones)
+CAMPO_OCULTOS = "_campos_ocultos"
+
+# Al copiar, una tabla con más ranuras descartadas que vivas (y al menos
+# tantas) se reconstruye en un almacén nuevo para liberarlas
+RANURAS_DESCARTADAS_MINIMAS = 1024
+
+_AUSENTE = object()
+
+# Valores que se miran para decidir si internar una columna de textos
+_MUESTRA = 1000
+
+
+# COLUMNAS
+class _Columna:
+    """Valores de un campo, uno por ranura.
+
+    'valores' es el arreglo compacto propio de cada tipo; 'otros' guarda
+    por ranura los valores que no encajan en él. Las ranuras que la
+    columna todavía no alcanzó se completan al escribirlas. Cada clase
+    define cómo se codifica un valor que encaja ('_codigo') y su vuelta
+    ('_valor'), y 'cero', lo que ocupa una ranura sin valor propio.
+    """
+
+    __slots__ = ("valores", "otros")
+    codigo = "q"
+    cero = 0
+
+    def __init__(self):
+        self.valores = array(self.codigo)
+        self.otros = {}
+
+    def leer(self, ranura):
+        if self.otros:
+            valor = self.otros.get(ranura, _AUSENTE)
+            if valor is not _AUSENTE:
+                return valor
+        return self._valor(self.valores[ranura])
+
+    def escribir(self, ranura, valor):
+        faltan = ranura + 1 - len(self.valores)
+        if faltan > 0:
+            self.valores.extend(repeat(self.cero, faltan))
+
+        if self._encaja(valor):
+            self.valores[ranura] = self._codigo(valor)
+            if self.otros:
+                self.otros.pop(ranura, None)
+        else:
+            self.otros[ranura] = valor
+
+    def anexar(self, inicio, valores):
+        """Escribe valores[i] en la ranura nueva inicio + i.
+
+        _AUSENTE marca las filas que no tienen el campo.
+        """
+
+        faltan = inicio - len(self.valores)
+        if faltan > 0:
+            self.valores.extend(repeat(self.cero, faltan))
+
+        codificados = self._codificar_todos(valores)
+        if codificados is None:
+            codificados = self._codificar_uno_a_uno(inicio, valores)
+        self.valores.extend(codificados)
+
+    def _codificar_todos(self, valores):
+        """Todos codificados de una vez, o None si alguno no encaja."""
+        return None
+
+    def _codificar_uno_a_uno(self, inicio, valores):
+        encaja, codigo, cero, otros = self._encaja, self._codigo, self.cero, self.otros
+        codificados = []
+
+        for desplazamiento, valor in enumerate(valores):
+            if valor is _AUSENTE:
+                codificados.append(cero)
+            elif encaja(valor):
+                codificados.append(codigo(valor))
+            else:
+                codificados.append(cero)
+                otros[inicio + desplazamiento] = valor
+
+        return codificados
+
+    def olvidar(self, ranura):
+        if self.otros:
+            self.otros.pop(ranura, None)
+
+    def leer_todos(self, ranuras, total):
+        """Los valores de las ranuras indicadas, en una lista.
+
+        'total' es la cantidad de ranuras del almacén: las que la columna
+        no alcanzó se leen como 'cero' (lo que no tiene el campo no se usa).
+        """
+
+        self._completar(total)
+        leidos = self._decodificar_todos(ranuras)
+
+        otros = self.otros
+        if otros:
+            for indice, ranura in enumerate(ranuras):
+                if ranura in otros:
+                    leidos[indice] = otros[ranura]
+        return leidos
+
+    def _completar(self, total):
+        faltan = total - len(self.valores)
+        if faltan > 0:
+            self.valores.extend(repeat(self.cero, faltan))
+
+    def _decodificar_todos(self, ranuras):
+        return list(map(self._valor, map(self.valores.__getitem__, ranuras)))
+
+    def _codigo(self, valor):
+        return valor
+
+    def _valor(self, codigo):
+        return codigo
+
+
+class _Directa(_Columna):
+    """Columna que guarda los valores tal cual (sin '_valor' al leer)."""
+
+    __slots__ = ()
+
+    def leer(self, ranura):
+        otros = self.otros
+        if otros and ranura in otros:
+            return otros[ranura]
+        return self.valores[ranura]
+
+    def _decodificar_todos(self, ranuras):
+        return list(map(self.valores.__getitem__, ranuras))
+
+
+class _Enteros(_Directa):
+    __slots__ = ()
+
+    def _encaja(self, valor):
+        return type(valor) is int and -2 ** 63 <= valor < 2 ** 63
+
+    def _codificar_todos(self, valores):
+        if set(map(type, valores)) == {int}:
+            try:
+                return array(self.codigo, valores)
+            except OverflowError:
+                return None
+        return None
+
+
+class _Decimales(_Directa):
+    __slots__ = ()
+    codigo = "d"
+    cero = 0.0
+
+    def _encaja(self, valor):
+        return type(valor) is float
+
+    def _codificar_todos(self, valores):
+        if set(map(type, valores)) == {float}:
+            return array(self.codigo, valores)
+        return None
+
+
+class _Booleanos(_Columna):
+    __slots__ = ()
+    codigo = "b"
+
+    def _encaja(self, valor):
+        return type(valor) is bool
+
+    def _codificar_todos(self, valores):
+        if set(map(type, valores)) == {bool}:
+            return array(self.codigo, valores)
+        return None
+
+    def _valor(self, codigo):
+        return codigo == 1
+
+
+class _Fechas(_Columna):
+    """Fechas DD-MM-YYYY como número de día (ver validadores.fecha_a_ordinal)."""
+
+    __slots__ = ()
+    codigo = "i"
+    # Una ranura sin fecha también debe poder leerse (ver leer_todos)
+    cero = 1
+
+    def _encaja(self, valor):
+        return type(valor) is str and _ordinal(valor) is not None
+
+    def _codigo(self, valor):
+        return _ordinal(valor)
+
+    def _valor(self, codigo):
+        return _texto_fecha(codigo)
+
+    def _codificar_todos(self, valores):
+        if set(map(type, valores)) == {str}:
+            ordinales = list(map(_ordinal, valores))
+            if None not in ordinales:
+                return ordinales
+        return None
+
+
+# Hay pocas fechas distintas: convertirlas una vez ahorra tiempo y, al
+# leer, textos repetidos
+@lru_cache(maxsize=1 << 16)
+def _ordinal(texto):
+    """Número de día de una fecha DD-MM-YYYY con ceros y 4 dígitos, o None."""
+
+    if len(texto) != 10:
+        return None
+    try:
+        ordinal = fecha_a_ordinal(texto)
+    except ValueError:
+        return None
+    # Solo las que vuelven a dar el mismo texto
+    return ordinal if _texto_fecha(ordinal) == texto else None
+
+
+@lru_cache(maxsize=1 << 16)
+def _texto_fecha(ordinal):
+    fecha = date.fromordinal(ordinal)
+    return f"{fecha.day:02d}-{fecha.month:02d}-{fecha.year:04d}"
+
+
+# Los ids (uuid4 como texto) se guardan como sus 36 caracteres ASCII,
+# uno detrás del otro: leerlo es decodificar un tramo
+LARGO_ID = 36
+
+
+class _Ids(_Columna):
+    """Ids de LARGO_ID caracteres ASCII, como bytes en un solo bytearray."""
+
+    __slots__ = ()
+    cero = bytes(LARGO_ID)
+
+    def __init__(self):
+        self.valores = bytearray()
+        self.otros = {}
+
+    def leer(self, ranura):
+        otros = self.otros
+        if otros and ranura in otros:
+            return otros[ranura]
+        return self.valores[LARGO_ID * ranura:LARGO_ID * (ranura + 1)].decode("ascii")
+
+    def escribir(self, ranura, valor):
+        faltan = LARGO_ID * (ranura + 1) - len(self.valores)
+        if faltan > 0:
+            self.valores.extend(bytes(faltan))
+
+        if self._encaja(valor):
+            self.valores[LARGO_ID * ranura:LARGO_ID * (ranura + 1)] = self._codigo(valor)
+            if self.otros:
+                self.otros.pop(ranura, None)
+        else:
+            self.otros[ranura] = valor
+
+    def anexar(self, inicio, valores):
+        faltan = LARGO_ID * inicio - len(self.valores)
+        if faltan > 0:
+            self.valores.extend(bytes(faltan))
+
+        if set(map(type, valores)) == {str} and set(map(len, valores)) == {LARGO_ID}:
+            texto = "".join(valores)
+            if texto.isascii():
+                self.valores += texto.encode("ascii")
+                return
+
+        self.valores += b"".join(self._codificar_uno_a_uno(inicio, valores))
+
+    def _completar(self, total):
+        faltan = LARGO_ID * total - len(self.valores)
+        if faltan > 0:
+            self.valores.extend(bytes(faltan))
+
+    def _decodificar_todos(self, ranuras):
+        valores = self.valores
+        return [valores[LARGO_ID * ranura:LARGO_ID * (ranura + 1)].decode("ascii") for ranura in ranuras]
+
+    def _encaja(self, valor):
+        return type(valor) is str and len(valor) == LARGO_ID and valor.isascii()
+
+    def _codigo(self, valor):
+        return valor.encode("ascii")
+
+
+class _Objetos(_Directa):
+    """Cualquier valor, sin compactar; los textos que se repiten se internan."""
+
+    __slots__ = ()
+    cero = None
+
+    def __init__(self):
+        self.valores = []
+        self.otros = {}
+
+    def _encaja(self, valor):
+        return True
+
+    def _codigo(self, valor):
+        return sys.intern(valor) if type(valor) is str else valor
+
+    def _codificar_todos(self, valores):
+        # Internar textos que no se repiten (códigos, nombres) solo cuesta
+        # tiempo y la entrada en la tabla de internados: se decide con una
+        # muestra
+        textos = [valor for valor in valores[:_MUESTRA] if type(valor) is str]
+        internar = len(set(textos)) <= len(textos) // 2
+
+        if set(map(type, valores)) == {str}:
+            return map(sys.intern, valores) if internar else valores
+
+        cero = self.cero
+        return [
+            sys.intern(valor) if internar and type(valor) is str else cero if valor is _AUSENTE else valor
+            for valor in valores
+        ]
+
+
+# Columna por tipo lógico de campo (los de campos.json)
+_COLUMNAS_POR_TIPO = {
+    "texto": _Objetos,
+    "num entero": _Enteros,
+    "num decimal": _Decimales,
+    "v/f": _Booleanos,
+    "fecha": _Fechas,
+}
+
+# Los campos fuera del esquema toman la columna del primer valor escrito
+_COLUMNAS_POR_VALOR = {
+    int: _Enteros,
+    float: _Decimales,
+    bool: _Booleanos,
+}
+
+
+class _Forma:
+    """Claves de una fila, en orden, y las de sus campos ocultos."""
+
+    __slots__ = ("claves", "conjunto", "ocultas")
+
+    def __init__(self, claves, ocultas):
+        self.claves = claves
+        self.conjunto = frozenset(claves)
+        self.ocultas = ocultas
+
+
+class _Almacen:
+    """Columnas y formas compartidas por una tabla y sus copias.
+
+    Solo se agregan ranuras: una ranura que ninguna tabla usa queda hasta
+    que la tabla se reconstruye (ver TablaProductos.copy).
+    """
+
+    def __init__(self, tipos=None):
+        self.tipos = dict(tipos or {})
+        self.columnas = {}
+        self.ocultas = {}
+        self.formas = []
+        self.numeros_forma = {}
+        self.forma = array("i")
+
+    def __len__(self):
+        return len(self.forma)
+
+    def numero_forma(self, claves, ocultas=()):
+        clave = (claves, ocultas)
+        numero = self.numeros_forma.get(clave)
+        if numero is None:
+            numero = self.numeros_forma[clave] = len(self.formas)
+            self.formas.append(_Forma(claves, ocultas))
+        return numero
+
+    def rehacer_formas(self):
+        self.numeros_forma = {
+            (forma.claves, forma.ocultas): numero for numero, forma in enumerate(self.formas)
+        }
+
+    def columna(self, campo, valor, ocultas=False):
+        """Devuelve la columna del campo, creándola según su tipo si falta."""
+
+        columnas = self.ocultas if ocultas else self.columnas
+        columna = columnas.get(campo)
+        if columna is None:
+            if campo == CAMPO_ID:
+                clase = _Ids
+            elif campo == CAMPO_VERSION:
+                clase = _Enteros
+            else:
+                clase = _COLUMNAS_POR_TIPO.get(self.tipos.get(campo)) or _COLUMNAS_POR_VALOR.get(type(valor), _Objetos)
+            columna = columnas[campo] = clase()
+        return columna
+
+    def agregar(self, producto):
+        """Escribe el producto (un mapeo) en una ranura nueva y la devuelve."""
+
+        ranura = len(self.forma)
+        self.forma.append(0)
+
+        ocultos = ()
+        for campo, valor in producto.items():
+            if campo == CAMPO_OCULTOS:
+                ocultos = tuple(valor)
+                for oculto in ocultos:
+                    self.columna(oculto, valor[oculto], ocultas=True).escribir(ranura, valor[oculto])
+            else:
+                self.columna(campo, valor).escribir(ranura, valor)
+
+        self.forma[ranura] = self.numero_forma(tuple(producto), ocultos)
+        return ranura
+
+    def agregar_todos(self, productos):
+        """Como agregar para varios productos, columna por columna.
+
+        Devuelve el rango de ranuras que ocupan.
+        """
+
+        inicio = len(self.forma)
+        claves = list(map(tuple, productos))
+        numeros = dict.fromkeys(claves)
+        for forma in numeros:
+            numeros[forma] = self.numero_forma(forma)
+        self.forma.extend(array("i", map(numeros.__getitem__, claves)))
+
+        campos = dict.fromkeys(campo for forma in numeros for campo in forma)
+        for campo in campos:
+            if campo == CAMPO_OCULTOS:
+                continue
+
+            if all(campo in forma for forma in numeros):
+                valores = list(map(itemgetter(campo), productos))
+            else:
+                valores = [producto.get(campo, _AUSENTE) for producto in productos]
+
+            primero = next((valor for valor in valores if valor is not _AUSENTE), None)
+            self.columna(campo, primero).anexar(inicio, valores)
+
+        # Los pocos productos con campos ocultos, uno por uno (ver __setitem__)
+        if CAMPO_OCULTOS in campos:
+            for ranura, producto in enumerate(productos, start=inicio):
+                if CAMPO_OCULTOS in producto:
+                    VistaProducto(self, ranura)[CAMPO_OCULTOS] = producto[CAMPO_OCULTOS]
+
+        return range(inicio, len(self.forma))
+
+    def agregar_filas(self, claves, filas, constantes):
+        """Como agregar_todos para listas de valores en el orden de 'claves'.
+
+        'constantes' (campo -> valor) se agrega igual a todas.
+        """
+
+        inicio = len(self.forma)
+        cantidad = len(filas)
+        numero = self.numero_forma((*claves, *constantes))
+        self.forma.extend(array("i", [numero]) * cantidad)
+
+        for indice, campo in enumerate(claves):
+            valores = list(map(itemgetter(indice), filas))
+            self.columna(campo, valores[0] if valores else None).anexar(inicio, valores)
+
+        for campo, valor in constantes.items():
+            self.columna(campo, valor).anexar(inicio, [valor] * cantidad)
+
+        return range(inicio, inicio + cantidad)
+
+
+# VISTAS
+class VistaProducto(MutableMapping):
+    """Un producto de una TablaProductos, leído y escrito sobre sus columnas.
+
+    Se usa como el diccionario del producto. "_campos_ocultos" se lee
+    como un diccionario nuevo: para cambiarlo hay que asignarlo entero.
+    """
+
+    __slots__ = ("_almacen", "_ranura")
+
+    def __init__(self, almacen, ranura):
+        self._almacen = almacen
+        self._ranura = ranura
+
+    def _forma(self):
+        almacen = self._almacen
+        return almacen.formas[almacen.forma[self._ranura]]
+
+    def _ocultos(self, forma):
+        ocultas = self._almacen.ocultas
+        return {oculto: ocultas[oculto].leer(self._ranura) for oculto in forma.ocultas}
+
+    def __getitem__(self, campo):
+        almacen = self._almacen
+        forma = almacen.formas[almacen.forma[self._ranura]]
+        if campo not in forma.conjunto:
+            raise KeyError(campo)
+
+        if campo == CAMPO_OCULTOS:
+            return self._ocultos(forma)
+        return almacen.columnas[campo].leer(self._ranura)
+
+    def get(self, campo, defecto=None):
+        almacen = self._almacen
+        forma = almacen.formas[almacen.forma[self._ranura]]
+        if campo not in forma.conjunto:
+            return defecto
+
+        if campo == CAMPO_OCULTOS:
+            return self._ocultos(forma)
+        return almacen.columnas[campo].leer(self._ranura)
+
+    def __contains__(self, campo):
+        return campo in self._forma().conjunto
+
+    def __iter__(self):
+        return iter(self._forma().claves)
+
+    def __len__(self):
+        return len(self._forma().claves)
+
+    def __setitem__(self, campo, valor):
+        almacen = self._almacen
+        forma = self._forma()
+        ocultas = forma.ocultas
+
+        if campo == CAMPO_OCULTOS:
+            ocultas = tuple(valor)
+            for oculto in ocultas:
+                almacen.columna(oculto, valor[oculto], ocultas=True).escribir(self._ranura, valor[oculto])
+        else:
+            almacen.columna(campo, valor).escribir(self._ranura, valor)
+
+        claves = forma.claves if campo in forma.conjunto else (*forma.claves, campo)
+        almacen.forma[self._ranura] = almacen.numero_forma(claves, ocultas)
+
+    def __delitem__(self, campo):
+        almacen = self._almacen
+        forma = self._forma()
+        if campo not in forma.conjunto:
+            raise KeyError(campo)
+
+        if campo == CAMPO_OCULTOS:
+            for oculto in forma.ocultas:
+                almacen.ocultas[oculto].olvidar(self._ranura)
+            ocultas = ()
+        else:
+            almacen.columnas[campo].olvidar(self._ranura)
+            ocultas = forma.ocultas
+
+        claves = tuple(clave for clave in forma.claves if clave != campo)
+        almacen.forma[self._ranura] = almacen.numero_forma(claves, ocultas)
+
+    # Leer todo de una vez evita pasar por __getitem__ campo por campo
+    def items(self):
+        return self.copy().items()
+
+    def values(self):
+        return self.copy().values()
+
+    def copy(self):
+        """Copia como diccionario (con "_campos_ocultos" también copiado)."""
+
+        forma = self._forma()
+        columnas = self._almacen.columnas
+        ranura = self._ranura
+        return {
+            campo: columnas[campo].leer(ranura) if campo != CAMPO_OCULTOS else self._ocultos(forma)
+            for campo in forma.claves
+        }
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+# TABLA
+class TablaProductos(MutableSequence):
+    """Lista de productos guardada en columnas (ver el docstring del módulo).
+
+    'tipos' (campo -> tipo lógico, como en campos.json) elige la columna
+    de cada campo; los que no figuran la toman de su primer valor.
+    """
+
+    def __init__(self, productos=(), tipos=None):
+        self._almacen = _Almacen(tipos)
+        self._orden = array("q")
+        self.extend(productos)
+
+    def __len__(self):
+        return len(self._orden)
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return [VistaProducto(self._almacen, ranura) for ranura in self._orden[posicion]]
+        return VistaProducto(self._almacen, self._orden[posicion])
+
+    def __iter__(self):
+        return map(VistaProducto, repeat(self._almacen), self._orden)
+
+    def __setitem__(self, posicion, producto):
+        if isinstance(posicion, slice):
+            self._orden[posicion] = array("q", [self._almacen.agregar(p) for p in producto])
+        else:
+            self._orden[posicion] = self._almacen.agregar(producto)
+
+    def __delitem__(self, posicion):
+        del self._orden[posicion]
+
+    def insert(self, posicion, producto):
+        self._orden.insert(posicion, self._almacen.agregar(producto))
+
+    def append(self, producto):
+        self._orden.append(self._almacen.agregar(producto))
+
+    def extend(self, productos):
+        if not isinstance(productos, (list, tuple)):
+            productos = list(productos)
+        self._orden.extend(self._almacen.agregar_todos(productos))
+
+    def __eq__(self, otro):
+        if not isinstance(otro, (list, TablaProductos)):
+            return NotImplemented
+        return len(self) == len(otro) and all(map(eq, self, otro))
+
+    @classmethod
+    def desde_filas(cls, claves, filas, tipos=None, constantes=None):
+        """Arma la tabla desde el formato "filas" de almacenamiento.
+
+        Cada fila es una lista de valores en el orden de 'claves' (a la
+        que se suman 'constantes', campo -> valor común) o un producto
+        como diccionario. Las listas van directo a las columnas, sin
+        pasar por un diccionario por producto.
+        """
+
+        constantes = constantes or {}
+        tabla = cls(tipos=tipos)
+        almacen = tabla._almacen
+
+        largo = len(claves)
+        listas = [fila for fila in filas if type(fila) is list and len(fila) == largo]
+        ranuras = iter(almacen.agregar_filas(claves, listas, constantes))
+
+        if len(listas) == len(filas):
+            tabla._orden.extend(ranuras)
+            return tabla
+
+        for fila in filas:
+            if type(fila) is not list:
+                tabla._orden.append(almacen.agregar(fila))
+            elif len(fila) == largo:
+                tabla._orden.append(next(ranuras))
+            else:
+                tabla._orden.append(almacen.agregar({**dict(zip(claves, fila)), **constantes}))
+        return tabla
+
+    def filas(self, columnas, version):
+        """Las filas del formato "filas" de almacenamiento, armadas por columna.
+
+        Una lista de valores en el orden de 'columnas' por cada producto
+        que tiene exactamente esas claves y está en la versión 'version'
+        del esquema; el producto como diccionario para los demás.
+        """
+
+        almacen = self._almacen
+        orden = self._orden
+        total = len(almacen)
+
+        esperadas = frozenset(columnas).union([CAMPO_VERSION] if version else [])
+        if not all(campo in almacen.columnas for campo in esperadas):
+            return self.diccionarios()
+
+        filas = list(map(list, zip(*(
+            almacen.columnas[campo].leer_todos(orden, total) for campo in columnas
+        ))))
+
+        conformes = [forma.conjunto == esperadas for forma in almacen.formas]
+        if version:
+            versiones = almacen.columnas[CAMPO_VERSION].leer_todos(orden, total)
+        else:
+            versiones = repeat(version)
+
+        formas = map(almacen.forma.__getitem__, orden)
+        for posicion, (numero, version_fila) in enumerate(zip(formas, versiones)):
+            if not conformes[numero] or version_fila != version:
+                filas[posicion] = VistaProducto(almacen, orden[posicion]).copy()
+
+        return filas
+
+    def diccionarios(self):
+        """Los productos como diccionarios nuevos, armados por columna.
+
+        Es lo mismo que [producto.copy() for producto in self] sin leer
+        campo por campo: las filas se agrupan por forma y cada grupo lee
+        sus columnas enteras.
+        """
+
+        almacen = self._almacen
+        orden = self._orden
+        total = len(almacen)
+
+        grupos = {}
+        for posicion, numero in enumerate(map(almacen.forma.__getitem__, orden)):
+            grupos.setdefault(numero, []).append(posicion)
+
+        productos = [None] * len(orden)
+        for numero, posiciones in grupos.items():
+            forma = almacen.formas[numero]
+            ranuras = [orden[posicion] for posicion in posiciones]
+
+            columnas = []
+            for campo in forma.claves:
+                if campo != CAMPO_OCULTOS:
+                    columnas.append(almacen.columnas[campo].leer_todos(ranuras, total))
+                elif forma.ocultas:
+                    ocultos = zip(*(almacen.ocultas[oculto].leer_todos(ranuras, total) for oculto in forma.ocultas))
+                    columnas.append(list(map(dict, map(zip, repeat(forma.ocultas), ocultos))))
+                else:
+                    columnas.append([{} for _ in ranuras])
+
+            if columnas:
+                filas = map(dict, map(zip, repeat(forma.claves), zip(*columnas)))
+            else:
+                filas = ({} for _ in ranuras)
+            for posicion, producto in zip(posiciones, filas):
+                productos[posicion] = producto
+
+        return productos
+
+    def valores(self, campo):
+        """Los valores de 'campo' en el orden de la tabla, leídos por columna.
+
+        None para los productos que no tienen el campo, como producto.get.
+        """
+
+        almacen = self._almacen
+        columna = almacen.columnas.get(campo)
+        if columna is None:
+            return [producto.get(campo) for producto in self]
+
+        valores = columna.leer_todos(self._orden, len(almacen))
+
+        sin_campo = {numero for numero, forma in enumerate(almacen.formas) if campo not in forma.conjunto}
+        if sin_campo:
+            for posicion, numero in enumerate(map(almacen.forma.__getitem__, self._orden)):
+                if numero in sin_campo:
+                    valores[posicion] = None
+        return valores
+
+    def al_dia(self, version):
+        """True si todos los productos tienen '_v' igual a 'version'.
+
+        Se mira la columna entera, sin recorrer los productos: ante la
+        duda (ranuras descartadas distintas, valores fuera del arreglo)
+        responde False.
+        """
+
+        almacen = self._almacen
+        columna = almacen.columnas.get(CAMPO_VERSION)
+        if columna is None or columna.otros or len(columna.valores) < len(almacen):
+            return False
+        if not all(CAMPO_VERSION in forma.conjunto for forma in almacen.formas):
+            return False
+
+        valores = columna.valores[:len(almacen)]
+        return not valores or min(valores) == max(valores) == version
+
+    def copy(self):
+        """Otra tabla con los mismos productos (comparte las columnas)."""
+
+        descartadas = len(self._almacen) - len(self._orden)
+        if descartadas >= RANURAS_DESCARTADAS_MINIMAS and descartadas > len(self._orden):
+            return TablaProductos(self, self._almacen.tipos)
+
+        copia = TablaProductos.__new__(TablaProductos)
+        copia._almacen = self._almacen
+        copia._orden = array("q", self._orden)
+        return copia
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def aplicar_migracion(self, migracion, version, valores=None):
+        """Aplica una migración recién registrada a las columnas enteras.
+
+        Equivale a aplicarla producto por producto (ver
+        migraciones.aplicar_ultima_migracion), que se puede hacer porque
+        todos estaban al día. Devuelve False si este caso no se resuelve
+        por columnas y hay que ir fila por fila.
+        """
+
+        almacen = self._almacen
+        campo = migracion["campo"]
+        accion = migracion["accion"]
+
+        if campo == CAMPO_OCULTOS:
+            return False
+        if accion == "renombrar" and (migracion["nuevo"] in almacen.columnas or migracion["nuevo"] == CAMPO_OCULTOS):
+            return False
+        if accion == "ocultar" and campo in almacen.ocultas:
+            return False
+
+        if accion == "renombrar" and campo in almacen.tipos:
+            almacen.tipos[migracion["nuevo"]] = almacen.tipos.pop(campo)
+        elif accion == "convertir":
+            almacen.tipos[campo] = migracion["tipo"]
+
+        columna = almacen.columnas.get(campo)
+        if columna is not None:
+            if accion == "renombrar":
+                nuevo = migracion["nuevo"]
+                almacen.columnas[nuevo] = almacen.columnas.pop(campo)
+                self._cambiar_formas(campo, lambda forma: (
+                    (*(c for c in forma.claves if c != campo), nuevo), forma.ocultas
+                ))
+
+            elif accion == "ocultar":
+                almacen.ocultas[campo] = almacen.columnas.pop(campo)
+                self._cambiar_formas(campo, lambda forma: (
+                    (*(c for c in forma.claves if c not in (campo, CAMPO_OCULTOS)), CAMPO_OCULTOS)
+                    if CAMPO_OCULTOS not in forma.conjunto
+                    else tuple(c for c in forma.claves if c != campo),
+                    (*forma.ocultas, campo),
+                ))
+
+            elif accion == "convertir":
+                self._convertir(campo, columna, migracion["tipo"], valores)
+
+        # Todas las ranuras quedan en la versión nueva
+        columna = almacen.columnas[CAMPO_VERSION] = _Enteros()
+        columna.valores = array("q", [version]) * len(almacen)
+        for forma in almacen.formas:
+            if CAMPO_VERSION not in forma.conjunto:
+                forma.claves = (*forma.claves, CAMPO_VERSION)
+                forma.conjunto = frozenset(forma.claves)
+        almacen.rehacer_formas()
+        return True
+
+    def _cambiar_formas(self, campo, cambiar):
+        for forma in self._almacen.formas:
+            if campo in forma.conjunto:
+                forma.claves, forma.ocultas = cambiar(forma)
+                forma.conjunto = frozenset(forma.claves)
+
+    def _convertir(self, campo, vieja, tipo, valores):
+        almacen = self._almacen
+        nueva = almacen.columnas[campo] = _COLUMNAS_POR_TIPO[tipo]()
+        convertir = CONVERSORES[tipo]
+
+        # 'valores' viene por posición en la tabla; se pasa a ranuras
+        ya_convertidos = {} if valores is None else {
+            self._orden[posicion]: valor for posicion, valor in valores.items()
+        }
+
+        formas = {numero for numero, forma in enumerate(almacen.formas) if campo in forma.conjunto}
+        for ranura, numero in enumerate(almacen.forma):
+            if numero in formas:
+                valor = ya_convertidos.get(ranura, _AUSENTE)
+                if valor is _AUSENTE:
+                    valor = convertir(vieja.leer(ranura))
+                nueva.escribir(ranura, valor)
+
+
+def a_json(objeto):
+    """Para json.dumps(default=a_json): una tabla como lista y una vista como objeto."""
+
+    if isinstance(objeto, TablaProductos):
+        return objeto.diccionarios()
+    if isinstance(objeto, VistaProducto):
+        return objeto.copy()
+    raise TypeError(f"Object of type {type(objeto).__name__} is not JSON serializable")
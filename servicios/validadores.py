@@ -1,55 +1,173 @@
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 
 
 # Valores aceptados para booleanos
 POSITIVOS = {'si', 'sí', 's', 'true', '1', 'verdadero', 'y', 'yes', 't'}
 NEGATIVOS = {'no', 'n', '0', 'false', 'falso', 'f'}
 
+# Días por mes (febrero se corrige en los años bisiestos)
+_DIAS_MES = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_DIGITOS = frozenset("0123456789")
 
-def validar_dato(dato, tipo_esperado):
-    """Valida y convierte un dato según el tipo esperado."""
 
+# Conversores por tipo: reciben un valor crudo y devuelven el valor
+# convertido o None si no es válido. Los valores que ya tienen el tipo
+# correcto se devuelven sin pasar por str().
+def convertir_texto(dato):
     if dato is None:
         return None
 
-    # TEXTO
-    if tipo_esperado == str:
-        dato = str(dato).strip()
-        return dato if dato else None
+    if type(dato) is not str:
+        dato = str(dato)
 
-    # BOOLEANO
-    if tipo_esperado == bool:
-        valor = str(dato).strip().lower()
+    dato = dato.strip()
+    return dato if dato else None
 
-        if valor in POSITIVOS:
-            return True
-        if valor in NEGATIVOS:
-            return False
 
-        return None
+def convertir_booleano(dato):
+    if type(dato) is bool:
+        return dato
 
-    # ENTERO
-    if tipo_esperado == int:
-        try:
-            return int(str(dato).strip())
-        except (ValueError, TypeError):
-            return None
+    if dato is None:
+        return None
 
-    # DECIMAL
-    if tipo_esperado == float:
-        try:
-            dato = str(dato).strip().replace(",", ".")
-            return float(dato)
-        except (ValueError, TypeError):
-            return None
+    valor = str(dato).strip().lower()
 
-    # FECHA (DD-MM-YYYY)
-    if tipo_esperado == "fecha":
-        try:
-            dato = str(dato).strip()
-            datetime.strptime(dato, "%d-%m-%Y")
-            return dato
-        except (ValueError, TypeError):
-            return None
+    if valor in POSITIVOS:
+        return True
+    if valor in NEGATIVOS:
+        return False
 
     return None
+
+
+def convertir_entero(dato):
+    # type() y no isinstance(): un bool no se acepta como entero
+    if type(dato) is int:
+        return dato
+
+    if dato is None:
+        return None
+
+    try:
+        return int(str(dato).strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def convertir_decimal(dato):
+    tipo = type(dato)
+    if tipo is float:
+        return dato
+    if tipo is int:
+        return float(dato)
+
+    if dato is None:
+        return None
+
+    try:
+        return float(str(dato).strip().replace(",", "."))
+    except (ValueError, TypeError):
+        return None
+
+
+def _fecha_rapida(texto):
+    """Valida 'DD-MM-YYYY' con dígitos fijos sin pasar por strptime."""
+
+    if (
+        len(texto) != 10
+        or texto[2] != "-"
+        or texto[5] != "-"
+        or not _DIGITOS.issuperset(texto[:2] + texto[3:5] + texto[6:])
+    ):
+        return False
+
+    dia = int(texto[:2])
+    mes = int(texto[3:5])
+    anio = int(texto[6:])
+
+    if anio < 1 or not 1 <= mes <= 12:
+        return False
+
+    dias = _DIAS_MES[mes]
+    if mes == 2 and anio % 4 == 0 and (anio % 100 != 0 or anio % 400 == 0):
+        dias = 29
+
+    return 1 <= dia <= dias
+
+
+def convertir_fecha(dato):
+    """Valida una fecha DD-MM-YYYY y la devuelve como texto."""
+
+    if dato is None:
+        return None
+
+    dato = str(dato).strip()
+    if _fecha_rapida(dato):
+        return dato
+
+    # Formas que strptime también acepta (día o mes sin cero, etc.)
+    try:
+        datetime.strptime(dato, "%d-%m-%Y")
+        return dato
+    except (ValueError, TypeError):
+        return None
+
+
+def fecha_a_ordinal(texto):
+    """Convierte una fecha DD-MM-YYYY ya validada en un entero ordenable."""
+
+    dia, mes, anio = texto.split("-")
+    return date(int(anio), int(mes), int(dia)).toordinal()
+
+
+# Clave de comparación por tipo lógico, para los tipos cuyos valores no
+# se ordenan bien tal cual (las fechas como texto, los textos con mayúsculas)
+CLAVES_ORDEN = {
+    "texto": str.casefold,
+    "fecha": fecha_a_ordinal,
+}
+
+
+# Conversor por tipo lógico de campo (los valores de campos.json)
+CONVERSORES = {
+    "texto": convertir_texto,
+    "num entero": convertir_entero,
+    "num decimal": convertir_decimal,
+    "v/f": convertir_booleano,
+    "fecha": convertir_fecha,
+}
+
+# Conversor por tipo esperado, para validar_dato
+_CONVERSORES_TIPO = {
+    str: convertir_texto,
+    int: convertir_entero,
+    float: convertir_decimal,
+    bool: convertir_booleano,
+    "fecha": convertir_fecha,
+}
+
+
+def validar_dato(dato, tipo_esperado):
+    """Valida y convierte un dato según el tipo esperado."""
+
+    conversor = _CONVERSORES_TIPO.get(tipo_esperado)
+    if conversor is None:
+        return None
+
+    return conversor(dato)
+
+
+def compilar_esquema(campos):
+    """Devuelve una tupla (campo, conversor) en el orden de 'campos'.
+
+    El resultado se reutiliza mientras los campos y sus tipos no cambien.
+    """
+
+    return _compilar(tuple(campos.items()))
+
+
+@lru_cache(maxsize=16)
+def _compilar(campos):
+    return tuple((campo, CONVERSORES[tipo]) for campo, tipo in campos)
@@ -0,0 +1,480 @@
+"""Servidor HTTP/JSON local del gestor de inventario.
+
+Expone los servicios de campos, inventario, búsquedas, papelera e
+historial. Los datos y sus índices quedan en memoria mientras el
+servidor corre. Las lecturas se atienden en el momento, intercaladas
+entre conexiones; las escrituras pasan por una única tarea escritora,
+que confirma juntas las que se acumularon mientras escribía (una
+escritura agrupada por tanda). La misma tarea purga la papelera de
+registros vencidos al arrancar y cada INTERVALO_PURGA segundos.
+
+Todo corre en el hilo del bucle de eventos, también la confirmación de
+cada tanda (con sus fsync): las lecturas son concurrentes entre tandas,
+no durante ellas. Los servicios y sus índices en memoria no admiten
+escrituras en otro hilo mientras se lee.
+
+Uso (desde la raíz del proyecto):
+    python servidor.py
+    python servidor.py --puerto 8080 --datos /ruta/a/datos
+
+Rutas:
+    GET    /campos
+    POST   /campos                     {"nombre", "tipo", "unico"}
+    PATCH  /campos/<nombre>            {"nuevo_nombre", "nuevo_tipo", "unico"}
+    DELETE /campos/<nombre>
+    GET    /productos                  ?campos=a,b&desde=&limite=&despues_de=
+                                       ?orden=<campo>&descendente=1
+    POST   /productos                  {"datos", "criterios", "forzar", "campos_duplicado"}
+    POST   /productos/lote             {"filas", "campos_duplicado", "forzar"}
+    GET    /productos/buscar           ?campo=&valor=
+    POST   /productos/consulta         {"condiciones"}
+    PATCH  /productos/<id>             {"valores"}
+    DELETE /productos/<id>
+    GET    /papelera                   ?entidad=&expirados=1
+    POST   /papelera/<id>/restaurar
+    POST   /papelera/restaurar         {"ids"}
+    DELETE /papelera                   {"ids"}
+    DELETE /papelera/expirados
+    GET    /historial                  ?entidad=&accion=&entidad_id=&desde=&hasta=
+                                       ?limite=&recientes=1
+    GET    /metricas
+
+Las respuestas son {"ok": ..., "resultado": ...}, con el mismo sentido
+que las tuplas (ok, resultado) de los servicios.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# No depende de la carpeta de datos (los servicios se importan al arrancar)
+from servicios.tabla_productos import a_json
+
+
+# Filas por defecto de GET /productos (el cliente puede pedir otra cantidad)
+LIMITE_LISTADO = 100
+
+# Escrituras que la tarea escritora confirma juntas como máximo
+TAMANIO_TANDA = 64
+
+# Tamaño máximo del cuerpo de una petición
+MAX_CUERPO = 16 * 1024 * 1024
+
+# Segundos entre purgas de los registros vencidos de la papelera
+INTERVALO_PURGA = 3600
+
+_MOTIVOS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+
+
+class ErrorPeticion(Exception):
+    """Petición que no llega a un servicio (ruta, JSON o parámetros inválidos)."""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _entero(consulta, nombre, defecto=None):
+    valor = consulta.get(nombre)
+    if valor is None:
+        return defecto
+
+    try:
+        return int(valor)
+    except ValueError:
+        raise ErrorPeticion(400, f"'{nombre}' debe ser un número entero.") from None
+
+
+def _lista(consulta, nombre):
+    valor = consulta.get(nombre)
+    return valor.split(",") if valor else None
+
+
+def _ids(cuerpo):
+    ids = cuerpo.get("ids")
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        raise ErrorPeticion(400, "'ids' debe ser una lista de textos.")
+    return ids
+
+
+def _rutas():
+    """Tabla de rutas: (método, segmentos, escritura, manejador).
+
+    Los segmentos None capturan ese tramo de la ruta, que llega como
+    argumento al manejador junto con la consulta y el cuerpo. Se arma al
+    arrancar, con la carpeta de datos ya fijada.
+    """
+
+    from servicios import campo_servicio, historial_servicio, inventario_servicio, metricas, papelera_servicio
+    from servicios.almacenamiento import ver_campos, ver_inventario
+    from servicios.busquedas_servicio import buscar_producto, consultar_productos
+    from servicios.indices import posicion_por_id
+
+    def producto_por_id(producto_id):
+        posicion = posicion_por_id(producto_id)
+        if posicion is None:
+            raise ErrorPeticion(404, "El producto no existe.")
+        return ver_inventario()[posicion]
+
+    def listar_productos(consulta, cuerpo):
+        campos = _lista(consulta, "campos")
+        desde = _entero(consulta, "desde", 0)
+        limite = _entero(consulta, "limite", LIMITE_LISTADO)
+
+        if consulta.get("orden"):
+            ok, filas = inventario_servicio.ordenar_inventario(
+                consulta["orden"],
+                descendente=consulta.get("descendente") == "1",
+                campos=campos,
+                desde=desde,
+                limite=limite,
+            )
+        else:
+            ok, filas = inventario_servicio.mostrar_inventario(
+                campos=campos,
+                desde=desde,
+                limite=limite,
+                despues_de=consulta.get("despues_de"),
+            )
+
+        return ok, list(filas) if ok else filas
+
+    return [
+        ("GET", ("campos",), False,
+            lambda consulta, cuerpo: (True, ver_campos())),
+        ("POST", ("campos",), True,
+            lambda consulta, cuerpo: campo_servicio.crear_campo(
+                cuerpo.get("nombre", ""), cuerpo.get("tipo"), bool(cuerpo.get("unico"))
+            )),
+        ("PATCH", ("campos", None), True,
+            lambda nombre, consulta, cuerpo: campo_servicio.modificar_campo(
+                nombre, cuerpo.get("nuevo_nombre"), cuerpo.get("nuevo_tipo"), cuerpo.get("unico")
+            )),
+        ("DELETE", ("campos", None), True,
+            lambda nombre, consulta, cuerpo: campo_servicio.eliminar_campo(nombre)),
+
+        ("GET", ("productos",), False, listar_productos),
+        ("POST", ("productos",), True,
+            lambda consulta, cuerpo: inventario_servicio.agregar_producto(
+                cuerpo.get("datos"), cuerpo.get("criterios"), bool(cuerpo.get("forzar")),
+                cuerpo.get("campos_duplicado")
+            )),
+        ("POST", ("productos", "lote"), True,
+            lambda consulta, cuerpo: inventario_servicio.agregar_productos_lote(
+                cuerpo.get("filas", []), cuerpo.get("campos_duplicado"), bool(cuerpo.get("forzar"))
+            )),
+        ("GET", ("productos", "buscar"), False,
+            lambda consulta, cuerpo: (
+                True, buscar_producto(consulta.get("valor", ""), consulta.get("campo", ""))
+            )),
+        ("POST", ("productos", "consulta"), False,
+            lambda consulta, cuerpo: consultar_productos(cuerpo.get("condiciones"))),
+        ("PATCH", ("productos", None), True,
+            lambda producto_id, consulta, cuerpo: inventario_servicio.modificar_producto(
+                None, cuerpo.get("valores"), producto_elegido=producto_por_id(producto_id)
+            )),
+        ("DELETE", ("productos", None), True,
+            lambda producto_id, consulta, cuerpo: inventario_servicio.eliminar_producto(
+                None, producto_elegido=producto_por_id(producto_id)
+            )),
+
+        ("GET", ("papelera",), False,
+            lambda consulta, cuerpo: (True, papelera_servicio.listar_papelera(
+                consulta.get("entidad"), consulta.get("expirados") == "1"
+            ))),
+        # Hoy la papelera solo restaura productos; los campos se recrean
+        ("POST", ("papelera", None, "restaurar"), True,
+            lambda registro_id, consulta, cuerpo: inventario_servicio.restaurar_producto(registro_id)),
+        ("POST", ("papelera", "restaurar"), True,
+            lambda consulta, cuerpo: inventario_servicio.restaurar_productos(_ids(cuerpo))),
+        ("DELETE", ("papelera",), True,
+            lambda consulta, cuerpo: papelera_servicio.purgar_registros(_ids(cuerpo))),
+        ("DELETE", ("papelera", "expirados"), True,
+            lambda consulta, cuerpo: (papelera_servicio.limpiar_expirados(), None)),
+
+        ("GET", ("historial",), False,
+            lambda consulta, cuerpo: historial_servicio.consultar_historial(
+                entidad=consulta.get("entidad"),
+                accion=consulta.get("accion"),
+                desde=consulta.get("desde"),
+                hasta=consulta.get("hasta"),
+                entidad_id=consulta.get("entidad_id"),
+                limite=_entero(consulta, "limite", LIMITE_LISTADO),
+                recientes_primero=consulta.get("recientes") == "1",
+            )),
+
+        ("GET", ("metricas",), False, lambda consulta, cuerpo: (True, metricas.stats())),
+    ]
+
+
+def _resolver(rutas, metodo, segmentos):
+    """Devuelve (escritura, manejador, capturas) o lanza ErrorPeticion."""
+
+    metodo_invalido = False
+
+    for metodo_ruta, patron, escritura, manejador in rutas:
+        if len(patron) != len(segmentos):
+            continue
+
+        capturas = []
+        for esperado, segmento in zip(patron, segmentos):
+            if esperado is None:
+                capturas.append(segmento)
+            elif esperado != segmento:
+                break
+        else:
+            if metodo_ruta == metodo:
+                return escritura, manejador, capturas
+            metodo_invalido = True
+
+    if metodo_invalido:
+        raise ErrorPeticion(405, "Método no permitido para esta ruta.")
+    raise ErrorPeticion(404, "Ruta inexistente.")
+
+
+def _resultado_json(llamada):
+    """Ejecuta una llamada a un servicio y arma (estado, cuerpo)."""
+
+    try:
+        ok, resultado = llamada()
+    except ErrorPeticion as error:
+        return error.estado, {"ok": False, "resultado": str(error)}
+
+    # ok None: varias coincidencias, el cliente debe elegir (no es un error)
+    estado = 422 if ok is False else 200
+    return estado, {"ok": ok, "resultado": resultado}
+
+
+class Escritor:
+    """Tarea única que ejecuta las escrituras en el orden en que llegan.
+
+    Las que se acumulan mientras confirma una tanda se ejecutan juntas en
+    una escritura agrupada: cada archivo se escribe una vez por tanda.
+    La tanda corre en el bucle de eventos, que no atiende lecturas hasta
+    que termina.
+    """
+
+    def __init__(self):
+        self.cola = asyncio.Queue()
+        self.tandas = 0
+        self.escrituras = 0
+
+    async def ejecutar(self, llamada):
+        futuro = asyncio.get_running_loop().create_future()
+        await self.cola.put((llamada, futuro))
+        return await futuro
+
+    async def correr(self):
+        from servicios.almacenamiento import escritura_agrupada
+
+        while True:
+            tanda = [await self.cola.get()]
+            while len(tanda) < TAMANIO_TANDA and not self.cola.empty():
+                tanda.append(self.cola.get_nowait())
+
+            resultados = None
+            if len(tanda) > 1:
+                try:
+                    with escritura_agrupada():
+                        resultados = [_resultado_json(llamada) for llamada, _ in tanda]
+                except Exception:
+                    # Se descartó la tanda entera: se repite de a una para
+                    # que solo falle la escritura que falla
+                    resultados = None
+
+            if resultados is None:
+                resultados = [_aislada(llamada) for llamada, _ in tanda]
+
+            self.tandas += 1
+            self.escrituras += len(tanda)
+
+            for (_, futuro), resultado in zip(tanda, resultados):
+                if not futuro.cancelled():
+                    futuro.set_result(resultado)
+
+
+def _aislada(llamada):
+    try:
+        return _resultado_json(llamada)
+    except Exception as error:
+        return 500, {"ok": False, "resultado": f"Error interno: {error}"}
+
+
+async def _leer_peticion(lector):
+    """Devuelve (método, ruta, cabeceras, cuerpo), o None si se cerró la conexión."""
+
+    try:
+        cabecera = await lector.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise ErrorPeticion(413, "Cabeceras demasiado largas.") from None
+
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    try:
+        metodo, ruta, _ = lineas[0].split(" ", 2)
+    except ValueError:
+        raise ErrorPeticion(400, "Línea de petición inválida.") from None
+
+    cabeceras = {}
+    for linea in lineas[1:]:
+        if ":" in linea:
+            nombre, valor = linea.split(":", 1)
+            cabeceras[nombre.strip().lower()] = valor.strip()
+
+    try:
+        largo = int(cabeceras.get("content-length") or 0)
+    except ValueError:
+        raise ErrorPeticion(400, "Content-Length inválido.") from None
+    if largo < 0:
+        raise ErrorPeticion(400, "Content-Length inválido.")
+    if largo > MAX_CUERPO:
+        raise ErrorPeticion(413, "Cuerpo demasiado grande.")
+
+    cuerpo = await lector.readexactly(largo) if largo else b""
+    return metodo.upper(), ruta, cabeceras, cuerpo
+
+
+def _respuesta(estado, cuerpo, mantener):
+    datos = json.dumps(cuerpo, ensure_ascii=False, default=a_json).encode("utf-8")
+    cabecera = (
+        f"HTTP/1.1 {estado} {_MOTIVOS[estado]}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(datos)}\r\n"
+        f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+    )
+    return cabecera.encode("latin-1") + datos
+
+
+async def _atender(rutas, escritor, lector, escritor_red):
+    try:
+        while True:
+            try:
+                peticion = await _leer_peticion(lector)
+                if peticion is None:
+                    return
+
+                metodo, ruta, cabeceras, cuerpo = peticion
+                mantener = cabeceras.get("connection", "").lower() != "close"
+
+                partes = urlsplit(ruta)
+                segmentos = tuple(unquote(s) for s in partes.path.strip("/").split("/") if s)
+                consulta = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+
+                try:
+                    cuerpo = json.loads(cuerpo) if cuerpo else {}
+                except ValueError:
+                    raise ErrorPeticion(400, "El cuerpo no es JSON válido.") from None
+                if not isinstance(cuerpo, dict):
+                    raise ErrorPeticion(400, "El cuerpo debe ser un objeto JSON.")
+
+                escritura, manejador, capturas = _resolver(rutas, metodo, segmentos)
+
+                def llamada():
+                    return manejador(*capturas, consulta, cuerpo)
+
+                if escritura:
+                    estado, respuesta = await escritor.ejecutar(llamada)
+                else:
+                    estado, respuesta = _aislada(llamada)
+
+            except ErrorPeticion as error:
+                estado, respuesta = error.estado, {"ok": False, "resultado": str(error)}
+                mantener = False
+
+            escritor_red.write(_respuesta(estado, respuesta, mantener))
+            await escritor_red.drain()
+
+            if not mantener:
+                return
+    except ConnectionError:
+        pass
+    finally:
+        escritor_red.close()
+
+
+async def _purgar_periodicamente(escritor):
+    """Purga la papelera cada INTERVALO_PURGA segundos, como una escritura más."""
+
+    from servicios import papelera_servicio
+
+    while True:
+        await escritor.ejecutar(lambda: (papelera_servicio.limpiar_expirados(), None))
+        await asyncio.sleep(INTERVALO_PURGA)
+
+
+async def servir(host, puerto):
+    from servicios.almacenamiento import ver_campos_unicos, ver_papelera
+    from servicios.indices import preparar_indices
+
+    rutas = _rutas()
+
+    # Los datos y los índices se cargan una vez, antes de aceptar conexiones
+    ver_campos_unicos()
+    ver_papelera()
+    preparar_indices()
+
+    escritor = Escritor()
+    tarea_escritora = asyncio.create_task(escritor.correr())
+    tarea_purga = asyncio.create_task(_purgar_periodicamente(escritor))
+
+    servidor = await asyncio.start_server(
+        lambda lector, red: _atender(rutas, escritor, lector, red),
+        host,
+        puerto,
+        limit=MAX_CUERPO,
+    )
+
+    direccion = servidor.sockets[0].getsockname()
+    print(f"Escuchando en http://{direccion[0]}:{direccion[1]}", flush=True)
+
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        tarea_purga.cancel()
+        tarea_escritora.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000, help="0 elige uno libre")
+    parser.add_argument("--datos", help="carpeta de datos (por defecto, la del proyecto)")
+    parser.add_argument(
+        "--metricas", type=float, metavar="SEGUNDOS",
+        help="activa las métricas y las vuelca a metricas.json cada SEGUNDOS"
+    )
+    args = parser.parse_args()
+
+    # La carpeta se fija antes de importar los servicios, que leen la ruta al cargarse
+    if args.datos:
+        os.environ["INVENTARIO_DATOS"] = os.path.abspath(args.datos)
+
+    parar_volcado = None
+    if args.metricas:
+        from servicios import metricas
+        metricas.ACTIVAS = True
+        parar_volcado = metricas.volcar_periodicamente(args.metricas)
+
+    try:
+        asyncio.run(servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if parar_volcado is not None:
+            parar_volcado()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+
+# Directorio base del proyecto
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Carpeta 'datos' (INVENTARIO_DATOS permite apuntar a otra, p. ej. en benchmarks)
+DATA_DIR = os.environ.get("INVENTARIO_DATOS") or os.path.join(BASE_DIR, "datos")
+
+# Archivos principales
+RUTA_CAMPOS = os.path.join(DATA_DIR, "campos.json")
+RUTA_CAMPOS_UNICOS = os.path.join(DATA_DIR, "campos_unicos.json")
+RUTA_INVENTARIO = os.path.join(DATA_DIR, "inventario.json")
+RUTA_HISTORIAL = os.path.join(DATA_DIR, "historial.json")  # formato anterior, solo para migrar
+RUTA_HISTORIAL_LOG = os.path.join(DATA_DIR, "historial.jsonl")
+RUTA_HISTORIAL_INDICE = os.path.join(DATA_DIR, ".historial.indice.json")
+RUTA_HISTORIAL_SEGMENTOS = os.path.join(DATA_DIR, "historial_segmentos")
+RUTA_HISTORIAL_SNAPSHOTS = os.path.join(DATA_DIR, "historial_snapshots")
+RUTA_PAPELERA = os.path.join(DATA_DIR, "papelera.json")
+RUTA_MIGRACIONES = os.path.join(DATA_DIR, "migraciones.json")
+
+# Base de datos del backend SQLite (ver almacenamiento.BACKEND)
+RUTA_SQLITE = os.path.join(DATA_DIR, "inventario.sqlite3")
+
+# Diario de una escritura agrupada en curso (ver almacenamiento)
+RUTA_GRUPO_PENDIENTE = os.path.join(DATA_DIR, ".grupo_pendiente.json")
+
+# Bloqueo entre procesos y contadores de escritura por conjunto de datos
+RUTA_BLOQUEO = os.path.join(DATA_DIR, ".bloqueo")
+RUTA_VERSIONES = os.path.join(DATA_DIR, ".versiones.json")
+
+# Volcado de las métricas (ver servicios.metricas)
+RUTA_METRICAS = os.path.join(DATA_DIR, "metricas.json")
+
+
+# La estructura se asegura una sola vez por proceso
+_ESTRUCTURA = {"lista": False}
+
+
+def asegurar_estructura():
+    """Crea la carpeta de datos si no existe (una sola vez por proceso).
+
+    Los archivos no se crean acá: el almacenamiento crea cada uno, con su
+    valor inicial, la primera vez que lo lee.
+    """
+
+    if not _ESTRUCTURA["lista"]:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _ESTRUCTURA["lista"] = True